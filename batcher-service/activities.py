@@ -1,33 +1,731 @@
 import asyncio
-from typing import List, Dict, Any
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from typing import Iterator, List, Dict, Any, Optional, Set, Tuple
 from temporalio import activity
+from temporalio.client import Client
+from temporalio.service import RPCError, RPCStatusCode
+
+from blobstore import FilesystemBlobStore
+from connection_pool import ConnectionPool, PoolTimeoutError
+from dedup import fingerprint
+from dead_letter import DeadLetterStore
+from validation import BatchValidator
+from structured_logging import sample_record
+
+
+WRITTEN = "written"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+RETRYABLE = "retryable"
+
+logger = logging.getLogger("batcher.activities")
+
+DEFAULT_LEDGER_DB = os.environ.get(
+    "LEDGER_DB", os.path.join(tempfile.gettempdir(), "temporal-batching-ledger.sqlite3")
+)
+
+
+def _claim_check_refs(write_requests: List[Dict[str, Any]]) -> List[str]:
+    return [request["data_ref"] for request in write_requests if "data_ref" in request and "data" not in request]
+
+
+async def resolve_claim_checks(write_requests: List[Dict[str, Any]],
+                                blob_store: Optional[FilesystemBlobStore] = None,
+                                executor: Optional[Executor] = None):
+    """
+    Replace "data_ref" with the stored payload for every claim-check record.
+    Returns (records, refs resolved, {ref: error} for references that could not be resolved).
+    """
+    if not _claim_check_refs(write_requests):
+        return write_requests, 0, {}
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, resolve_claim_checks_sync, write_requests, blob_store)
+
+
+def resolve_claim_checks_sync(write_requests: List[Dict[str, Any]],
+                              blob_store: Optional[FilesystemBlobStore] = None):
+    """Blocking form of resolve_claim_checks, for sync activities and executor threads"""
+    
+    refs = _claim_check_refs(write_requests)
+    if not refs:
+        return write_requests, 0, {}
+    
+    blob_store = blob_store or FilesystemBlobStore()
+    payloads, errors = blob_store.get_many(refs)
+    
+    resolved = [
+        {**request, "data": payloads[request["data_ref"]].decode()}
+        if request.get("data_ref") in payloads and "data" not in request else request
+        for request in write_requests
+    ]
+    return resolved, len(payloads), errors
+
+
+def row_count(request: Dict[str, Any]) -> int:
+    """Ledger rows a write request produces: one, or one per entry of a vector request's "records" """
+    records = request.get("records")
+    return len(records) if isinstance(records, list) else 1
+
+
+def expand_rows(requests: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    Flatten vector requests into one ledger record per row, carrying the request's fields (request_id,
+    workflow_id, ...) plus the row's "data" or "data_ref" and its "row_index".
+    Returns (rows, position in requests that each row came from).
+    """
+    rows: List[Dict[str, Any]] = []
+    owners: List[int] = []
+    for n, request in enumerate(requests):
+        if "records" not in request:
+            rows.append(request)
+            owners.append(n)
+            continue
+        shared = {key: value for key, value in request.items() if key != "records"}
+        for k, record in enumerate(request["records"]):
+            payload = {key: record[key] for key in ("data", "data_ref") if key in record}
+            rows.append({**shared, **payload, "row_index": k})
+            owners.append(n)
+    return rows, owners
+
+
+def _request_groups(records: List[Dict[str, Any]]) -> List[List[int]]:
+    """Positions of the records grouped by request: the rows of a vector request are only written together"""
+    groups: Dict[Any, List[int]] = {}
+    for n, request in enumerate(records):
+        key = request["request_id"] if "row_index" in request and request.get("request_id") else ("position", n)
+        groups.setdefault(key, []).append(n)
+    return list(groups.values())
+
+
+def _request_result(request: Dict[str, Any], outcome: str, error: Optional[str] = None,
+                    rows: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    result = {"request_id": request.get("request_id"), "outcome": outcome}
+    if error:
+        result["error"] = error
+    if rows is not None:
+        result["rows"] = rows
+    return result
+
+
+def _summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts = {outcome: 0 for outcome in (WRITTEN, DUPLICATE, REJECTED, RETRYABLE)}
+    for result in results:
+        counts[result["outcome"]] += 1
+    settled_ok = counts[WRITTEN] + counts[DUPLICATE]
+    return {
+        "status": "success" if settled_ok == len(results) else "partial",
+        "count": counts[WRITTEN],
+        "written": counts[WRITTEN],
+        "duplicates": counts[DUPLICATE],
+        "rejected": counts[REJECTED],
+        "retryable": counts[RETRYABLE]
+    }
+
+
+def partition_of(request: Dict[str, Any], partitions: int) -> int:
+    """
+    Stable partition of a record, by its ordering key (the workflow ID unless one is given), so records
+    sharing a key are written in one transaction, in batch order
+    """
+    return fingerprint(request.get("ordering_key") or request["workflow_id"]) % partitions
+
+
+def _merge_partitions(outcomes) -> Tuple[Set[int], Dict[int, Dict[str, str]]]:
+    """Combine the (skipped, failures) of each partition, already mapped to batch positions"""
+    skipped: Set[int] = set()
+    failures: Dict[int, Dict[str, str]] = {}
+    for partition_skipped, partition_failures in outcomes:
+        skipped |= partition_skipped
+        failures.update(partition_failures)
+    return skipped, failures
+
+
+def _partition(records: List[Dict[str, Any]], partitions: int) -> List[List[int]]:
+    """Positions of the records in each non-empty partition"""
+    members: List[List[int]] = [[] for _ in range(partitions)]
+    for n, request in enumerate(records):
+        members[partition_of(request, partitions)].append(n)
+    return [positions for positions in members if positions]
+
+
+class Sink:
+    """Destination of batch writes; write() stores all records or raises, and is called from a worker thread"""
+    
+    name = "sink"
+    
+    def write(self, records: List[Dict[str, Any]]) -> Set[int]:
+        """Store the records; returns the positions of records skipped because they were already committed"""
+        raise NotImplementedError
+    
+    def classify_error(self, error: BaseException) -> Optional[str]:
+        """
+        What a failed write() says about its records: REJECTED if the records themselves are at fault (the
+        batch is bisected to find them), None if the sink itself is failing (the whole batch fails, the
+        activity retries and the batcher's circuit breaker counts it)
+        """
+        if isinstance(error, (OSError, PoolTimeoutError)):  # includes ConnectionError and TimeoutError
+            return None
+        return REJECTED
+    
+    def health_check(self) -> Dict[str, Any]:
+        return {"healthy": True}
+    
+    def metrics(self) -> Optional[Dict[str, Any]]:
+        """Connection pool metrics, for sinks that hold connections"""
+        return None
+    
+    def close(self):
+        pass
+
+
+class PrintSink(Sink):
+    """Simulates the ledger by logging the batch (and a sample of its records) and sleeping"""
+    
+    name = "print"
+    
+    def __init__(self, simulated_latency_seconds: float = 0.5):
+        self.simulated_latency_seconds = simulated_latency_seconds
+    
+    def write(self, records: List[Dict[str, Any]]) -> Set[int]:
+        for request in records:
+            if sample_record(request.get("request_id")):
+                logger.info("Ledger record", extra={
+                    "request_id": request.get("request_id"),
+                    "workflow_id": request["workflow_id"],
+                    "data": request["data"][:200]
+                })
+        logger.info(f"Wrote {len(records)} records to ledger", extra={"sink": self.name, "records": len(records)})
+        
+        # Simulate database write time
+        time.sleep(self.simulated_latency_seconds)
+        return set()
+
+
+def sqlite_connection_pool(path: str = DEFAULT_LEDGER_DB, max_size: int = 4, **options) -> ConnectionPool:
+    """Pool of SQLite connections to the ledger; connections move between executor threads, one at a time"""
+    
+    def connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+    
+    return ConnectionPool(connect, lambda conn: conn.execute("SELECT 1").fetchone(), max_size=max_size, **options)
+
+
+class SQLiteSink(Sink):
+    """
+    Writes batches to a SQLite ledger table, one transaction per batch, over the worker's connection pool.
+    Rows go in as multi-row INSERT ... VALUES statements sized to SQLite's bound-parameter limit.
+
+    Writes are idempotent per request_id: committed IDs are recorded in committed_requests in the
+    same transaction, so an activity retry after a commit whose result was lost skips those rows.
+    """
+    
+    name = "sqlite"
+    COLUMNS = ("request_id", "workflow_id", "requesting_workflow", "data", "written_at")
+    
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        # SQLITE_MAX_VARIABLE_NUMBER defaults to 999 before SQLite 3.32 and 32766 since
+        max_variables = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+        self.max_variables = max_variables
+        with self.pool.connection() as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ledger (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    request_id TEXT,
+                    workflow_id TEXT NOT NULL,
+                    requesting_workflow TEXT,
+                    data TEXT NOT NULL,
+                    written_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS committed_requests (
+                    request_id TEXT PRIMARY KEY,
+                    committed_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+    
+    def write(self, records: List[Dict[str, Any]]) -> Set[int]:
+        written_at = time.time()
+        
+        with self.pool.connection() as conn:
+            with conn:  # one transaction: the whole batch commits or none of it does
+                # Take the write lock before looking up committed IDs, so concurrent batches can't
+                # both decide to insert the same request
+                conn.execute("BEGIN IMMEDIATE")
+                committed = self._committed_request_ids(
+                    conn, list({r["request_id"]: None for r in records if r.get("request_id")})
+                )
+                
+                skipped: Set[int] = set()
+                # Rows of a vector request share its request_id and commit together, so the ID is recorded
+                # once; the (request_id, row) key catches a repeat within this batch
+                new_ids: Dict[str, None] = {}
+                seen: Set[Tuple[str, Optional[int]]] = set()
+                rows = []
+                for i, request in enumerate(records):
+                    request_id = request.get("request_id")
+                    row_key = (request_id, request.get("row_index"))
+                    if request_id in committed or (request_id and row_key in seen):
+                        skipped.add(i)
+                        continue
+                    if request_id:
+                        seen.add(row_key)
+                        new_ids[request_id] = None
+                    rows.append((request_id, request["workflow_id"], request.get("requesting_workflow"),
+                                 request["data"], written_at))
+                
+                self._insert_rows(conn, "ledger", self.COLUMNS, rows)
+                self._insert_rows(conn, "committed_requests", ("request_id", "committed_at"),
+                                  [(request_id, written_at) for request_id in new_ids])
+        return skipped
+    
+    def _committed_request_ids(self, conn: sqlite3.Connection, request_ids: List[str]) -> Set[str]:
+        committed: Set[str] = set()
+        for start in range(0, len(request_ids), self.max_variables):
+            chunk = request_ids[start:start + self.max_variables]
+            committed.update(row[0] for row in conn.execute(
+                f"SELECT request_id FROM committed_requests WHERE request_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ))
+        return committed
+    
+    def _insert_rows(self, conn: sqlite3.Connection, table: str, columns: tuple, rows: List[tuple]):
+        row_placeholders = "(" + ", ".join("?" * len(columns)) + ")"
+        rows_per_statement = self.max_variables // len(columns)
+        for start in range(0, len(rows), rows_per_statement):
+            chunk = rows[start:start + rows_per_statement]
+            conn.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([row_placeholders] * len(chunk)),
+                [value for row in chunk for value in row]
+            )
+    
+    def classify_error(self, error: BaseException) -> Optional[str]:
+        # Constraint violations and values the driver can't bind are the rows' fault; a locked or
+        # unreachable database, I/O errors, pool exhaustion and SQL errors mean the sink is failing
+        if isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.InterfaceError)):
+            return REJECTED
+        return None
+    
+    def health_check(self) -> Dict[str, Any]:
+        checked = self.pool.health_check()
+        return {"healthy": checked["unhealthy"] == 0, **checked}
+    
+    def metrics(self) -> Optional[Dict[str, Any]]:
+        return self.pool.metrics()
+    
+    def close(self):
+        self.pool.close()
+
+
+SINKS = {
+    PrintSink.name: PrintSink,
+    SQLiteSink.name: SQLiteSink
+}
+
+
+def create_sink(name: str, ledger_db: str = DEFAULT_LEDGER_DB, pool_size: int = 4) -> Sink:
+    if name == SQLiteSink.name:
+        return SQLiteSink(sqlite_connection_pool(ledger_db, pool_size))
+    if name == PrintSink.name:
+        return PrintSink()
+    raise ValueError(f"Unknown sink {name!r}, expected one of {sorted(SINKS)}")
+
+
+class BatchWriteActivities:
+    """
+    Batch write activities bound to the sink the worker was configured with.
+    One instance serves every invocation, so the sink's connection pool is shared process-wide.
+    """
+    
+    def __init__(self, sink: Sink, chunk_size: int = 500, partitions: int = 1,
+                 max_parallel_writes: Optional[int] = None, executor: Optional[Executor] = None,
+                 validator: Optional[BatchValidator] = None):
+        self.sink = sink
+        self.validator = validator or BatchValidator()
+        self.chunk_size = chunk_size
+        # Each chunk is split into this many partitions by ordering key hash and written concurrently,
+        # one sink transaction (and pooled connection) per partition
+        self.partitions = max(1, partitions)
+        self.max_parallel_writes = max(1, max_parallel_writes or self.partitions)
+        # Where the async variant runs blocking sink calls (None: the event loop's default executor)
+        self.executor = executor
+        # The sync variant already runs on an activity_executor thread; its partitions get their own threads.
+        # Created up front: concurrent sync activities would race to create it lazily (threads start on demand)
+        self._partition_executor: Optional[ThreadPoolExecutor] = None
+        if self.partitions > 1:
+            self._partition_executor = ThreadPoolExecutor(self.max_parallel_writes,
+                                                          thread_name_prefix="partition-writer")
+    
+    def close(self):
+        """Stop the partition writer threads; the sink and activity executor are closed by their owner"""
+        if self._partition_executor is not None:
+            self._partition_executor.shutdown(wait=False)
+    
+    @activity.defn
+    async def batch_write_to_database(self, write_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Write a batch to the configured sink in chunks of about chunk_size ledger rows, one sink transaction
+        each; the rows of a vector request ("records") always go into the same transaction.
+        After every committed chunk the activity heartbeats the next offset and the outcomes so far,
+        so a retry resumes where the last attempt stopped instead of rewriting the whole batch.
+        Returns metadata about the write operation plus one outcome per request, in input order
+        ("written", "duplicate", "rejected" or "retryable"), with per-row outcomes for vector requests.
+        Raising means the rest of the batch failed.
+        """
+        if not write_requests:
+            return {"status": "no_data", "count": 0, "results": []}
+    
+        started = time.monotonic()
+        results, offset = self._resume_point(len(write_requests))
+    
+        resolved_refs = 0
+        for chunk_start, chunk_end in self._chunks(write_requests, offset):
+            chunk = write_requests[chunk_start:chunk_end]
+            # One ledger record per row; claim-check rows carry only a reference, fetched for the chunk in one pass
+            rows, owners = expand_rows(chunk)
+            rows, chunk_refs, ref_errors = await resolve_claim_checks(rows, executor=self.executor)
+            resolved_refs += chunk_refs
+    
+            to_write = self._reject_invalid(chunk, chunk_start, rows, owners, ref_errors, results)
+            skipped: Set[int] = set()
+            failures: Dict[int, Dict[str, str]] = {}
+            if to_write:
+                skipped, failures = await self._write_partitioned([rows[r] for r in to_write])
+            self._record_written(chunk, chunk_start, to_write, owners, skipped, failures, results)
+    
+            # The chunk is committed: a retry starts after it
+            activity.heartbeat({"offset": chunk_end, "results": results[:chunk_end]})
+    
+        return self._result(results, started, resolved_refs, offset)
+    
+    @activity.defn(name="batch_write_to_database")
+    def batch_write_to_database_sync(self, write_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Blocking variant of batch_write_to_database for synchronous DB drivers (same name, same results).
+        Temporal runs it on the worker's activity_executor thread pool, so the sink is called directly
+        and the event loop driving workflow tasks is never blocked.
+        """
+        if not write_requests:
+            return {"status": "no_data", "count": 0, "results": []}
+    
+        started = time.monotonic()
+        results, offset = self._resume_point(len(write_requests))
+    
+        resolved_refs = 0
+        for chunk_start, chunk_end in self._chunks(write_requests, offset):
+            chunk = write_requests[chunk_start:chunk_end]
+            rows, owners = expand_rows(chunk)
+            rows, chunk_refs, ref_errors = resolve_claim_checks_sync(rows)
+            resolved_refs += chunk_refs
+    
+            to_write = self._reject_invalid(chunk, chunk_start, rows, owners, ref_errors, results)
+            skipped: Set[int] = set()
+            failures: Dict[int, Dict[str, str]] = {}
+            if to_write:
+                skipped, failures = self._write_partitioned_sync([rows[r] for r in to_write])
+            self._record_written(chunk, chunk_start, to_write, owners, skipped, failures, results)
+    
+            activity.heartbeat({"offset": chunk_end, "results": results[:chunk_end]})
+    
+        return self._result(results, started, resolved_refs, offset)
+    
+    def _chunks(self, write_requests: List[Dict[str, Any]], offset: int) -> Iterator[Tuple[int, int]]:
+        """(start, end) ranges of requests holding about chunk_size rows each; a request is never split"""
+        start, rows = offset, 0
+        for end in range(offset, len(write_requests)):
+            request_rows = row_count(write_requests[end])
+            if rows and rows + request_rows > self.chunk_size:
+                yield start, end
+                start, rows = end, 0
+            rows += request_rows
+        if start < len(write_requests):
+            yield start, len(write_requests)
+    
+    def _reject_invalid(self, chunk: List[Dict[str, Any]], chunk_start: int, rows: List[Dict[str, Any]],
+                        owners: List[int], ref_errors: Dict[str, str],
+                        results: List[Optional[Dict[str, Any]]]) -> List[int]:
+        """
+        Validate and normalize the chunk's rows against the ledger schema (in place), rejecting poison
+        requests individually instead of failing the whole batch. A vector request is rejected as a whole
+        if any of its rows is invalid. Returns the positions (in rows) to write.
+        """
+        normalized, errors = self.validator.validate(rows)
+        rows[:] = normalized
+        for r, row in enumerate(rows):
+            if row.get("data_ref") in ref_errors and "data" not in row:
+                errors[r] = f"claim-check payload unavailable: {ref_errors[row['data_ref']]}"
+        
+        rows_of: List[List[int]] = [[] for _ in chunk]
+        for r, n in enumerate(owners):
+            rows_of[n].append(r)
+        
+        to_write: List[int] = []
+        for n, request in enumerate(chunk):
+            row_errors = [errors[r] for r in rows_of[n]]
+            invalid = [k for k, error in enumerate(row_errors) if error]
+            if not invalid:
+                to_write.extend(rows_of[n])
+                continue
+            
+            if "records" not in request:
+                results[chunk_start + n] = _request_result(request, REJECTED, row_errors[0])
+                continue
+            more = f" (and {len(invalid) - 1} more rows)" if len(invalid) > 1 else ""
+            results[chunk_start + n] = _request_result(
+                request, REJECTED, f"row {invalid[0]}: {row_errors[invalid[0]]}{more}",
+                [{"outcome": REJECTED, "error": error or "not written: another row of the request was rejected"}
+                 for error in row_errors]
+            )
+        return to_write
+    
+    @staticmethod
+    def _record_written(chunk: List[Dict[str, Any]], chunk_start: int, to_write: List[int], owners: List[int],
+                        skipped: Set[int], failures: Dict[int, Dict[str, str]],
+                        results: List[Optional[Dict[str, Any]]]):
+        row_results: Dict[int, List[Dict[str, str]]] = {}
+        for n, r in enumerate(to_write):
+            row_result = failures.get(n) or {"outcome": DUPLICATE if n in skipped else WRITTEN}
+            row_results.setdefault(owners[r], []).append(row_result)
+        for n, rows in row_results.items():
+            request = chunk[n]
+            # Rows of a vector request share a partition and a transaction, so they settle together
+            outcomes = {row["outcome"] for row in rows}
+            outcome = next(o for o in (REJECTED, RETRYABLE, WRITTEN, DUPLICATE) if o in outcomes)
+            error = next((row["error"] for row in rows if row.get("error")), None)
+            results[chunk_start + n] = _request_result(request, outcome, error,
+                                                       rows if "records" in request else None)
+    
+    def _result(self, results: List[Dict[str, Any]], started: float, resolved_refs: int,
+                offset: int) -> Dict[str, Any]:
+        summary = _summarize(results)
+        duration = time.monotonic() - started
+        info = activity.info()
+        
+        for result in results:
+            if result["outcome"] == REJECTED and sample_record(result.get("request_id")):
+                logger.warning("Rejected record", extra={
+                    "request_id": result.get("request_id"), "error": result.get("error")
+                })
+        
+        # One summary line per batch; duplicates usually mean a retry after a commit whose result was lost
+        logger.info(f"Batch write {summary['status']}: {summary['written']}/{len(results)} written", extra={
+            "batcher_id": info.workflow_id,
+            "attempt": info.attempt,
+            "sink": self.sink.name,
+            "records": len(results),
+            "written": summary["written"],
+            "duplicates": summary["duplicates"],
+            "rejected": summary["rejected"],
+            "resumed_from": offset,
+            "resolved_refs": resolved_refs,
+            "duration_ms": round(duration * 1000, 3)
+        })
+        
+        return {
+            **summary,
+            "sink": self.sink.name,
+            "pool": self.sink.metrics(),
+            "executor": self.executor.metrics() if hasattr(self.executor, "metrics") else None,
+            "write_time": time.time(),
+            "duration_seconds": duration,
+            "resolved_refs": resolved_refs,
+            "resumed_from": offset,
+            "results": results
+        }
+    
+    async def _write_partitioned(self, records: List[Dict[str, Any]]) -> Tuple[Set[int], Dict[int, Dict[str, str]]]:
+        """
+        Write records through the sink, split into partitions written concurrently.
+        Returns the positions (in records) the sink skipped as already committed, and the failed records
+        (see _write_isolating).
+        """
+        loop = asyncio.get_running_loop()
+        if self.partitions == 1 or len(records) < 2:
+            return await loop.run_in_executor(self.executor, self._write_isolating, records)
+    
+        semaphore = asyncio.Semaphore(self.max_parallel_writes)
+    
+        async def write_partition(positions: List[int]):
+            async with semaphore:
+                skipped, failures = await loop.run_in_executor(self.executor, self._write_isolating,
+                                                               [records[n] for n in positions])
+            return {positions[k] for k in skipped}, {positions[k]: failure for k, failure in failures.items()}
+    
+        # Let every partition settle before failing, so a retry doesn't race writes still in progress
+        outcomes = await asyncio.gather(
+            *[write_partition(positions) for positions in _partition(records, self.partitions)],
+            return_exceptions=True
+        )
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            raise errors[0]
+        return _merge_partitions(outcomes)
+    
+    def _write_partitioned_sync(self, records: List[Dict[str, Any]]) -> Tuple[Set[int], Dict[int, Dict[str, str]]]:
+        if self.partitions == 1 or len(records) < 2:
+            return self._write_isolating(records)
+    
+        def write_partition(positions: List[int]):
+            skipped, failures = self._write_isolating([records[n] for n in positions])
+            return {positions[k] for k in skipped}, {positions[k]: failure for k, failure in failures.items()}
+    
+        futures = [self._partition_executor.submit(write_partition, positions)
+                   for positions in _partition(records, self.partitions)]
+        wait(futures)
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise errors[0]
+        return _merge_partitions([future.result() for future in futures])
+    
+    @staticmethod
+    def _resume_point(size: int):
+        """(outcomes so far, offset to continue from) recorded by a previous attempt's heartbeats"""
+        results: List[Optional[Dict[str, Any]]] = [None] * size
+        details = activity.info().heartbeat_details
+        if not details:
+            return results, 0
+        
+        progress = details[0] or {}
+        offset = progress.get("offset", 0)
+        saved = progress.get("results", [])
+        if not 0 < offset <= size or len(saved) != offset:
+            return results, 0
+        results[:offset] = saved
+        return results, offset
+    
+    def _write_isolating(self, records: List[Dict[str, Any]]) -> Tuple[Set[int], Dict[int, Dict[str, str]]]:
+        """
+        sink.write(records), isolating the records that make it fail instead of failing them all.
+        If the sink blames the records, the batch is bisected (by request) into separate writes until the
+        failing requests are found: they are rejected, and parts hitting a sink-wide error become retryable.
+        Returns (positions skipped as already committed, {position: {"outcome", "error"}} for failed records).
+        Raises if the sink itself is failing (see Sink.classify_error). Blocking; runs on an executor thread.
+        """
+        try:
+            return self.sink.write(records), {}
+        except Exception as e:
+            if self.sink.classify_error(e) != REJECTED:
+                raise
+            first_error = e
+        
+        groups = _request_groups(records)
+        if len(groups) == 1:
+            return set(), {n: {"outcome": REJECTED, "error": str(first_error)} for n in groups[0]}
+        
+        skipped: Set[int] = set()
+        failures: Dict[int, Dict[str, str]] = {}
+        
+        def bisect(part: List[List[int]]):
+            positions = [n for group in part for n in group]
+            try:
+                done = self.sink.write([records[n] for n in positions])
+            except Exception as e:
+                outcome = self.sink.classify_error(e)
+                if outcome == REJECTED and len(part) > 1:
+                    middle = len(part) // 2
+                    bisect(part[:middle])
+                    bisect(part[middle:])
+                    return
+                failures.update({n: {"outcome": outcome or RETRYABLE, "error": str(e)} for n in positions})
+                return
+            skipped.update(positions[k] for k in done)
+        
+        middle = len(groups) // 2
+        bisect(groups[:middle])
+        bisect(groups[middle:])
+        logger.warning(f"Isolated {len(failures)} of {len(records)} records failing the sink write", extra={
+            "sink": self.sink.name,
+            "rejected": sum(1 for failure in failures.values() if failure["outcome"] == REJECTED),
+            "retryable": sum(1 for failure in failures.values() if failure["outcome"] == RETRYABLE),
+            "error": str(first_error)
+        })
+        return skipped, failures
 
 
 @activity.defn
-async def batch_write_to_database(write_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+async def dead_letter_writes(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Simulate batch writing to database by printing to console.
-    Returns metadata about the write operation.
+    Quarantine write requests that exhausted their attempts in the dead-letter table.
+    Each entry is {"request", "batcher_id", "batch_id", "attempts", "last_error"}.
     """
-    if not write_requests:
-        return {"status": "no_data", "count": 0}
+    if not entries:
+        return {"stored": 0}
     
-    print("\n" + "="*60)
-    print(f"📊 BATCH WRITE TO DATABASE - {len(write_requests)} records")
-    print("="*60)
+    loop = asyncio.get_running_loop()
+    stored = await loop.run_in_executor(None, DeadLetterStore().add_many, entries)
     
-    for i, request in enumerate(write_requests, 1):
-        print(f"{i:2d}. Workflow: {request['workflow_id']} | Data: {request['data']}")
+    logger.warning(f"Dead-lettered {stored} write requests", extra={
+        "batcher_id": entries[0]["batcher_id"],
+        "batch_id": entries[0].get("batch_id"),
+        "request_ids": [entry["request"].get("request_id") for entry in entries][:100]
+    })
+    return {"stored": stored}
+
+
+class ConfirmationActivities:
+    """Delivers write confirmations with the Temporal client instead of from the batcher's history"""
     
-    print("="*60)
-    print(f"✅ Successfully wrote {len(write_requests)} records to ledger")
-    print("="*60 + "\n")
+    def __init__(self, client: Client, max_concurrency: int = 50, max_attempts: int = 3):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
     
-    # Simulate database write time
-    await asyncio.sleep(0.5)
+    @activity.defn
+    async def deliver_confirmations(self, confirmations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Signal write_confirmation to every requesting workflow with bounded concurrency.
+        Each item is {"workflow_id", "request_id", "result"}; returns the per-target failures.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def deliver(confirmation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                error = await self._signal_with_retries(confirmation["workflow_id"], confirmation["result"])
+            if error is None:
+                return None
+            return {
+                "workflow_id": confirmation["workflow_id"],
+                "request_id": confirmation.get("request_id"),
+                "error": error
+            }
+        
+        outcomes = await asyncio.gather(*[deliver(confirmation) for confirmation in confirmations])
+        failed = [outcome for outcome in outcomes if outcome is not None]
+        
+        return {
+            "delivered": len(confirmations) - len(failed),
+            "failed": failed
+        }
     
-    return {
-        "status": "success",
-        "count": len(write_requests),
-        "write_time": "simulated_timestamp"
-    }
\ No newline at end of file
+    async def _signal_with_retries(self, workflow_id: str, result: Dict[str, Any]) -> Optional[str]:
+        """Signal one requester, retrying transient RPC errors; returns the last error or None"""
+        
+        for attempt in range(self.max_attempts):
+            try:
+                await self.client.get_workflow_handle(workflow_id).signal("write_confirmation", result)
+                return None
+            except RPCError as e:
+                # The requester finished (e.g. timed out) - nobody is left to confirm
+                if e.status == RPCStatusCode.NOT_FOUND:
+                    return f"workflow not found: {e}"
+                error = str(e)
+            except Exception as e:
+                error = str(e)
+            
+            if attempt < self.max_attempts - 1:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        
+        return error
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import tempfile
+from typing import Dict, Iterable, Tuple
+
+
+DEFAULT_BLOB_STORE_DIR = os.environ.get(
+    "BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "temporal-batching-blobs")
+)
+
+
+class BlobNotFoundError(Exception):
+    pass
+
+
+class FilesystemBlobStore:
+    """
+    Reader for the content-addressed blob store producers write claim-check payloads to
+    (main-service/blobstore.py). References look like "sha256:<hex>".
+    """
+    
+    def __init__(self, root: str = DEFAULT_BLOB_STORE_DIR):
+        self.root = root
+    
+    def get(self, ref: str) -> bytes:
+        scheme, _, digest = ref.partition(":")
+        if scheme != "sha256" or not digest:
+            raise ValueError(f"Unsupported blob reference: {ref}")
+        
+        path = os.path.join(self.root, digest[:2], digest)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+        except FileNotFoundError:
+            raise BlobNotFoundError(ref)
+        
+        # Content addressing makes corruption detectable
+        if hashlib.sha256(payload).hexdigest() != digest:
+            raise ValueError(f"Blob {ref} failed its integrity check")
+        return payload
+    
+    def get_many(self, refs: Iterable[str]) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+        """
+        Resolve a batch of references, reading each distinct blob once.
+        Returns (payloads by ref, error by ref) so one bad reference doesn't fail the batch.
+        """
+        payloads: Dict[str, bytes] = {}
+        errors: Dict[str, str] = {}
+        for ref in set(refs):
+            try:
+                payloads[ref] = self.get(ref)
+            except (BlobNotFoundError, ValueError) as e:
+                errors[ref] = f"{type(e).__name__}: {e}"
+        return payloads, errors
@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    Circuit breaker with exponential backoff for batch writes.
+
+    Every failed batch pushes the next attempt out by base_backoff * 2^(failures - 1), capped at
+    max_backoff, so a failing sink is never retried in a hot loop. After failure_threshold
+    consecutive failures the breaker opens; once the backoff elapses a single probe batch is
+    let through (half-open) and its outcome closes or re-opens the breaker.
+
+    Time comes in as timestamps (workflow.now()), so it is deterministic inside a workflow.
+    """
+    failure_threshold: int = 3
+    base_backoff_seconds: float = 2.0
+    max_backoff_seconds: float = 300.0
+
+    state: str = CLOSED
+    consecutive_failures: int = 0
+    retry_after_ts: Optional[float] = None
+    trips: int = 0  # how many times the breaker has opened
+
+    def blocked_for(self, now_ts: float) -> float:
+        """Seconds until another batch may start because of backoff (0 when not backing off)"""
+        if self.retry_after_ts is None:
+            return 0.0
+        return max(0.0, self.retry_after_ts - now_ts)
+
+    def admits(self, now_ts: float, in_flight_batches: int) -> bool:
+        """Whether a new batch may start now; while open/half-open only one probe may be in flight"""
+        if self.blocked_for(now_ts) > 0:
+            return False
+        if self.state != CLOSED and in_flight_batches > 0:
+            return False
+        return True
+
+    def on_batch_started(self):
+        if self.state == OPEN:
+            # Backoff elapsed - this batch is the probe
+            self.state = HALF_OPEN
+
+    def record_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.retry_after_ts = None
+
+    def record_failure(self, now_ts: float):
+        self.consecutive_failures += 1
+        backoff = min(self.max_backoff_seconds,
+                      self.base_backoff_seconds * 2 ** (self.consecutive_failures - 1))
+        self.retry_after_ts = now_ts + backoff
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+
+    def snapshot(self, now_ts: float) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(self.blocked_for(now_ts), 3),
+            "trips": self.trips
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_ts": self.retry_after_ts,
+            "trips": self.trips
+        }
+
+    def restore(self, data: Optional[Dict[str, Any]]):
+        """Restore breaker state carried over from a previous execution (thresholds come from config)"""
+        if not data:
+            return
+        self.state = data.get("state", CLOSED)
+        if self.state == HALF_OPEN:
+            # The probe didn't survive continue-as-new; the next batch probes again
+            self.state = OPEN
+        self.consecutive_failures = data.get("consecutive_failures", 0)
+        self.retry_after_ts = data.get("retry_after_ts")
+        self.trips = data.get("trips", 0)
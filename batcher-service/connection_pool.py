@@ -0,0 +1,182 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Size-bounded, thread-safe pool of long-lived connections, shared by every activity the worker runs.
+
+    Connections are created lazily up to max_size. A connection that sat idle longer than
+    health_check_interval_seconds, or whose last use raised, is validated before it is handed
+    out again; one that fails validation is closed and replaced.
+    """
+
+    def __init__(self, connect: Callable[[], Any], validate: Callable[[Any], None],
+                 max_size: int = 4, checkout_timeout_seconds: float = 10.0,
+                 health_check_interval_seconds: float = 30.0):
+        self._connect = connect
+        self._validate = validate
+        self.max_size = max_size
+        self.checkout_timeout_seconds = checkout_timeout_seconds
+        self.health_check_interval_seconds = health_check_interval_seconds
+
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()  # (connection, idle since, needs check)
+        self._lock = threading.Lock()
+        self._size = 0
+        self._closed = False
+
+        # Metrics
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.created = 0
+        self.discarded = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = self._checkout()
+        failed = False
+        try:
+            yield conn
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._checkin(conn, failed)
+
+    def _checkout(self) -> Any:
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout_seconds
+        while True:
+            conn = self._acquire(deadline)
+            if conn is not None:
+                break
+        waited = time.monotonic() - started
+
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return conn
+
+    def _acquire(self, deadline: float) -> Optional[Any]:
+        """One attempt to get a healthy connection; None means the idle one was unhealthy, try again"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        try:
+            conn, idle_since, needs_check = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve_slot():
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    with self._lock:
+                        self.checkout_failures += 1
+                    raise
+                with self._lock:
+                    self.created += 1
+                return conn
+            try:
+                conn, idle_since, needs_check = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                with self._lock:
+                    self.checkout_failures += 1
+                raise PoolTimeoutError(f"No connection available within {self.checkout_timeout_seconds}s "
+                                       f"(pool size {self.max_size})")
+
+        if needs_check or time.monotonic() - idle_since > self.health_check_interval_seconds:
+            if not self._healthy(conn):
+                self._discard(conn)
+                return None
+        return conn
+
+    def _checkin(self, conn: Any, failed: bool):
+        with self._lock:
+            self.in_use -= 1
+        if self._closed:
+            self._discard(conn)
+            return
+        # A connection whose last use raised is validated before anyone else gets it
+        self._idle.put((conn, time.monotonic(), failed))
+
+    def _healthy(self, conn: Any) -> bool:
+        try:
+            self._validate(conn)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn: Any):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._release_slot()
+        with self._lock:
+            self.discarded += 1
+
+    def _reserve_slot(self) -> bool:
+        with self._lock:
+            if self._size >= self.max_size:
+                return False
+            self._size += 1
+            return True
+
+    def _release_slot(self):
+        with self._lock:
+            self._size -= 1
+
+    def health_check(self) -> Dict[str, Any]:
+        """Validate every idle connection now, replacing broken ones on their next checkout"""
+        checked = 0
+        unhealthy = 0
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for conn, _, _ in idle:
+            checked += 1
+            if self._healthy(conn):
+                self._idle.put((conn, time.monotonic(), False))
+            else:
+                unhealthy += 1
+                self._discard(conn)
+        return {"checked": checked, "unhealthy": unhealthy}
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self.in_use,
+                "idle": self._size - self.in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "created": self.created,
+                "discarded": self.discarded,
+                "avg_wait_ms": round(self.total_wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3)
+            }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
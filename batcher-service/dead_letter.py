@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_DEAD_LETTER_DB = os.environ.get(
+    "DEAD_LETTER_DB", os.path.join(tempfile.gettempdir(), "temporal-batching-dlq.sqlite3")
+)
+
+# Fields the batcher adds when it queues a record; stripped on replay so it re-derives them
+INTERNAL_FIELDS = ("payload_bytes", "deadline_ts", "received_at", "batch_sequence", "attempts", "last_error")
+
+
+class DeadLetterStore:
+    """
+    SQLite table of write requests the batcher gave up on after too many failed attempts.
+    Entries are never deleted by replay, only marked replayed, so the table doubles as an audit log.
+    """
+
+    def __init__(self, path: str = DEFAULT_DEAD_LETTER_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    request_id TEXT NOT NULL,
+                    batcher_id TEXT NOT NULL,
+                    batch_id TEXT,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    request TEXT NOT NULL,
+                    dead_lettered_at TEXT NOT NULL,
+                    replayed_at TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS dead_letters_pending ON dead_letters (replayed_at, id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_many(self, entries: List[Dict[str, Any]]) -> int:
+        """Store {"request", "batcher_id", "batch_id", "attempts", "last_error"} entries in one transaction"""
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (
+                entry["request"].get("request_id", ""),
+                entry["batcher_id"],
+                entry.get("batch_id"),
+                entry.get("attempts", 0),
+                entry.get("last_error"),
+                json.dumps(entry["request"], default=str),
+                now
+            )
+            for entry in entries
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO dead_letters (request_id, batcher_id, batch_id, attempts, last_error, request, "
+                "dead_lettered_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def list(self, batcher_id: Optional[str] = None, include_replayed: bool = False,
+             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM dead_letters WHERE 1 = 1"
+        params: List[Any] = []
+        if not include_replayed:
+            query += " AND replayed_at IS NULL"
+        if batcher_id:
+            query += " AND batcher_id = ?"
+            params.append(batcher_id)
+        query += " ORDER BY id"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [{**dict(row), "request": json.loads(row["request"])} for row in rows]
+
+    def mark_replayed(self, entry_ids: List[int]):
+        if not entry_ids:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        with self._connect() as conn:
+            conn.executemany("UPDATE dead_letters SET replayed_at = ? WHERE id = ?",
+                             [(now, entry_id) for entry_id in entry_ids])
+
+
+def replayable_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The original write request, ready to be submitted again: batcher bookkeeping is dropped,
+    and so is the deadline (it has passed) and update-based confirmation (nobody is waiting on it)
+    """
+    dropped = INTERNAL_FIELDS + ("deadline", "confirmation")
+    return {key: value for key, value in request.items() if key not in dropped}
@@ -0,0 +1,114 @@
+import base64
+import hashlib
+from typing import Any, Dict, List, Optional, Set
+
+
+# Serialized cost of one fingerprint: 8 bytes, base64-encoded (4/3), rounded up
+SERIALIZED_BYTES_PER_FINGERPRINT = 11
+
+
+def _encode(fingerprints: Set[int]) -> str:
+    return base64.b64encode(b"".join(fp.to_bytes(8, "big") for fp in sorted(fingerprints))).decode("ascii")
+
+
+def _decode(encoded: str) -> Set[int]:
+    raw = base64.b64decode(encoded)
+    return {int.from_bytes(raw[i:i + 8], "big") for i in range(0, len(raw), 8)}
+
+
+def fingerprint(request_id: str) -> int:
+    """64-bit fingerprint of a request ID (stable across processes, unlike hash())"""
+    return int.from_bytes(hashlib.blake2b(request_id.encode(), digest_size=8).digest(), "big")
+
+
+class DedupIndex:
+    """
+    Windowed index of recently completed request IDs.
+
+    Stores 64-bit fingerprints in a ring of time buckets: bucket i covers
+    [epoch * bucket_seconds, (epoch + 1) * bucket_seconds) and lives in slot epoch % num_buckets.
+    A slot is recycled when time reaches a newer epoch for it, so entries expire after
+    roughly window_seconds and the size stays bounded by the window (and max_fingerprints).
+    Pure and deterministic so it can be carried in workflow state across continue-as-new.
+
+    The index travels in the continue-as-new input next to pending_writes, so its serialized size
+    (about 11 bytes per fingerprint) is capped by max_bytes: 512 KB holds ~46k fingerprints, i.e. the full
+    600s window up to ~75 completed requests/s per shard. Above that the oldest buckets are dropped
+    early and the effective window shrinks (counted in `evicted`) instead of the payload outgrowing 2 MiB.
+    """
+
+    def __init__(self, window_seconds: float = 600, bucket_seconds: float = 60, max_bytes: int = 512_000):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = max(1, int(-(-window_seconds // bucket_seconds)))  # ceil
+        self.max_fingerprints = max(1, max_bytes // SERIALIZED_BYTES_PER_FINGERPRINT)
+        self.evicted = 0  # fingerprints dropped by the size cap before their window ended
+        self._epochs: List[Optional[int]] = [None] * self.num_buckets
+        self._slots: List[Set[int]] = [set() for _ in range(self.num_buckets)]
+
+    def _epoch(self, now_ts: float) -> int:
+        return int(now_ts // self.bucket_seconds)
+
+    def expire(self, now_ts: float):
+        """Drop buckets that have fallen out of the window"""
+        oldest_live = self._epoch(now_ts) - self.num_buckets + 1
+        for slot, epoch in enumerate(self._epochs):
+            if epoch is not None and epoch < oldest_live:
+                self._epochs[slot] = None
+                self._slots[slot] = set()
+
+    def add(self, request_id: str, now_ts: float):
+        epoch = self._epoch(now_ts)
+        slot = epoch % self.num_buckets
+        if self._epochs[slot] != epoch:
+            self._epochs[slot] = epoch
+            self._slots[slot] = set()
+        self._slots[slot].add(fingerprint(request_id))
+        self._enforce_cap(epoch)
+
+    def _enforce_cap(self, current_epoch: Optional[int] = None):
+        """Hard cap: under extreme rates give up the oldest buckets rather than outgrow the byte budget"""
+        while len(self) > self.max_fingerprints:
+            live = [(e, s) for s, e in enumerate(self._epochs) if e is not None and e != current_epoch]
+            if not live:
+                break
+            _, oldest_slot = min(live)
+            self.evicted += len(self._slots[oldest_slot])
+            self._epochs[oldest_slot] = None
+            self._slots[oldest_slot] = set()
+
+    def contains(self, request_id: str, now_ts: float) -> bool:
+        # Read-only (safe from queries): expired buckets are skipped rather than dropped
+        oldest_live = self._epoch(now_ts) - self.num_buckets + 1
+        fp = fingerprint(request_id)
+        return any(
+            fp in self._slots[slot]
+            for slot, epoch in enumerate(self._epochs)
+            if epoch is not None and epoch >= oldest_live
+        )
+
+    def __len__(self) -> int:
+        return sum(len(fingerprints) for fingerprints in self._slots)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": [
+                [epoch, _encode(self._slots[slot])]
+                for slot, epoch in enumerate(self._epochs)
+                if epoch is not None and self._slots[slot]
+            ]
+        }
+
+    def restore(self, data: Optional[Dict[str, Any]], now_ts: float):
+        """Load buckets carried over from a previous execution (window size comes from config)"""
+        if not data or data.get("bucket_seconds") != self.bucket_seconds:
+            # Different bucket width: the old fingerprints can't be placed, start a fresh window
+            return
+        for epoch, fingerprints in data.get("buckets", []):
+            slot = epoch % self.num_buckets
+            if self._epochs[slot] is None or self._epochs[slot] < epoch:
+                self._epochs[slot] = epoch
+                self._slots[slot] = _decode(fingerprints)
+        self.expire(now_ts)
+        # A window carried over under a larger budget is trimmed to this one
+        self._enforce_cap(self._epoch(now_ts))
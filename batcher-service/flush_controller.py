@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class AdaptiveFlushController:
+    """
+    AIMD controller for the batcher's batch size and flush interval.
+
+    Batch size grows additively while full batches are written at a per-row latency close to the
+    best seen so far, and is cut multiplicatively once the sink slows down (or a write fails).
+    Comparing per-row rather than whole-batch latency matters: for any sink whose cost grows with
+    the number of rows, a bigger batch takes longer without the sink being any less healthy.
+    Only full batches are judged: a partial batch spreads the fixed cost of a write over fewer rows,
+    so its per-row latency is higher on a perfectly healthy sink.
+    The flush interval shrinks while timer flushes carry partial batches (quiet periods don't
+    hold records for the full interval), grows while the sink is congested so more records
+    coalesce, and never exceeds twice the time needed to fill a batch at the observed
+    arrival rate.
+
+    Pure and deterministic so it can live in workflow state across continue-as-new.
+    """
+    batch_size: int
+    wait_seconds: float
+    min_batch_size: int = 10
+    max_batch_size: int = 1000
+    min_wait_seconds: float = 2.0
+    max_wait_seconds: float = 20.0
+    additive_increase: int = 10
+    multiplicative_decrease: float = 0.5
+    wait_step_seconds: float = 1.0
+    wait_decay: float = 0.8
+    latency_tolerance: float = 1.5  # per-row latency above baseline * tolerance counts as "sink slowing down"
+    baseline_drift: float = 0.02  # lets the baseline re-learn if the sink gets permanently slower
+    smoothing: float = 0.3  # EWMA weight of the newest sample
+    fill_time_headroom: float = 2.0
+
+    # Observations
+    baseline_row_latency: Optional[float] = None  # best seconds per row of full batches, drifting up slowly
+    latency_ewma: Optional[float] = None  # whole-batch write time, used to plan deadline flushes
+    arrival_rate: Optional[float] = None  # records per second
+
+    # Decision bookkeeping (exposed through get_stats)
+    last_decision: str = "initial"
+    increases: int = 0
+    decreases: int = 0
+
+    def observe_arrivals(self, count: int, elapsed_seconds: float):
+        """Fold the number of records that arrived over an interval into the arrival-rate EWMA"""
+        if elapsed_seconds <= 0:
+            return
+        rate = count / elapsed_seconds
+        self.arrival_rate = rate if self.arrival_rate is None else self._smooth(self.arrival_rate, rate)
+        self._cap_wait_to_fill_time()
+
+    def observe_batch(self, batch_size: int, duration_seconds: float):
+        """Adjust batch size and flush interval after a successful batch write"""
+        self.latency_ewma = (duration_seconds if self.latency_ewma is None
+                             else self._smooth(self.latency_ewma, duration_seconds))
+        if batch_size < self.batch_size:
+            # Timer flush of a partial batch: it says nothing about larger batches, and its per-row
+            # latency can't be compared with the baseline, but waiting less costs nothing
+            self.wait_seconds = max(self.min_wait_seconds, self.wait_seconds * self.wait_decay)
+            self.last_decision = f"shorten interval: partial batch ({batch_size}/{self.batch_size})"
+            self._cap_wait_to_fill_time()
+            return
+
+        row_latency = duration_seconds / max(1, batch_size)
+        if self.baseline_row_latency is None:
+            self.baseline_row_latency = row_latency
+        else:
+            self.baseline_row_latency = min(self.baseline_row_latency * (1 + self.baseline_drift), row_latency)
+
+        if row_latency > self.baseline_row_latency * self.latency_tolerance:
+            self._back_off(f"per-row latency {row_latency * 1000:.2f}ms > {self.latency_tolerance}x baseline "
+                           f"{self.baseline_row_latency * 1000:.2f}ms")
+        else:
+            self.batch_size = min(self.max_batch_size, self.batch_size + self.additive_increase)
+            self.increases += 1
+            self.last_decision = f"increase: per-row latency flat at {row_latency * 1000:.2f}ms"
+        self._cap_wait_to_fill_time()
+
+    def observe_failure(self):
+        """A failed batch write is the strongest congestion signal"""
+        self._back_off("batch write failed")
+
+    def _back_off(self, reason: str):
+        self.batch_size = max(self.min_batch_size, int(self.batch_size * self.multiplicative_decrease))
+        self.wait_seconds = min(self.max_wait_seconds, self.wait_seconds + self.wait_step_seconds)
+        self.decreases += 1
+        self.last_decision = f"decrease: {reason}"
+
+    def _cap_wait_to_fill_time(self):
+        # Waiting much longer than it takes to fill a batch only adds latency
+        if self.arrival_rate:
+            fill_time = self.batch_size / self.arrival_rate * self.fill_time_headroom
+            self.wait_seconds = max(self.min_wait_seconds, min(self.wait_seconds, fill_time))
+
+    def _smooth(self, current: float, sample: float) -> float:
+        return (1 - self.smoothing) * current + self.smoothing * sample
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "baseline_row_latency_seconds": self.baseline_row_latency,
+            "latency_ewma_seconds": self.latency_ewma,
+            "arrival_rate_per_second": self.arrival_rate,
+            "last_decision": self.last_decision,
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "wait_seconds": self.wait_seconds,
+            "baseline_row_latency": self.baseline_row_latency,
+            "latency_ewma": self.latency_ewma,
+            "arrival_rate": self.arrival_rate,
+            "last_decision": self.last_decision,
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
+
+    def restore(self, data: Optional[Dict[str, Any]]):
+        """Restore observations carried over from a previous execution (bounds come from config)"""
+        if not data:
+            return
+        self.batch_size = max(self.min_batch_size, min(self.max_batch_size, data.get("batch_size", self.batch_size)))
+        self.wait_seconds = max(self.min_wait_seconds,
+                                min(self.max_wait_seconds, data.get("wait_seconds", self.wait_seconds)))
+        self.baseline_row_latency = data.get("baseline_row_latency")
+        self.latency_ewma = data.get("latency_ewma")
+        self.arrival_rate = data.get("arrival_rate")
+        self.last_decision = data.get("last_decision", self.last_decision)
+        self.increases = data.get("increases", 0)
+        self.decreases = data.get("decreases", 0)
@@ -0,0 +1,77 @@
+import asyncio
+import argparse
+from typing import Optional
+from temporalio.client import Client
+
+from dead_letter import DeadLetterStore, replayable_request
+
+
+def print_entries(entries):
+    if not entries:
+        print("✅ Dead-letter table is empty")
+        return
+
+    for entry in entries:
+        replayed = f" | replayed {entry['replayed_at']}" if entry["replayed_at"] else ""
+        print(f"{entry['id']:4d}. {entry['request_id']} | {entry['batcher_id']} | {entry['attempts']} attempts | "
+              f"{entry['dead_lettered_at']}{replayed}")
+        print(f"      Last error: {entry['last_error']}")
+
+
+async def replay(client: Client, store: DeadLetterStore, batcher_id: Optional[str] = None,
+                 limit: Optional[int] = None, target: Optional[str] = None, dry_run: bool = False):
+    """
+    Re-inject dead-lettered writes into the batcher they came from (or target) with add_write_request.
+    Entries are marked replayed one by one, so an interrupted replay can simply be run again.
+    """
+    entries = store.list(batcher_id=batcher_id, limit=limit)
+    if not entries:
+        print("✅ Nothing to replay")
+        return
+
+    replayed = 0
+    failed = 0
+    for entry in entries:
+        destination = target or entry["batcher_id"]
+        request = replayable_request(entry["request"])
+        if dry_run:
+            print(f"🔍 Would replay {entry['request_id']} to {destination}")
+            continue
+
+        try:
+            await client.get_workflow_handle(destination).signal("add_write_request", request)
+        except Exception as e:
+            failed += 1
+            print(f"❌ Failed to replay {entry['request_id']} to {destination}: {e}")
+            continue
+
+        store.mark_replayed([entry["id"]])
+        replayed += 1
+        print(f"🔁 Replayed {entry['request_id']} to {destination}")
+
+    if not dry_run:
+        print(f"📊 Replayed {replayed}/{len(entries)} dead-lettered writes ({failed} failed)")
+
+
+async def main(args):
+    store = DeadLetterStore(args.db) if args.db else DeadLetterStore()
+
+    if args.command == "list":
+        print_entries(store.list(batcher_id=args.batcher_id, include_replayed=args.all, limit=args.limit))
+        return
+
+    client = await Client.connect("localhost:7233")
+    await replay(client, store, args.batcher_id, args.limit, args.target, args.dry_run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and replay dead-lettered write requests")
+    parser.add_argument("command", choices=["list", "replay"], help="List entries or re-inject them into the batcher")
+    parser.add_argument("--db", help="Dead-letter SQLite database (default: $DEAD_LETTER_DB or the temp directory)")
+    parser.add_argument("--batcher-id", help="Only entries dead-lettered by this batcher")
+    parser.add_argument("--target", help="Replay into this batcher instead of the one each entry came from")
+    parser.add_argument("--limit", type=int, help="Maximum number of entries")
+    parser.add_argument("--all", action="store_true", help="With list: include entries that were already replayed")
+    parser.add_argument("--dry-run", action="store_true", help="With replay: show what would be replayed")
+
+    asyncio.run(main(parser.parse_args()))
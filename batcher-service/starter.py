@@ -1,27 +1,43 @@
 import asyncio
+import argparse
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 from temporalio.client import Client, WorkflowExecutionStatus
 from temporalio.exceptions import ApplicationError
 from workflow import BatcherWorkflow
 
 
+LEGACY_BATCHER_ID = "batcher-main"
+BATCHER_ID_PREFIX = "batcher"
+
+
+def batcher_ids(num_shards: int) -> List[str]:
+    """Workflow IDs of the batcher pool; must match main-service/routing.py (tests/test_batcher_ids.py checks it)"""
+    if num_shards <= 1:
+        return [LEGACY_BATCHER_ID]
+    return [f"{BATCHER_ID_PREFIX}-{i}" for i in range(num_shards)]
+
+
 class BatcherManager:
-    """Manager for the batcher workflow with health monitoring"""
+    """Manager for the batcher workflow pool with health monitoring"""
     
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, num_shards: int = 1, config: Optional[Dict[str, Any]] = None):
         self.client = client
-        self.batcher_id = "batcher-main"
+        self.num_shards = num_shards
+        self.config = config or {}  # BatcherConfig overrides, only applied to freshly started batchers
+        self.batcher_ids = batcher_ids(num_shards)
         self.task_queue = "batcher-queue"
         self.health_check_interval = 30  # seconds
         
-    async def start_or_resume_batcher(self):
+    async def start_or_resume_batcher(self, batcher_id: str):
         """Start batcher or resume if already running"""
         
         try:
             # Try to start a fresh batcher
             batcher_handle = await self.client.start_workflow(
                 BatcherWorkflow.run,
-                id=self.batcher_id,
+                args=[None, self.config],
+                id=batcher_id,
                 task_queue=self.task_queue
             )
             
@@ -30,64 +46,134 @@ class BatcherManager:
             
         except Exception as e:
             if "already started" in str(e).lower() or "already exists" in str(e).lower():
-                print("ℹ️  Batcher workflow already running, getting handle...")
-                batcher_handle = self.client.get_workflow_handle(self.batcher_id)
+                print(f"ℹ️  Batcher workflow {batcher_id} already running, getting handle...")
+                batcher_handle = self.client.get_workflow_handle(batcher_id)
                 
                 # Check if it's actually running
                 description = await batcher_handle.describe()
                 if description.status == WorkflowExecutionStatus.RUNNING:
-                    print("✅ Connected to existing running batcher")
+                    print(f"✅ Connected to existing running batcher {batcher_id}")
                     return batcher_handle
                 else:
-                    print(f"⚠️  Existing batcher is in status: {description.status}")
+                    print(f"⚠️  Existing batcher {batcher_id} is in status: {description.status}")
                     return None
             else:
-                print(f"❌ Error starting batcher: {e}")
+                print(f"❌ Error starting batcher {batcher_id}: {e}")
                 return None
     
-    async def monitor_batcher_health(self, batcher_handle):
-        """Monitor batcher health and display statistics"""
+    async def start_or_resume_pool(self) -> Dict[str, object]:
+        """Start or resume every batcher shard, returning handles for the ones that are running"""
+        
+        handles = await asyncio.gather(
+            *[self.start_or_resume_batcher(batcher_id) for batcher_id in self.batcher_ids]
+        )
+        return {
+            batcher_id: handle
+            for batcher_id, handle in zip(self.batcher_ids, handles)
+            if handle is not None
+        }
+    
+    async def check_batcher(self, batcher_id: str, batcher_handle):
+        """Query one batcher and return (stats, handle), following continue-as-new; handle is None once it stops"""
+        
+        stats = await batcher_handle.query("get_stats")
+        
+        # Check if batcher is still running
+        description = await batcher_handle.describe()
+        if description.status != WorkflowExecutionStatus.RUNNING:
+            print(f"⚠️  Batcher {batcher_id} status changed to: {description.status}")
+            
+            if description.status == WorkflowExecutionStatus.CONTINUED_AS_NEW:
+                print(f"🔄 Batcher {batcher_id} continued-as-new, updating handle...")
+                # Get the new execution handle
+                batcher_handle = self.client.get_workflow_handle(
+                    batcher_id,
+                    run_id=description.latest_execution_run_id
+                )
+                print("✅ Updated to new execution handle")
+            else:
+                print(f"❌ Batcher {batcher_id} is no longer running")
+                batcher_handle = None
+        
+        return stats, batcher_handle
+    
+    def print_batcher_stats(self, batcher_id: str, stats: Dict):
+        print(f"  [{batcher_id}]")
+        print(f"    📝 Pending writes: {stats['pending_writes']} ({stats.get('pending_rows', stats['pending_writes'])} "
+              f"rows, {stats['pending_bytes']} bytes)")
+        if 'backlog_bytes' in stats:
+            print(f"    🧱 Backlog: {stats['backlog_bytes']}/{stats['max_pending_bytes']} bytes, "
+                  f"{stats['writes_turned_away']} writes turned away")
+        print(f"    ✅ Processed batches: {stats['processed_batches']}")
+        print(f"    🚚 In-flight batches: {stats['in_flight_batches']}/{stats['max_in_flight_batches']}")
+        print(f"    📨 Session signals: {stats['session_signals_received']}")
+        print(f"    🆔 Tracked request IDs: {stats['active_request_ids_count']} pending, "
+              f"{stats['completed_request_fingerprints']} completed in dedup window"
+              + (f" ({stats['dedup_evicted']} evicted early by the size cap)" if stats.get('dedup_evicted') else ""))
+        print(f"    📏 Batch size / flush interval: {stats['batch_size_limit']} / {stats['max_batch_wait_seconds']:.1f}s")
+        print(f"    ⏰ Deadline misses / early flushes: {stats['deadline_misses']} / {stats['deadline_flushes']}")
+        breaker = stats['circuit_breaker']
+        print(f"    🔌 Circuit breaker: {breaker['state']} ({breaker['consecutive_failures']} consecutive failures, "
+              f"retry in {breaker['retry_in_seconds']}s, {breaker['trips']} trips)")
+        print(f"    ♻️  Duplicate writes suppressed by the sink: {stats['duplicates_suppressed']}")
+        print(f"    ☠️  Dead-lettered writes: {stats['dead_lettered']} (after {stats['max_write_attempts']} attempts)")
+        pool = stats.get('sink_pool')
+        if pool:
+            print(f"    🏊 Sink pool: {pool['in_use']}/{pool['max_size']} in use, wait avg {pool['avg_wait_ms']}ms "
+                  f"max {pool['max_wait_ms']}ms, {pool['checkout_failures']} checkout failures")
+        threads = stats.get('writer_threads')
+        if threads:
+            print(f"    🧵 Writer threads: {threads['active']}/{threads['max_workers']} busy, {threads['queued']} queued, "
+                  f"queue wait max {threads['max_queue_wait_ms']}ms, {threads['saturated_submissions']} saturated submissions")
+        print(f"    📬 Failed confirmations: {stats['failed_confirmations']} ({stats['confirmation_mode']} mode)")
+        controller = stats.get('flush_controller')
+        if controller:
+            print(f"    🎛️  Flush controller: {controller['last_decision']} "
+                  f"(+{controller['increases']}/-{controller['decreases']})")
+        print(f"    🔄 Continue-as-new cycle: {stats['continue_as_new_cycle']}")
+        print(f"    💡 Temporal suggests continue: {stats['is_continue_suggested']}")
+    
+    async def monitor_pool_health(self, handles: Dict[str, object]):
+        """Monitor every batcher in the pool and display per-shard and aggregate statistics"""
         
-        print("\n🔄 Starting batcher health monitoring...")
+        print("\n🔄 Starting batcher pool health monitoring...")
         print("=" * 70)
         
-        while True:
-            try:
-                # Query batcher statistics
-                stats = await batcher_handle.query("get_stats")
-                current_time = datetime.now().strftime("%H:%M:%S")
-                
-                print(f"[{current_time}] Batcher Stats:")
-                print(f"  📝 Pending writes: {stats['pending_writes']}")
-                print(f"  ✅ Processed batches: {stats['processed_batches']}")
-                print(f"  📨 Session signals: {stats['session_signals_received']}")
-                print(f"  🆔 Tracked request IDs: {stats['processed_request_ids_count']}")
-                print(f"  🔄 Continue-as-new cycle: {stats['continue_as_new_cycle']}")
-                print(f"  💡 Temporal suggests continue: {stats['is_continue_suggested']}")
-                print("-" * 50)
-                
-                # Check if batcher is still running
-                description = await batcher_handle.describe()
-                if description.status != WorkflowExecutionStatus.RUNNING:
-                    print(f"⚠️  Batcher status changed to: {description.status}")
-                    
-                    if description.status == WorkflowExecutionStatus.CONTINUED_AS_NEW:
-                        print("🔄 Batcher continued-as-new, updating handle...")
-                        # Get the new execution handle
-                        batcher_handle = self.client.get_workflow_handle(
-                            self.batcher_id,
-                            run_id=description.latest_execution_run_id
-                        )
-                        print("✅ Updated to new execution handle")
-                    else:
-                        print("❌ Batcher is no longer running")
-                        break
+        while handles:
+            current_time = datetime.now().strftime("%H:%M:%S")
+            print(f"[{current_time}] Batcher Pool Stats ({len(handles)}/{len(self.batcher_ids)} running):")
+            
+            batcher_ids = list(handles)
+            checks = await asyncio.gather(
+                *[self.check_batcher(batcher_id, handles[batcher_id]) for batcher_id in batcher_ids],
+                return_exceptions=True
+            )
+            
+            total_pending = 0
+            total_batches = 0
+            for batcher_id, check in zip(batcher_ids, checks):
+                if isinstance(check, Exception):
+                    print(f"❌ Error monitoring batcher {batcher_id}: {check}")
+                    continue
                 
-                await asyncio.sleep(self.health_check_interval)
+                stats, batcher_handle = check
+                self.print_batcher_stats(batcher_id, stats)
+                total_pending += stats['pending_writes']
+                total_batches += stats['processed_batches']
                 
-            except Exception as e:
-                print(f"❌ Error monitoring batcher health: {e}")
+                if batcher_handle is None:
+                    del handles[batcher_id]
+                else:
+                    handles[batcher_id] = batcher_handle
+            
+            if len(batcher_ids) > 1:
+                print(f"  Σ Pool: {total_pending} pending writes, {total_batches} processed batches")
+            print("-" * 50)
+            
+            if handles:
                 await asyncio.sleep(self.health_check_interval)
+        
+        print("❌ No batchers in the pool are running")
     
     async def run(self):
         """Main run method"""
@@ -101,30 +187,35 @@ class BatcherManager:
         print("  • Uses Temporal's continue-as-new suggestions")
         print("  • Safety mechanisms for runaway cycles")
         print("=" * 60)
+        print(f"🔀 Batcher pool: {', '.join(self.batcher_ids)}")
         
-        batcher_handle = await self.start_or_resume_batcher()
-        if not batcher_handle:
+        handles = await self.start_or_resume_pool()
+        if not handles:
             print("❌ Failed to start or connect to batcher")
             return
         
+        missing = [batcher_id for batcher_id in self.batcher_ids if batcher_id not in handles]
+        if missing:
+            print(f"⚠️  Batcher shards not running: {', '.join(missing)}")
+        
         print("=" * 60)
         print("🌐 View in Temporal Web UI: http://localhost:8233")
         print("💡 Press Ctrl+C to stop monitoring")
         print("=" * 60)
         
         try:
-            await self.monitor_batcher_health(batcher_handle)
+            await self.monitor_pool_health(handles)
         except KeyboardInterrupt:
             print("\n👋 Stopping batcher monitoring...")
         except Exception as e:
             print(f"\n❌ Error in batcher management: {e}")
 
 
-async def main():
+async def main(num_shards: int = 1, config: Optional[Dict[str, Any]] = None):
     """Main entry point"""
     try:
         client = await Client.connect("localhost:7233")
-        manager = BatcherManager(client)
+        manager = BatcherManager(client, num_shards, config)
         await manager.run()
         
     except KeyboardInterrupt:
@@ -134,4 +225,59 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Start and monitor the batcher pool")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Number of batcher shards (batcher-0..batcher-N-1); 1 runs the single batcher-main (default: 1)"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=2,
+        help="Batches each batcher may write concurrently while accumulating the next one (default: 2)"
+    )
+    parser.add_argument(
+        "--confirmations",
+        choices=["signal", "activity"],
+        default="signal",
+        help="Confirm writes with one signal per request from the batcher, or with a single "
+             "deliver_confirmations activity per batch (default: signal)"
+    )
+    parser.add_argument(
+        "--max-write-attempts",
+        type=int,
+        default=5,
+        help="Failed attempts after which a write is moved to the dead-letter table (default: 5)"
+    )
+    parser.add_argument(
+        "--max-pending-bytes",
+        type=int,
+        default=800_000,
+        help="Backlog (pending and in-flight writes) above which new writes are turned away; it is carried "
+             "through continue-as-new, so keep it well under 2 MiB (default: 800000)"
+    )
+    parser.add_argument(
+        "--static-flush",
+        action="store_true",
+        help="Disable the adaptive batch size / flush interval controller"
+    )
+    args = parser.parse_args()
+    
+    if args.shards < 1:
+        print("❌ Number of shards must be at least 1")
+    elif args.max_in_flight < 1:
+        print("❌ Max in-flight batches must be at least 1")
+    elif args.max_write_attempts < 1:
+        print("❌ Max write attempts must be at least 1")
+    elif not 0 < args.max_pending_bytes < 2 * 1024 * 1024:
+        print("❌ Max pending bytes must be positive and under 2 MiB")
+    else:
+        asyncio.run(main(args.shards, {
+            "max_in_flight_batches": args.max_in_flight,
+            "adaptive_flush": not args.static_flush,
+            "confirmation_mode": args.confirmations,
+            "max_write_attempts": args.max_write_attempts,
+            "max_pending_bytes": args.max_pending_bytes
+        }))
\ No newline at end of file
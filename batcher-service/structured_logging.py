@@ -0,0 +1,125 @@
+import copy
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, plus every `extra` field"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        elif record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps `extra` fields and the traceback separate for the JSON formatter"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only render what can't safely cross threads (args, exc_info); formatting happens on the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RecordSampler:
+    """
+    Decides which individual records get a log line. Sampling is by request ID hash, so the same
+    record is either always or never logged - across retries and partitions.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = max(0.0, min(1.0, rate))
+        self._threshold = int(self.rate * 2 ** 64)
+
+    def sampled(self, key: Optional[str]) -> bool:
+        if self.rate >= 1.0:
+            return True
+        if self.rate <= 0.0 or not key:
+            return False
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") < self._threshold
+
+
+record_sampler = RecordSampler(float(os.environ.get("LOG_SAMPLE_RATE", "0.01")))
+
+
+def sample_record(key: Optional[str]) -> bool:
+    """Whether the record with this request ID gets its own log line"""
+    return record_sampler.sampled(key)
+
+
+def configure_logging(service: str, level: Optional[str] = None, log_file: Optional[str] = None,
+                      sample_rate: Optional[float] = None) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a QueueHandler: callers (the event loop, activity threads) only enqueue,
+    and a listener thread formats and writes JSON lines to stderr and, optionally, a buffered file.
+    Returns the listener; stop() it on shutdown to flush what is still queued.
+    """
+    global record_sampler
+
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    log_file = log_file or os.environ.get("LOG_FILE")
+    if sample_rate is not None:
+        record_sampler = RecordSampler(sample_rate)
+
+    formatter = JsonFormatter(service)
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(formatter)
+    handlers = [console]
+    if log_file:
+        # Buffered: written every 200 lines, on WARNING and above, and when logging stops
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        handlers.append(logging.handlers.MemoryHandler(capacity=200, flushLevel=logging.WARNING,
+                                                       target=file_handler))
+
+    log_queue: "queue.Queue" = queue.Queue(-1)
+    root = logging.getLogger()
+    root.handlers = [_StructuredQueueHandler(log_queue)]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: logging.handlers.QueueListener):
+    """Drain the queue and flush the file buffer"""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
+        if isinstance(handler, logging.handlers.MemoryHandler) and handler.target:
+            handler.target.close()
+        handler.close()
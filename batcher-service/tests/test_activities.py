@@ -0,0 +1,186 @@
+import asyncio
+import dataclasses
+import os
+import sys
+import threading
+import time
+import unittest
+
+from temporalio.testing import ActivityEnvironment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activities import DUPLICATE, REJECTED, RETRYABLE, WRITTEN, BatchWriteActivities, Sink
+
+
+def vector_request(n: int, *data: str) -> dict:
+    return {"request_id": f"req-{n}", "workflow_id": f"wf-{n}", "records": [{"data": d} for d in data]}
+
+
+def write_request(n: int, data: str = None) -> dict:
+    return {"request_id": f"req-{n}", "workflow_id": f"wf-{n}", "data": f"record {n}" if data is None else data}
+
+
+class RecordingSink(Sink):
+    """Keeps what it writes; fails a write containing bad_data with error, or the writes listed in fail_calls"""
+
+    name = "recording"
+
+    def __init__(self, bad_data: str = None, error: Exception = None, fail_calls: dict = None):
+        self.bad_data = bad_data
+        self.error = error
+        self.fail_calls = fail_calls or {}
+        self.calls = 0
+        self.written = []
+        self.rows = []
+        self.batches = []
+
+    def write(self, records):
+        self.calls += 1
+        self.batches.append([record["request_id"] for record in records])
+        if self.calls in self.fail_calls:
+            raise self.fail_calls[self.calls]
+        if any(record["data"] == self.bad_data for record in records):
+            raise self.error
+        self.written.extend(record["request_id"] for record in records)
+        self.rows.extend((record["request_id"], record.get("row_index")) for record in records)
+        return set()
+
+
+class SlowFirstSink(Sink):
+    """Makes the write holding "slow" finish last, and reports records whose data is "dup" as already committed"""
+
+    name = "slow-first"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = []
+
+    def write(self, records):
+        if any(record["data"] == "slow" for record in records):
+            time.sleep(0.2)
+        with self.lock:
+            self.batches.append([record["workflow_id"] for record in records])
+        return {k for k, record in enumerate(records) if record["data"] == "dup"}
+
+
+class BatchWriteActivityTest(unittest.TestCase):
+
+    def run_batch(self, sink: Sink, write_requests, chunk_size: int = 500, env: ActivityEnvironment = None,
+                  partitions: int = 1) -> dict:
+        activities = BatchWriteActivities(sink, chunk_size=chunk_size, partitions=partitions)
+        env = env or ActivityEnvironment()
+        return asyncio.run(env.run(activities.batch_write_to_database, write_requests))
+
+    def test_one_bad_row_is_rejected_and_the_rest_written(self):
+        batch = [write_request(n) for n in range(8)]
+        batch[5] = write_request(5, "poison")
+        sink = RecordingSink("poison", ValueError("value out of range"))
+        result = self.run_batch(sink, batch)
+        outcomes = [r["outcome"] for r in result["results"]]
+        self.assertEqual(outcomes, [WRITTEN] * 5 + [REJECTED] + [WRITTEN] * 2)
+        self.assertEqual(result["results"][5]["error"], "value out of range")
+        self.assertEqual([r["request_id"] for r in result["results"]], [f"req-{n}" for n in range(8)])
+        self.assertEqual((result["written"], result["rejected"]), (7, 1))
+        self.assertEqual(sorted(sink.written), sorted(f"req-{n}" for n in range(8) if n != 5))
+
+    def test_sink_failure_fails_the_whole_batch(self):
+        sink = RecordingSink("record 2", ConnectionError("ledger unreachable"))
+        with self.assertRaises(ConnectionError):
+            self.run_batch(sink, [write_request(n) for n in range(4)])
+        self.assertEqual(sink.written, [])
+
+    def test_sink_failure_while_isolating_is_retryable(self):
+        sink = RecordingSink(fail_calls={1: ValueError("bad row"), 2: ConnectionError("ledger unreachable")})
+        result = self.run_batch(sink, [write_request(n) for n in range(4)])
+        self.assertEqual([r["outcome"] for r in result["results"]], [RETRYABLE] * 2 + [WRITTEN] * 2)
+        self.assertEqual(sink.written, ["req-2", "req-3"])
+
+    def test_retry_resumes_after_heartbeated_chunks(self):
+        batch = [write_request(n) for n in range(10)]
+        batch[1] = write_request(1, "")  # rejected before the write, and must stay rejected after resuming
+        first = ActivityEnvironment()
+        heartbeats = []
+        first.on_heartbeat = lambda *details: heartbeats.append(details[0])
+        sink = RecordingSink(fail_calls={3: ConnectionError("ledger unreachable")})
+        with self.assertRaises(ConnectionError):
+            self.run_batch(sink, batch, chunk_size=3, env=first)
+        self.assertEqual([h["offset"] for h in heartbeats], [3, 6])
+
+        retry = ActivityEnvironment()
+        retry.info = dataclasses.replace(retry.info, attempt=2, heartbeat_details=[heartbeats[-1]])
+        sink.batches = []
+        result = self.run_batch(sink, batch, chunk_size=3, env=retry)
+        self.assertEqual(sink.batches, [["req-6", "req-7", "req-8"], ["req-9"]])
+        self.assertEqual(result["resumed_from"], 6)
+        self.assertEqual([r["request_id"] for r in result["results"]], [f"req-{n}" for n in range(10)])
+        self.assertEqual([r["outcome"] for r in result["results"]], [WRITTEN, REJECTED] + [WRITTEN] * 8)
+        self.assertEqual(sink.written, [f"req-{n}" for n in range(10) if n != 1])
+
+    def test_partitions_finishing_out_of_order_keep_result_order(self):
+        batch = []
+        for n in range(40):
+            request = {"request_id": f"req-{n}", "workflow_id": f"wf-{n % 8}", "data": f"record {n}"}
+            if n == 0:
+                request["data"] = "slow"
+            elif n % 5 == 0:
+                request["data"] = "dup"
+            batch.append(request)
+        sink = SlowFirstSink()
+        result = self.run_batch(sink, batch, partitions=4)
+        self.assertGreater(len(sink.batches), 1)
+        self.assertNotIn("wf-0", sink.batches[0])  # the slow partition committed last
+        self.assertIn("wf-0", sink.batches[-1])
+        self.assertEqual([r["request_id"] for r in result["results"]], [f"req-{n}" for n in range(40)])
+        self.assertEqual([r["outcome"] for r in result["results"]],
+                         [DUPLICATE if n % 5 == 0 and n else WRITTEN for n in range(40)])
+        # Every ordering key is written by exactly one partition
+        for key in {request["workflow_id"] for request in batch}:
+            self.assertEqual(sum(1 for written in sink.batches if key in written), 1)
+        written = [key for written in sink.batches for key in written]
+        self.assertEqual(sorted(written), sorted(request["workflow_id"] for request in batch))
+
+    def test_sync_variant_isolates_bad_row_across_partitions(self):
+        batch = [write_request(n) for n in range(12)]
+        batch[7] = write_request(7, "poison")
+        sink = RecordingSink("poison", ValueError("value out of range"))
+        activities = BatchWriteActivities(sink, partitions=3)
+        try:
+            result = ActivityEnvironment().run(activities.batch_write_to_database_sync, batch)
+        finally:
+            activities.close()
+        self.assertEqual([r["outcome"] for r in result["results"]], [WRITTEN] * 7 + [REJECTED] + [WRITTEN] * 4)
+        self.assertEqual(sorted(sink.written), sorted(f"req-{n}" for n in range(12) if n != 7))
+
+    def test_vector_request_is_written_as_a_unit(self):
+        batch = [write_request(0), vector_request(1, "a", "b", "c"), write_request(2)]
+        sink = RecordingSink()
+        result = self.run_batch(sink, batch)
+        self.assertEqual([r["outcome"] for r in result["results"]], [WRITTEN] * 3)
+        self.assertEqual(result["results"][1]["rows"], [{"outcome": WRITTEN}] * 3)
+        self.assertEqual(sink.rows, [("req-0", None), ("req-1", 0), ("req-1", 1), ("req-1", 2), ("req-2", None)])
+
+    def test_vector_request_with_an_invalid_row_is_rejected_as_a_unit(self):
+        batch = [write_request(0), vector_request(1, "a", "", "c"), write_request(2)]
+        sink = RecordingSink()
+        result = self.run_batch(sink, batch)
+        self.assertEqual([r["outcome"] for r in result["results"]], [WRITTEN, REJECTED, WRITTEN])
+        self.assertEqual([row["outcome"] for row in result["results"][1]["rows"]], [REJECTED] * 3)
+        self.assertEqual(result["results"][1]["error"], "row 1: data must not be empty")
+        self.assertEqual(sink.written, ["req-0", "req-2"])
+
+    def test_vector_request_failing_the_sink_is_rejected_as_a_unit(self):
+        batch = [write_request(n) for n in range(6)]
+        batch[3] = vector_request(3, "a", "poison", "c")
+        sink = RecordingSink("poison", ValueError("constraint failed"))
+        result = self.run_batch(sink, batch)
+        self.assertEqual([r["outcome"] for r in result["results"]], [WRITTEN] * 3 + [REJECTED] + [WRITTEN] * 2)
+        self.assertEqual(result["results"][3]["rows"], [{"outcome": REJECTED, "error": "constraint failed"}] * 3)
+        self.assertNotIn("req-3", sink.written)
+        # Bisection never splits the request's rows into separate writes
+        for written in sink.batches:
+            self.assertIn(written.count("req-3"), (0, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
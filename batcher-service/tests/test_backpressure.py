@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workflow import BatcherConfig, BatcherWorkflow
+
+
+class ByteLimitsTest(unittest.TestCase):
+
+    def batcher(self, config=None) -> BatcherWorkflow:
+        batcher = BatcherWorkflow()
+        batcher.config = BatcherConfig.from_dict(config)
+        batcher.batch_size_limit = 10 ** 6  # Only bytes can fill a batch
+        # Every slot is busy with a byte-full batch, the worst case for the backlog
+        batcher.in_flight_bytes = batcher.config.max_in_flight_batches * batcher.config.max_batch_bytes
+        return batcher
+
+    def fill_until_flush(self, batcher, write_bytes):
+        while not batcher._batch_is_full():
+            self.assertFalse(batcher._backlog_full(write_bytes))
+            batcher.pending_bytes += write_bytes
+            batcher.pending_rows += 1
+
+    def test_byte_flush_happens_before_backpressure(self):
+        batcher = self.batcher()
+        self.fill_until_flush(batcher, 1_000)
+        self.assertGreaterEqual(batcher.pending_bytes, batcher.config.max_batch_bytes)
+        self.assertLessEqual(batcher.pending_bytes, batcher.config.max_pending_bytes // 2)
+        self.assertFalse(batcher._backlog_full(1_000))
+
+    def test_max_batch_bytes_follows_a_smaller_backlog_cap(self):
+        config = BatcherConfig.from_dict({"max_pending_bytes": 100_000, "max_batch_bytes": 1_000_000})
+        self.assertEqual(config.max_batch_bytes, 25_000)
+        batcher = self.batcher(config.to_dict())
+        self.fill_until_flush(batcher, 500)
+        self.assertLessEqual(batcher.pending_bytes, config.max_pending_bytes // 2)
+
+    def test_smaller_max_batch_bytes_is_kept(self):
+        config = BatcherConfig.from_dict({"max_batch_bytes": 50_000})
+        self.assertEqual(config.max_batch_bytes, 50_000)
+
+
+class BacklogRejectionTest(unittest.TestCase):
+
+    def test_retry_after_grows_with_backlog(self):
+        batcher = BatcherWorkflow()
+        self.assertEqual(batcher._backlog_retry_after(0.0), 1.0)
+        batcher.pending_rows = 10 * batcher.batch_size_limit * batcher.config.max_in_flight_batches
+        self.assertEqual(batcher._backlog_retry_after(0.0), 10.0)
+        batcher.circuit_breaker.record_failure(0.0)
+        self.assertEqual(batcher._backlog_retry_after(0.0), 10.0 + batcher.circuit_breaker.blocked_for(0.0))
+
+    def test_rejections_during_a_delivery_go_out_together(self):
+        batcher = BatcherWorkflow()
+        deliveries = []
+
+        async def confirm_writes(batch_id, written):
+            deliveries.append([request["request_id"] for request, _ in written])
+            await asyncio.sleep(0)
+
+        batcher._confirm_writes = confirm_writes
+
+        async def turn_away():
+            for n in range(5):
+                batcher._reject_backlog_full({"request_id": f"req-{n}"}, {"status": "backlog_full"})
+                if n == 1:
+                    await asyncio.sleep(0)  # The first delivery starts with the two rejections so far
+            while batcher.delivering_backlog_rejections:
+                await asyncio.sleep(0)
+
+        asyncio.run(turn_away())
+        self.assertEqual(deliveries, [["req-0", "req-1"], ["req-2", "req-3", "req-4"]])
+        self.assertEqual(batcher.confirmations_in_progress, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
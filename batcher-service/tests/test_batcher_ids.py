@@ -0,0 +1,35 @@
+import importlib.util
+import os
+import sys
+import unittest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from starter import BATCHER_ID_PREFIX, LEGACY_BATCHER_ID, batcher_ids
+
+# The services are deployed separately, so each keeps its own copy of the batcher IDs;
+# load main-service's routing module from its file to check that the two agree
+_spec = importlib.util.spec_from_file_location(
+    "main_service_routing", os.path.join(os.path.dirname(SERVICE_DIR), "main-service", "routing.py"))
+main_routing = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(main_routing)
+
+
+class BatcherIdsTest(unittest.TestCase):
+
+    def test_ids_match_main_service_routing(self):
+        self.assertEqual(LEGACY_BATCHER_ID, main_routing.LEGACY_BATCHER_ID)
+        self.assertEqual(BATCHER_ID_PREFIX, main_routing.BATCHER_ID_PREFIX)
+        for shards in range(0, 9):
+            self.assertEqual(batcher_ids(shards), main_routing.batcher_ids(shards))
+
+    def test_every_routed_batcher_is_started(self):
+        for shards in (1, 3, 8):
+            started = set(batcher_ids(shards))
+            routed = {main_routing.route_to_batcher(f"main-workflow-{i}", shards) for i in range(1000)}
+            self.assertEqual(routed, started)
+
+
+if __name__ == "__main__":
+    unittest.main()
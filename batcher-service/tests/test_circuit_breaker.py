@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def breaker(self) -> CircuitBreaker:
+        return CircuitBreaker(failure_threshold=3, base_backoff_seconds=2.0, max_backoff_seconds=10.0)
+
+    def test_backoff_doubles_and_is_capped(self):
+        breaker = self.breaker()
+        delays = []
+        for _ in range(5):
+            breaker.record_failure(100.0)
+            delays.append(breaker.blocked_for(100.0))
+        self.assertEqual(delays, [2.0, 4.0, 8.0, 10.0, 10.0])
+
+    def test_opens_after_threshold(self):
+        breaker = self.breaker()
+        breaker.record_failure(0.0)
+        breaker.record_failure(0.0)
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure(0.0)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.trips, 1)
+
+    def test_closed_breaker_admits_after_backoff(self):
+        breaker = self.breaker()
+        breaker.record_failure(0.0)
+        self.assertFalse(breaker.admits(1.0, in_flight_batches=0))
+        self.assertTrue(breaker.admits(2.0, in_flight_batches=1))
+
+    def test_open_breaker_admits_single_probe(self):
+        breaker = self.breaker()
+        for _ in range(3):
+            breaker.record_failure(0.0)
+        self.assertFalse(breaker.admits(7.0, in_flight_batches=0))
+        self.assertTrue(breaker.admits(8.0, in_flight_batches=0))
+        breaker.on_batch_started()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.admits(8.0, in_flight_batches=1))
+
+    def test_probe_success_closes(self):
+        breaker = self.breaker()
+        for _ in range(3):
+            breaker.record_failure(0.0)
+        breaker.on_batch_started()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.consecutive_failures, 0)
+        self.assertEqual(breaker.blocked_for(8.0), 0.0)
+
+    def test_probe_failure_reopens(self):
+        breaker = self.breaker()
+        for _ in range(3):
+            breaker.record_failure(0.0)
+        breaker.on_batch_started()
+        breaker.record_failure(8.0)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.trips, 2)
+        self.assertEqual(breaker.blocked_for(8.0), 10.0)
+
+    def test_restore_turns_half_open_into_open(self):
+        breaker = self.breaker()
+        for _ in range(3):
+            breaker.record_failure(0.0)
+        breaker.on_batch_started()
+        restored = self.breaker()
+        restored.restore(breaker.to_dict())
+        self.assertEqual(restored.state, OPEN)
+        self.assertEqual(restored.consecutive_failures, 3)
+        self.assertEqual(restored.retry_after_ts, breaker.retry_after_ts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dead_letter import DeadLetterStore, replayable_request
+from replay_dlq import replay
+
+
+def entry(n: int, batcher_id: str = "batcher-0") -> dict:
+    return {
+        "request": {"request_id": f"req-{n}", "workflow_id": f"wf-{n}", "data": f"record {n}",
+                    "attempts": 5, "last_error": "boom", "payload_bytes": 40, "deadline": "2026-01-01T00:00:00"},
+        "batcher_id": batcher_id,
+        "batch_id": "batch_1",
+        "attempts": 5,
+        "last_error": "boom"
+    }
+
+
+class FakeHandle:
+
+    def __init__(self, client, workflow_id: str):
+        self.client = client
+        self.workflow_id = workflow_id
+
+    async def signal(self, name: str, request: dict):
+        if request["request_id"] in self.client.failing:
+            raise RuntimeError("workflow not found")
+        self.client.signals.append((self.workflow_id, name, request))
+
+
+class FakeClient:
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.signals = []
+
+    def get_workflow_handle(self, workflow_id: str) -> FakeHandle:
+        return FakeHandle(self, workflow_id)
+
+
+class DeadLetterStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DeadLetterStore(os.path.join(self.tmp.name, "dlq.sqlite3"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_and_list_in_order(self):
+        self.assertEqual(self.store.add_many([entry(1), entry(2), entry(3, "batcher-1")]), 3)
+        entries = self.store.list()
+        self.assertEqual([e["request_id"] for e in entries], ["req-1", "req-2", "req-3"])
+        self.assertEqual(entries[0]["request"]["data"], "record 1")
+        self.assertEqual((entries[0]["attempts"], entries[0]["last_error"]), (5, "boom"))
+        self.assertEqual([e["request_id"] for e in self.store.list(batcher_id="batcher-1")], ["req-3"])
+        self.assertEqual(len(self.store.list(limit=2)), 2)
+
+    def test_replayed_entries_are_kept_but_hidden(self):
+        self.store.add_many([entry(1), entry(2)])
+        first = self.store.list()[0]
+        self.store.mark_replayed([first["id"]])
+        self.assertEqual([e["request_id"] for e in self.store.list()], ["req-2"])
+        everything = self.store.list(include_replayed=True)
+        self.assertEqual(len(everything), 2)
+        self.assertIsNotNone(everything[0]["replayed_at"])
+
+    def test_replayable_request_drops_bookkeeping(self):
+        request = replayable_request(entry(1)["request"])
+        self.assertEqual(request, {"request_id": "req-1", "workflow_id": "wf-1", "data": "record 1"})
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DeadLetterStore(os.path.join(self.tmp.name, "dlq.sqlite3"))
+        self.store.add_many([entry(1), entry(2, "batcher-1"), entry(3)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_replays_to_origin_and_marks_replayed(self):
+        client = FakeClient()
+        asyncio.run(replay(client, self.store))
+        self.assertEqual([(wf, name, req["request_id"]) for wf, name, req in client.signals], [
+            ("batcher-0", "add_write_request", "req-1"),
+            ("batcher-1", "add_write_request", "req-2"),
+            ("batcher-0", "add_write_request", "req-3")
+        ])
+        self.assertNotIn("attempts", client.signals[0][2])
+        self.assertEqual(self.store.list(), [])
+
+    def test_failed_signal_stays_pending(self):
+        client = FakeClient(failing={"req-2"})
+        asyncio.run(replay(client, self.store, target="batcher-9"))
+        self.assertEqual({wf for wf, _, _ in client.signals}, {"batcher-9"})
+        self.assertEqual([e["request_id"] for e in self.store.list()], ["req-2"])
+
+    def test_dry_run_changes_nothing(self):
+        client = FakeClient()
+        asyncio.run(replay(client, self.store, dry_run=True))
+        self.assertEqual(client.signals, [])
+        self.assertEqual(len(self.store.list()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
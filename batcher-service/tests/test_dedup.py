@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import DedupIndex, SERIALIZED_BYTES_PER_FINGERPRINT
+
+
+def serialized_bytes(index: DedupIndex) -> int:
+    return len(json.dumps(index.to_dict(), separators=(",", ":")).encode())
+
+
+class DedupIndexTest(unittest.TestCase):
+
+    def test_contains_until_window_ends(self):
+        index = DedupIndex(window_seconds=600, bucket_seconds=60)
+        index.add("req-1", 1000.0)
+        self.assertTrue(index.contains("req-1", 1000.0))
+        self.assertTrue(index.contains("req-1", 1000.0 + 500))
+        self.assertFalse(index.contains("req-2", 1000.0))
+        self.assertFalse(index.contains("req-1", 1000.0 + 700))
+
+    def test_expire_drops_old_buckets(self):
+        index = DedupIndex(window_seconds=600, bucket_seconds=60)
+        index.add("old", 0.0)
+        index.add("new", 650.0)
+        index.expire(650.0)
+        self.assertEqual(len(index), 1)
+        self.assertTrue(index.contains("new", 650.0))
+
+    def test_serialized_size_stays_under_budget(self):
+        max_bytes = 64_000
+        index = DedupIndex(window_seconds=600, bucket_seconds=60, max_bytes=max_bytes)
+        # ~33 requests/s for the whole window: far more than the budget holds
+        for i in range(20_000):
+            index.add(f"workflow-{i}-write-request", i * 0.03)
+        self.assertLessEqual(len(index), index.max_fingerprints)
+        self.assertLessEqual(serialized_bytes(index), max_bytes * 1.05)
+        self.assertGreater(index.evicted, 0)
+        # The newest requests are always kept
+        self.assertTrue(index.contains("workflow-19999-write-request", 19_999 * 0.03))
+
+    def test_bytes_per_fingerprint_estimate(self):
+        index = DedupIndex(window_seconds=60, bucket_seconds=60)
+        for i in range(1000):
+            index.add(f"req-{i}", 0.0)
+        self.assertLessEqual(serialized_bytes(index), 1000 * SERIALIZED_BYTES_PER_FINGERPRINT + 100)
+
+    def test_restore_round_trip(self):
+        index = DedupIndex()
+        for i in range(100):
+            index.add(f"req-{i}", 1000.0 + i)
+        restored = DedupIndex()
+        restored.restore(json.loads(json.dumps(index.to_dict())), 1100.0)
+        self.assertEqual(len(restored), 100)
+        self.assertTrue(all(restored.contains(f"req-{i}", 1100.0) for i in range(100)))
+
+    def test_restore_trims_to_smaller_budget(self):
+        index = DedupIndex(max_bytes=512_000)
+        for i in range(5000):
+            index.add(f"req-{i}", i * 0.1)
+        restored = DedupIndex(max_bytes=11_000)
+        restored.restore(index.to_dict(), 500.0)
+        self.assertLessEqual(len(restored), restored.max_fingerprints)
+
+
+if __name__ == "__main__":
+    unittest.main()
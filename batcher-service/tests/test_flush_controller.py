@@ -0,0 +1,97 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flush_controller import AdaptiveFlushController
+
+
+def linear_sink(rows: int, per_row: float = 0.002, overhead: float = 0.05) -> float:
+    """Write time of a healthy sink whose cost grows with the number of rows"""
+    return overhead + rows * per_row
+
+
+class AdaptiveFlushControllerTest(unittest.TestCase):
+
+    def controller(self, **kwargs) -> AdaptiveFlushController:
+        return AdaptiveFlushController(batch_size=100, wait_seconds=20.0, **kwargs)
+
+    def test_grows_to_max_on_healthy_sink(self):
+        controller = self.controller()
+        for _ in range(200):
+            controller.observe_batch(controller.batch_size, linear_sink(controller.batch_size))
+        self.assertEqual(controller.batch_size, controller.max_batch_size)
+        self.assertEqual(controller.decreases, 0)
+
+    def test_backs_off_when_per_row_latency_rises(self):
+        controller = self.controller()
+        for _ in range(10):
+            controller.observe_batch(controller.batch_size, linear_sink(controller.batch_size))
+        size = controller.batch_size
+        controller.observe_batch(size, linear_sink(size, per_row=0.01))
+        self.assertEqual(controller.batch_size, size // 2)
+        self.assertTrue(controller.last_decision.startswith("decrease"))
+
+    def test_converges_below_congested_sink_capacity(self):
+        # The sink keeps its per-row cost up to 300 rows per write and slows down sharply above it
+        def congested_sink(rows: int) -> float:
+            return linear_sink(rows) if rows <= 300 else linear_sink(rows, per_row=0.02)
+
+        controller = self.controller()
+        sizes = []
+        for _ in range(300):
+            size = controller.batch_size
+            controller.observe_batch(size, congested_sink(size))
+            sizes.append(size)
+        settled = sizes[100:]
+        self.assertLessEqual(max(settled), 310)
+        self.assertGreaterEqual(min(settled), 150)
+        self.assertGreater(controller.decreases, 0)
+
+    def test_failure_halves_batch_and_lengthens_wait(self):
+        controller = self.controller()
+        controller.wait_seconds = 5.0
+        controller.observe_failure()
+        self.assertEqual(controller.batch_size, 50)
+        self.assertEqual(controller.wait_seconds, 6.0)
+
+    def test_partial_batches_shorten_wait(self):
+        controller = self.controller()
+        for _ in range(20):
+            controller.observe_batch(10, linear_sink(10))
+        self.assertEqual(controller.wait_seconds, controller.min_wait_seconds)
+        self.assertEqual(controller.batch_size, 100)
+        self.assertIsNone(controller.baseline_row_latency)
+
+    def test_partial_batches_after_full_ones_keep_batch_size(self):
+        # Partial batches carry the write overhead over fewer rows, so their per-row latency is
+        # several times the full-batch baseline even though the sink is just as healthy
+        controller = self.controller()
+        for _ in range(10):
+            controller.observe_batch(controller.batch_size, linear_sink(controller.batch_size))
+        size = controller.batch_size
+        for _ in range(20):
+            controller.observe_batch(10, linear_sink(10))
+        self.assertEqual(controller.batch_size, size)
+        self.assertEqual(controller.decreases, 0)
+        self.assertEqual(controller.wait_seconds, controller.min_wait_seconds)
+        controller.observe_batch(size, linear_sink(size))
+        self.assertEqual(controller.batch_size, size + controller.additive_increase)
+
+    def test_wait_capped_by_fill_time(self):
+        controller = self.controller()
+        controller.observe_arrivals(count=500, elapsed_seconds=10.0)  # 50 records/s
+        self.assertEqual(controller.wait_seconds, 100 / 50 * controller.fill_time_headroom)
+
+    def test_restore_round_trip(self):
+        controller = self.controller()
+        for _ in range(5):
+            controller.observe_batch(controller.batch_size, linear_sink(controller.batch_size))
+        restored = self.controller()
+        restored.restore(controller.to_dict())
+        self.assertEqual(restored.to_dict(), controller.to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
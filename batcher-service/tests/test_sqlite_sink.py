@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activities import SQLiteSink, sqlite_connection_pool
+
+
+def write_request(n: int) -> dict:
+    return {"request_id": f"req-{n}", "workflow_id": f"wf-{n % 7}", "data": f"record {n}"}
+
+
+class SQLiteSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ledger.sqlite3")
+        # A single pooled connection, so statements can be traced on it
+        self.sink = SQLiteSink(sqlite_connection_pool(self.path, max_size=1))
+
+    def tearDown(self):
+        self.sink.close()
+        self.tmp.cleanup()
+
+    def ledger(self) -> list:
+        with sqlite3.connect(self.path) as conn:
+            return [row[0] for row in conn.execute("SELECT request_id FROM ledger ORDER BY id")]
+
+    def trace_inserts(self) -> list:
+        statements = []
+        with self.sink.pool.connection() as conn:
+            conn.set_trace_callback(
+                lambda sql: statements.append(sql) if sql.startswith("INSERT INTO ledger") else None)
+        return statements
+
+    def test_rerunning_a_batch_writes_no_duplicates(self):
+        batch = [write_request(n) for n in range(5)]
+        self.assertEqual(self.sink.write(batch), set())
+        self.assertEqual(self.sink.write(batch), {0, 1, 2, 3, 4})
+        self.assertEqual(self.ledger(), [f"req-{n}" for n in range(5)])
+
+    def test_overlapping_batch_writes_only_new_requests(self):
+        self.sink.write([write_request(n) for n in range(3)])
+        skipped = self.sink.write([write_request(n) for n in range(1, 6)])
+        self.assertEqual(skipped, {0, 1})
+        self.assertEqual(self.ledger(), [f"req-{n}" for n in range(6)])
+
+    def test_repeat_within_a_batch_is_written_once(self):
+        skipped = self.sink.write([write_request(1), write_request(2), write_request(1)])
+        self.assertEqual(skipped, {2})
+        self.assertEqual(self.ledger(), ["req-1", "req-2"])
+
+    def test_batch_above_parameter_limit_is_split(self):
+        self.sink.max_variables = 12  # 2 rows of 5 columns per INSERT, 12 IDs per lookup
+        statements = self.trace_inserts()
+        batch = [write_request(n) for n in range(25)]
+        self.sink.write(batch)
+        self.assertEqual(len(statements), 13)
+        self.assertEqual(self.ledger(), [f"req-{n}" for n in range(25)])
+        self.assertEqual(self.sink.write(batch), set(range(25)))
+
+    def test_batch_above_sqlite_limit_is_written(self):
+        rows_per_statement = self.sink.max_variables // len(SQLiteSink.COLUMNS)
+        statements = self.trace_inserts()
+        batch = [write_request(n) for n in range(rows_per_statement + 10)]
+        self.assertEqual(self.sink.write(batch), set())
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(len(self.ledger()), len(batch))
+
+
+if __name__ == "__main__":
+    unittest.main()
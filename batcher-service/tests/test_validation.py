@@ -0,0 +1,112 @@
+import os
+import sys
+import unittest
+
+from temporalio.exceptions import ApplicationError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import BatchValidator, Column
+from workflow import BatcherWorkflow
+
+
+def record(**fields) -> dict:
+    return {"workflow_id": "wf-1", "request_id": "req-1", "data": "payload", **fields}
+
+
+class BatchValidatorTest(unittest.TestCase):
+
+    def validate_one(self, request: dict):
+        records, errors = BatchValidator().validate([request])
+        return records[0], errors[0]
+
+    def test_valid_record_passes_with_extra_fields(self):
+        normalized, error = self.validate_one(record(ordering_key="k", attempts=2))
+        self.assertIsNone(error)
+        self.assertEqual(normalized, record(ordering_key="k", attempts=2))
+
+    def test_data_is_coerced_to_canonical_json(self):
+        self.assertEqual(self.validate_one(record(data={"b": 1, "a": [1, 2]}))[0]["data"], '{"a":[1,2],"b":1}')
+        self.assertEqual(self.validate_one(record(data=42))[0]["data"], "42")
+        self.assertEqual(self.validate_one(record(data=True))[0]["data"], "true")
+
+    def test_strings_are_nfc_normalized(self):
+        normalized, error = self.validate_one(record(data="cafe\u0301"))
+        self.assertIsNone(error)
+        self.assertEqual(normalized["data"], "caf\u00e9")
+
+    def test_bad_columns_are_rejected(self):
+        cases = {
+            "workflow_id is required": {"request_id": "req-1", "data": "payload"},
+            "data is required": record(data=None),
+            "workflow_id must be a string, got int": record(workflow_id=7),
+            "request_id must be a string, got list": record(request_id=["req-1"]),
+            "data must be a string, got bytes": record(data=b"payload"),
+            "data must not be empty": record(data=""),
+            "data contains NUL characters": record(data="a\x00b"),
+            "data is not valid Unicode": record(data="\ud800"),
+            "workflow_id is 256 characters, above the 255 limit": record(workflow_id="w" * 256),
+        }
+        for expected, request in cases.items():
+            with self.subTest(expected=expected):
+                normalized, error = self.validate_one(request)
+                self.assertEqual(error, expected)
+                self.assertIs(normalized, request)
+
+    def test_optional_columns_may_be_missing(self):
+        normalized, error = self.validate_one({"workflow_id": "wf-1", "data": "payload"})
+        self.assertIsNone(error)
+        self.assertNotIn("request_id", normalized)
+
+    def test_errors_are_per_record(self):
+        records = [record(request_id="req-0"), record(request_id="req-1", data=""), record(request_id="req-2")]
+        normalized, errors = BatchValidator().validate(records)
+        self.assertEqual(errors, [None, "data must not be empty", None])
+        self.assertEqual([r["request_id"] for r in normalized], ["req-0", "req-1", "req-2"])
+
+    def test_first_failing_column_is_reported(self):
+        _, errors = BatchValidator().validate([{"workflow_id": 1, "data": ""}])
+        self.assertEqual(errors, ["workflow_id must be a string, got int"])
+
+    def test_custom_schema(self):
+        validator = BatchValidator((Column("name", max_length=3), Column("note", required=False, allow_empty=True)))
+        _, errors = validator.validate([{"name": "abc", "note": ""}, {"name": "abcd"}, {"note": "x"}])
+        self.assertEqual(errors, [None, "name is 4 characters, above the 3 limit", "name is required"])
+
+
+class SubmitWriteValidatorTest(unittest.TestCase):
+
+    def assert_rejected(self, batcher: BatcherWorkflow, request, error_type: str, message: str = None):
+        with self.assertRaises(ApplicationError) as raised:
+            batcher.validate_submit_write(request)
+        self.assertEqual(raised.exception.type, error_type)
+        if message:
+            self.assertEqual(raised.exception.message, message)
+
+    def test_accepts_inline_and_claim_check_requests(self):
+        batcher = BatcherWorkflow()
+        batcher.validate_submit_write({"workflow_id": "wf-1", "requesting_workflow": "main-1", "data": "x"})
+        batcher.validate_submit_write({"workflow_id": "wf-1", "requesting_workflow": "main-1", "data_ref": "ref"})
+
+    def test_rejects_malformed_requests(self):
+        batcher = BatcherWorkflow()
+        self.assert_rejected(batcher, "not a dict", "INVALID_WRITE_REQUEST", "Invalid write request: not a dictionary")
+        self.assert_rejected(batcher, {"workflow_id": "wf-1", "data": "x"}, "INVALID_WRITE_REQUEST",
+                             "Write request missing required fields: ['requesting_workflow']")
+        self.assert_rejected(batcher, {"workflow_id": "wf-1", "requesting_workflow": "main-1"},
+                             "INVALID_WRITE_REQUEST", "Write request missing required fields: ['data']")
+
+    def test_malformed_requests_are_not_retryable(self):
+        with self.assertRaises(ApplicationError) as raised:
+            BatcherWorkflow().validate_submit_write({})
+        self.assertTrue(raised.exception.non_retryable)
+
+    def test_rejects_submissions_while_continuing_as_new(self):
+        batcher = BatcherWorkflow()
+        batcher.preparing_continue_as_new = True
+        self.assert_rejected(batcher, {"workflow_id": "wf-1", "requesting_workflow": "main-1", "data": "x"},
+                             "BATCHER_CONTINUING_AS_NEW")
+
+
+if __name__ == "__main__":
+    unittest.main()
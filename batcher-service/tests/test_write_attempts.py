@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workflow import BatcherWorkflow
+
+
+def write_request(n: int, attempts: int = 0) -> dict:
+    request = {"request_id": f"req-{n}", "workflow_id": f"wf-{n}", "data": f"record {n}"}
+    if attempts:
+        request["attempts"] = attempts
+    return request
+
+
+class WriteAttemptsTest(unittest.TestCase):
+
+    def charge(self, chunks, failed_from, retry_writes=()):
+        batcher = BatcherWorkflow()
+        failed_writes, untried = batcher._failed_chunk_writes(chunks, failed_from, "ledger down")
+        requeue, exhausted = batcher._count_attempts(list(retry_writes) + failed_writes)
+        return requeue + untried, exhausted
+
+    def attempts(self, writes) -> dict:
+        return {w["request_id"]: w.get("attempts", 0) for w in writes}
+
+    def test_only_retryable_record_is_charged(self):
+        chunk = [write_request(n) for n in range(4)]
+        requeue, exhausted = self.charge([chunk], None, retry_writes=[(chunk[2], "deadlock")])
+        self.assertEqual(self.attempts(requeue), {"req-2": 1})
+        self.assertEqual(requeue[0]["last_error"], "deadlock")
+        self.assertEqual(exhausted, [])
+
+    def test_failed_multi_write_chunk_and_later_chunks_are_not_charged(self):
+        chunks = [[write_request(0), write_request(1)], [write_request(2), write_request(3)], [write_request(4)]]
+        requeue, exhausted = self.charge(chunks, 1)
+        self.assertEqual(self.attempts(requeue), {"req-2": 0, "req-3": 0, "req-4": 0})
+        self.assertEqual(exhausted, [])
+
+    def test_failed_single_write_chunk_is_charged(self):
+        chunks = [[write_request(0, attempts=2)], [write_request(1)]]
+        requeue, exhausted = self.charge(chunks, 0)
+        self.assertEqual(self.attempts(requeue), {"req-0": 3, "req-1": 0})
+        self.assertEqual(requeue[0]["last_error"], "ledger down")
+
+    def test_write_reaching_max_attempts_is_exhausted(self):
+        chunks = [[write_request(0, attempts=4)]]
+        requeue, exhausted = self.charge(chunks, 0)
+        self.assertEqual(requeue, [])
+        self.assertEqual(self.attempts(exhausted), {"req-0": 5})
+
+    def test_breaker_probe_is_a_single_write(self):
+        batcher = BatcherWorkflow()
+        batcher.state.pending_writes = [write_request(n) for n in range(5)]
+        for _ in range(batcher.circuit_breaker.failure_threshold):
+            batcher.circuit_breaker.record_failure(0.0)
+        self.assertEqual(len(batcher._take_batch()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
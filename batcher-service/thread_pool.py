@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that tracks how saturated it is: busy and queued tasks, the peak of each,
+    and how long tasks wait in the queue before a thread picks them up.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.size = max_workers
+        self._metrics_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.peak_active = 0
+        self.peak_queued = 0
+        self.total_queue_wait_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+        self.saturated_submissions = 0  # submitted while every thread was busy
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        submitted_at = time.monotonic()
+        with self._metrics_lock:
+            self.submitted += 1
+            if self.active >= self.size:
+                self.saturated_submissions += 1
+            self.peak_queued = max(self.peak_queued, self._queued())
+
+        def run():
+            waited = time.monotonic() - submitted_at
+            with self._metrics_lock:
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                self.total_queue_wait_seconds += waited
+                self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, waited)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                with self._metrics_lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._metrics_lock:
+                    self.active -= 1
+                    self.completed += 1
+            return result
+
+        return super().submit(run)
+
+    def _queued(self) -> int:
+        return max(0, self.submitted - self.completed - self.active)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            started = self.completed + self.active
+            return {
+                "max_workers": self.size,
+                "active": self.active,
+                "queued": self._queued(),
+                "peak_active": self.peak_active,
+                "peak_queued": self.peak_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "saturated_submissions": self.saturated_submissions,
+                "avg_queue_wait_ms": round(self.total_queue_wait_seconds / started * 1000, 3) if started else 0.0,
+                "max_queue_wait_ms": round(self.max_queue_wait_seconds * 1000, 3)
+            }
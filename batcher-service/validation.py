@@ -0,0 +1,114 @@
+import json
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+MISSING = object()
+
+
+@dataclass(frozen=True)
+class Column:
+    """One field of a ledger record and the rules its values must satisfy"""
+    name: str
+    required: bool = True
+    allow_empty: bool = False
+    max_length: Optional[int] = None
+    # Coerce numbers/booleans to str and dicts/lists to canonical JSON instead of rejecting them
+    coerce: bool = False
+
+
+LEDGER_SCHEMA: Tuple[Column, ...] = (
+    Column("workflow_id", max_length=255),
+    Column("request_id", required=False, max_length=255),
+    Column("requesting_workflow", required=False, max_length=255),
+    Column("data", max_length=1_000_000, coerce=True),
+)
+
+
+class ValidationError(Exception):
+    pass
+
+
+def _compile(column: Column) -> Callable[[Any], Any]:
+    """Build the normalizer for one column once; it returns the normalized value or raises ValidationError"""
+
+    def normalize(value: Any) -> Any:
+        if value is MISSING or value is None:
+            if column.required:
+                raise ValidationError(f"{column.name} is required")
+            return None
+
+        if not isinstance(value, str):
+            if not column.coerce:
+                raise ValidationError(f"{column.name} must be a string, got {type(value).__name__}")
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, sort_keys=True, separators=(",", ":"))
+            elif isinstance(value, (int, float, bool)):
+                value = json.dumps(value)
+            else:
+                raise ValidationError(f"{column.name} must be a string, got {type(value).__name__}")
+
+        try:
+            # Lone surrogates can't be stored as UTF-8 by any driver
+            value.encode("utf-8")
+        except UnicodeEncodeError:
+            raise ValidationError(f"{column.name} is not valid Unicode")
+        if "\x00" in value:
+            raise ValidationError(f"{column.name} contains NUL characters")
+        value = unicodedata.normalize("NFC", value)
+
+        if not value and not column.allow_empty:
+            raise ValidationError(f"{column.name} must not be empty")
+        if column.max_length is not None and len(value) > column.max_length:
+            raise ValidationError(f"{column.name} is {len(value)} characters, above the {column.max_length} limit")
+        return value
+
+    return normalize
+
+
+class BatchValidator:
+    """
+    Validates and normalizes a whole batch before it reaches the sink.
+
+    Records are pivoted into one list per schema column and each column is run through its
+    normalizer (compiled once per schema) in a single pass, so a rejected record costs no DB round trip.
+    """
+
+    def __init__(self, schema: Sequence[Column] = LEDGER_SCHEMA):
+        self.schema = tuple(schema)
+        self._normalizers = [(column.name, _compile(column)) for column in self.schema]
+
+    def validate(self, records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Optional[str]]]:
+        """
+        Returns (normalized records, error per record); a record with an error must not be written.
+        Fields outside the schema are passed through untouched.
+        """
+        errors: List[Optional[str]] = [None] * len(records)
+        normalized_columns: Dict[str, List[Any]] = {}
+
+        for name, normalize in self._normalizers:
+            column = [record.get(name, MISSING) for record in records]
+            normalized = []
+            for i, value in enumerate(column):
+                if errors[i] is not None:
+                    normalized.append(value)
+                    continue
+                try:
+                    normalized.append(normalize(value))
+                except ValidationError as e:
+                    errors[i] = str(e)
+                    normalized.append(value)
+            normalized_columns[name] = normalized
+
+        normalized_records = []
+        for i, record in enumerate(records):
+            if errors[i] is not None:
+                normalized_records.append(record)
+                continue
+            updated = dict(record)
+            for name, values in normalized_columns.items():
+                if values[i] is not None:
+                    updated[name] = values[i]
+            normalized_records.append(updated)
+        return normalized_records, errors
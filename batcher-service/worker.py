@@ -1,30 +1,179 @@
 import asyncio
+import argparse
+import logging
+import os
+from typing import Optional
 from temporalio.client import Client
 from temporalio.worker import Worker
 
 from workflow import BatcherWorkflow
-from activities import batch_write_to_database
+from activities import (
+    BatchWriteActivities, ConfirmationActivities, DEFAULT_LEDGER_DB, SINKS, Sink, create_sink, dead_letter_writes
+)
+from thread_pool import InstrumentedThreadPoolExecutor
+from structured_logging import configure_logging, stop_logging
 
 
-async def run_batcher_worker():
-    """Start the worker for Batcher workflow"""
+logger = logging.getLogger("batcher.worker")
+
+
+async def monitor_worker(sink: Sink, executor: InstrumentedThreadPoolExecutor, interval_seconds: float = 30):
+    """Health-check the sink's idle connections and log pool and thread pool metrics periodically"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        health = await loop.run_in_executor(executor, sink.health_check)
+        logger.log(logging.INFO if health.get("healthy") else logging.WARNING, f"Sink {sink.name} health check",
+                   extra={"sink": sink.name, "health": health})
+        metrics = sink.metrics()
+        if metrics:
+            logger.info("Sink connection pool", extra={"sink": sink.name, "pool": metrics})
+        logger.info("Activity thread pool", extra={"threads": executor.metrics()})
+
+
+async def run_batcher_worker(sink_name: str = "print", ledger_db: str = DEFAULT_LEDGER_DB, pool_size: int = 4,
+                             write_chunk_size: int = 500, write_partitions: int = 1, activity_mode: str = "async",
+                             activity_threads: int = 8, max_concurrent_activities: Optional[int] = None):
+    """Start the worker for Batcher workflow (configure logging first, see configure_logging)"""
     client = await Client.connect("localhost:7233")
-    
+    confirmations = ConfirmationActivities(client)
+    # One sink (and connection pool) for the whole process, shared by every activity invocation
+    sink = create_sink(sink_name, ledger_db, pool_size)
+    # Partitions beyond the pool size would only queue for a connection
+    max_parallel_writes = min(write_partitions, pool_size) if sink.metrics() else write_partitions
+
+    # Blocking work runs here: whole sync activities in sync mode, sink calls of the async activity otherwise
+    executor = InstrumentedThreadPoolExecutor(activity_threads, thread_name_prefix="batch-writer")
+    batch_writes = BatchWriteActivities(sink, write_chunk_size, write_partitions, max_parallel_writes, executor)
+    if activity_mode == "sync":
+        # Each running sync activity holds a thread, so more concurrent activities than threads
+        # would only sit in the executor queue while their timeouts run
+        max_concurrent_activities = max_concurrent_activities or activity_threads
+        if max_concurrent_activities > activity_threads:
+            print(f"⚠️  max_concurrent_activities ({max_concurrent_activities}) exceeds the thread pool "
+                  f"({activity_threads}); sync activities will queue for threads")
+        batch_write_activity = batch_writes.batch_write_to_database_sync
+    else:
+        max_concurrent_activities = max_concurrent_activities or 100
+        batch_write_activity = batch_writes.batch_write_to_database
+
     worker = Worker(
         client,
         task_queue="batcher-queue",
         workflows=[BatcherWorkflow],
-        activities=[batch_write_to_database],
+        activities=[batch_write_activity, dead_letter_writes, confirmations.deliver_confirmations],
+        activity_executor=executor,
+        max_concurrent_activities=max_concurrent_activities,
     )
-    
+
     print("🚀 Batcher Worker starting...")
     print("Task Queue: batcher-queue")
     print("Workflows: BatcherWorkflow")
-    print("Activities: batch_write_to_database")
+    print("Activities: batch_write_to_database, dead_letter_writes, deliver_confirmations")
+    print(f"Sink: {sink.name}" + (f" ({ledger_db}, pool of {pool_size} connections)" if sink.metrics() else ""))
+    print(f"Write chunk size: {write_chunk_size} records, split into {write_partitions} partition(s) "
+          f"written {max_parallel_writes} at a time")
+    print(f"Batch writes: {activity_mode} activity, {activity_threads} threads, "
+          f"up to {max_concurrent_activities} concurrent activities")
     print("-" * 50)
-    
-    await worker.run()
+
+    monitor = asyncio.create_task(monitor_worker(sink, executor))
+    try:
+        await worker.run()
+    finally:
+        monitor.cancel()
+        batch_writes.close()
+        executor.shutdown(wait=False)
+        sink.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(run_batcher_worker())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the batcher worker")
+    parser.add_argument(
+        "--sink",
+        choices=sorted(SINKS),
+        default=os.environ.get("BATCH_SINK", "print"),
+        help="Where batch writes go: print them (simulated) or insert them into SQLite "
+             "(default: $BATCH_SINK or print)"
+    )
+    parser.add_argument(
+        "--ledger-db",
+        default=DEFAULT_LEDGER_DB,
+        help="SQLite database for the sqlite sink (default: $LEDGER_DB or the temp directory)"
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=4,
+        help="Maximum connections the sqlite sink keeps open, shared by all batch writes (default: 4)"
+    )
+    parser.add_argument(
+        "--write-chunk-size",
+        type=int,
+        default=500,
+        help="Records per sink transaction; batch writes heartbeat after each one and resume from there "
+             "on retry (default: 500)"
+    )
+    parser.add_argument(
+        "--write-partitions",
+        type=int,
+        default=1,
+        help="Split each chunk into N partitions by ordering key hash and write them concurrently, "
+             "each in its own transaction (default: 1)"
+    )
+    parser.add_argument(
+        "--activity-mode",
+        choices=["async", "sync"],
+        default="async",
+        help="Run batch_write_to_database as an async activity that offloads sink calls to the thread pool, "
+             "or as a sync activity on the thread pool, for blocking drivers (default: async)"
+    )
+    parser.add_argument(
+        "--activity-threads",
+        type=int,
+        default=8,
+        help="Size of the worker's activity thread pool (default: 8)"
+    )
+    parser.add_argument(
+        "--max-concurrent-activities",
+        type=int,
+        help="Activities this worker runs at once (default: --activity-threads in sync mode, 100 in async mode)"
+    )
+    parser.add_argument(
+        "--log-level",
+        default=os.environ.get("LOG_LEVEL", "INFO"),
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        type=str.upper,
+        help="Level of the JSON logs written to stderr (default: $LOG_LEVEL or INFO)"
+    )
+    parser.add_argument(
+        "--log-file",
+        default=os.environ.get("LOG_FILE"),
+        help="Also write JSON logs to this file, buffered (default: $LOG_FILE)"
+    )
+    parser.add_argument(
+        "--log-sample-rate",
+        type=float,
+        default=float(os.environ.get("LOG_SAMPLE_RATE", "0.01")),
+        help="Fraction of individual records that get their own log line (default: $LOG_SAMPLE_RATE or 0.01)"
+    )
+    args = parser.parse_args()
+
+    if args.pool_size < 1:
+        print("❌ Pool size must be at least 1")
+    elif args.write_chunk_size < 1:
+        print("❌ Write chunk size must be at least 1")
+    elif args.write_partitions < 1:
+        print("❌ Write partitions must be at least 1")
+    elif args.activity_threads < 1:
+        print("❌ Activity threads must be at least 1")
+    elif args.max_concurrent_activities is not None and args.max_concurrent_activities < 1:
+        print("❌ Max concurrent activities must be at least 1")
+    else:
+        listener = configure_logging("batcher-service", args.log_level, args.log_file, args.log_sample_rate)
+        try:
+            asyncio.run(run_batcher_worker(args.sink, args.ledger_db, args.pool_size, args.write_chunk_size,
+                                           args.write_partitions, args.activity_mode, args.activity_threads,
+                                           args.max_concurrent_activities))
+        finally:
+            stop_logging(listener)
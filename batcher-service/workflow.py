@@ -1,12 +1,19 @@
 import asyncio
-from datetime import timedelta
-from typing import List, Dict, Any, Optional, Set
+from datetime import datetime, timedelta
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
 from temporalio import workflow
 from temporalio.common import RetryPolicy
-from dataclasses import dataclass, field
+from temporalio.exceptions import ApplicationError
+from dataclasses import dataclass
 import hashlib
+import json
 
-from activities import batch_write_to_database
+# Activity modules touch the filesystem and the client at import time; the sandbox must not re-import them
+with workflow.unsafe.imports_passed_through():
+    from activities import BatchWriteActivities, dead_letter_writes, ConfirmationActivities, row_count
+from flush_controller import AdaptiveFlushController
+from dedup import DedupIndex
+from circuit_breaker import CircuitBreaker, CLOSED
 
 
 @dataclass
@@ -15,15 +22,29 @@ class BatcherState:
     pending_writes: List[Dict[str, Any]]
     processed_batches_count: int
     # Note: total_signals_received removed - we'll use a session counter instead
-    processed_request_ids: Set[str] = field(default_factory=set)  # Only for pending requests
+    # Fingerprints of recently completed request IDs (see DedupIndex); IDs of pending
+    # requests are rebuilt from pending_writes, so they are not stored separately
+    completed_request_index: Optional[Dict[str, Any]] = None
     continue_as_new_count: int = 0  # Safety counter to prevent infinite loops
+    started_batches_count: int = 0  # Used for batch IDs, since several batches can be in flight
+    flush_controller: Optional[Dict[str, Any]] = None  # Learned batch size / flush interval
+    deadline_misses: int = 0  # Writes that became durable after their requester's deadline
+    deadline_flushes: int = 0  # Batches flushed early because a pending deadline was close
+    circuit_breaker: Optional[Dict[str, Any]] = None  # Breaker state and backoff for failing batch writes
+    dead_lettered_count: int = 0  # Writes moved to the dead-letter table after max_write_attempts
     
     def to_dict(self) -> Dict[str, Any]:
         return {
             "pending_writes": self.pending_writes,
             "processed_batches_count": self.processed_batches_count,
-            "processed_request_ids": list(self.processed_request_ids),  # Convert set to list for JSON
-            "continue_as_new_count": self.continue_as_new_count
+            "completed_request_index": self.completed_request_index,
+            "continue_as_new_count": self.continue_as_new_count,
+            "started_batches_count": self.started_batches_count,
+            "flush_controller": self.flush_controller,
+            "deadline_misses": self.deadline_misses,
+            "deadline_flushes": self.deadline_flushes,
+            "circuit_breaker": self.circuit_breaker,
+            "dead_lettered_count": self.dead_lettered_count
         }
     
     @classmethod
@@ -31,8 +52,108 @@ class BatcherState:
         return cls(
             pending_writes=data.get("pending_writes", []),
             processed_batches_count=data.get("processed_batches_count", 0),
-            processed_request_ids=set(data.get("processed_request_ids", [])),  # Convert list back to set
-            continue_as_new_count=data.get("continue_as_new_count", 0)
+            completed_request_index=data.get("completed_request_index"),
+            continue_as_new_count=data.get("continue_as_new_count", 0),
+            started_batches_count=data.get("started_batches_count", data.get("processed_batches_count", 0)),
+            flush_controller=data.get("flush_controller"),
+            deadline_misses=data.get("deadline_misses", 0),
+            deadline_flushes=data.get("deadline_flushes", 0),
+            circuit_breaker=data.get("circuit_breaker"),
+            dead_lettered_count=data.get("dead_lettered_count", 0)
+        )
+
+
+@dataclass
+class BatcherConfig:
+    """Tunables passed to the batcher on start and carried over on continue-as-new"""
+    batch_size_limit: int = 100
+    max_batch_wait_seconds: float = 20.0
+    # Number of batches allowed to be written concurrently; records sharing an
+    # ordering key are never in two in-flight batches at once
+    max_in_flight_batches: int = 2
+    # Adaptive flushing: batch_size_limit / max_batch_wait_seconds are the starting
+    # point and the controller moves them within these bounds
+    adaptive_flush: bool = True
+    min_batch_size: int = 10
+    max_batch_size: int = 1000
+    min_batch_wait_seconds: float = 2.0
+    # Byte-size limits: flush once pending records reach max_batch_bytes, and split any
+    # batch into several activity calls so each stays under Temporal's 2 MiB payload limit.
+    # max_batch_bytes is capped at a quarter of max_pending_bytes: a byte-full batch must flush well
+    # before the pending payload triggers continue-as-new (half) or new writes are turned away (all)
+    max_batch_bytes: int = 200_000
+    max_activity_payload_bytes: int = 1_500_000
+    # "signal": one external signal per request from this workflow
+    # "activity": one deliver_confirmations activity per batch signals requesters via the client
+    confirmation_mode: str = "signal"
+    # Flush early once the earliest pending deadline is this close (plus the expected write time)
+    deadline_margin_seconds: float = 10.0
+    # How long completed request IDs are remembered for deduplication, and the bucket width
+    dedup_window_seconds: float = 600.0
+    dedup_bucket_seconds: float = 60.0
+    # Serialized size budget of the window carried through continue-as-new (~11 bytes per request ID);
+    # above window_seconds * rate * 11 bytes the oldest buckets are dropped early
+    dedup_max_bytes: int = 512_000
+    # Backlog cap: writes not yet settled (pending and in flight) are carried in the continue-as-new input,
+    # so with the dedup window and ~150 bytes of metadata per write it must stay under the 2 MiB limit;
+    # a write that would exceed it is turned away (the requester retries) instead of buffered
+    max_pending_bytes: int = 800_000
+    # Circuit breaker for failing batch writes (backoff doubles per consecutive failure)
+    breaker_failure_threshold: int = 3
+    breaker_base_backoff_seconds: float = 2.0
+    breaker_max_backoff_seconds: float = 300.0
+    # A write that fails this many times is moved to the dead-letter table instead of requeued
+    max_write_attempts: int = 5
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "batch_size_limit": self.batch_size_limit,
+            "max_batch_wait_seconds": self.max_batch_wait_seconds,
+            "max_in_flight_batches": self.max_in_flight_batches,
+            "adaptive_flush": self.adaptive_flush,
+            "min_batch_size": self.min_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "min_batch_wait_seconds": self.min_batch_wait_seconds,
+            "max_batch_bytes": self.max_batch_bytes,
+            "max_activity_payload_bytes": self.max_activity_payload_bytes,
+            "confirmation_mode": self.confirmation_mode,
+            "deadline_margin_seconds": self.deadline_margin_seconds,
+            "dedup_window_seconds": self.dedup_window_seconds,
+            "dedup_bucket_seconds": self.dedup_bucket_seconds,
+            "dedup_max_bytes": self.dedup_max_bytes,
+            "max_pending_bytes": self.max_pending_bytes,
+            "breaker_failure_threshold": self.breaker_failure_threshold,
+            "breaker_base_backoff_seconds": self.breaker_base_backoff_seconds,
+            "breaker_max_backoff_seconds": self.breaker_max_backoff_seconds,
+            "max_write_attempts": self.max_write_attempts
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'BatcherConfig':
+        data = data or {}
+        defaults = cls()
+        max_pending_bytes = data.get("max_pending_bytes", defaults.max_pending_bytes)
+        return cls(
+            batch_size_limit=data.get("batch_size_limit", defaults.batch_size_limit),
+            max_batch_wait_seconds=data.get("max_batch_wait_seconds", defaults.max_batch_wait_seconds),
+            max_in_flight_batches=max(1, data.get("max_in_flight_batches", defaults.max_in_flight_batches)),
+            adaptive_flush=data.get("adaptive_flush", defaults.adaptive_flush),
+            min_batch_size=data.get("min_batch_size", defaults.min_batch_size),
+            max_batch_size=data.get("max_batch_size", defaults.max_batch_size),
+            min_batch_wait_seconds=data.get("min_batch_wait_seconds", defaults.min_batch_wait_seconds),
+            max_batch_bytes=max(1, min(data.get("max_batch_bytes", defaults.max_batch_bytes), max_pending_bytes // 4)),
+            max_activity_payload_bytes=data.get("max_activity_payload_bytes", defaults.max_activity_payload_bytes),
+            confirmation_mode=data.get("confirmation_mode", defaults.confirmation_mode),
+            deadline_margin_seconds=data.get("deadline_margin_seconds", defaults.deadline_margin_seconds),
+            dedup_window_seconds=data.get("dedup_window_seconds", defaults.dedup_window_seconds),
+            dedup_bucket_seconds=data.get("dedup_bucket_seconds", defaults.dedup_bucket_seconds),
+            dedup_max_bytes=data.get("dedup_max_bytes", defaults.dedup_max_bytes),
+            max_pending_bytes=max_pending_bytes,
+            breaker_failure_threshold=data.get("breaker_failure_threshold", defaults.breaker_failure_threshold),
+            breaker_base_backoff_seconds=data.get("breaker_base_backoff_seconds",
+                                                  defaults.breaker_base_backoff_seconds),
+            breaker_max_backoff_seconds=data.get("breaker_max_backoff_seconds", defaults.breaker_max_backoff_seconds),
+            max_write_attempts=max(1, data.get("max_write_attempts", defaults.max_write_attempts))
         )
 
 
@@ -46,26 +167,83 @@ class BatcherWorkflow:
         self.state = BatcherState(
             pending_writes=[],
             processed_batches_count=0,
-            processed_request_ids=set(),
             continue_as_new_count=0
         )
-        self.batch_size_limit = 100
+        self.config = BatcherConfig()
+        self.batch_size_limit = self.config.batch_size_limit
         # Session-level counter (resets on each continue-as-new)
         self.session_signals_received = 0
-        self.max_batch_wait_time = timedelta(seconds=20)
+        self.max_batch_wait_time = timedelta(seconds=self.config.max_batch_wait_seconds)
+        # Deduplication: IDs of requests pending or in flight, and a window of completed ones
+        self.active_request_ids: Set[str] = set()
+        self.completed_requests = DedupIndex()
+        self.circuit_breaker = CircuitBreaker()
+        # Pipelining: batches currently being written and the ordering keys they hold
+        self.in_flight_batches = 0
+        self.in_flight_keys: Set[str] = set()
+        self.confirmations_in_progress = 0
+        # Update-based submissions: results waiting to be returned, and how many updates wait on each
+        self.update_results: Dict[str, Dict[str, Any]] = {}
+        self.update_waiters: Dict[str, int] = {}
+        self.preparing_continue_as_new = False
+        self.failed_confirmations = 0  # Session-level count of confirmations that could not be delivered
+        # Session-level per-record outcome counters
+        self.records_rejected = 0
+        self.records_retried = 0
+        self.duplicates_suppressed = 0  # Records the sink skipped because they were already committed
+        self.sink_pool: Optional[Dict[str, Any]] = None  # Latest connection pool metrics reported by the sink
+        self.writer_threads: Optional[Dict[str, Any]] = None  # Latest thread pool metrics of the batch writer worker
+        # Set when a request arrives whose deadline needs a flush before the current timer fires
+        self.flush_deadline_changed = False
+        self.flush_timer_ends_ts: Optional[float] = None
+        # Serialized size and ledger rows of pending_writes (recomputed from the records on continue-as-new);
+        # batch size limits count rows, so a vector request weighs as much as its records
+        self.pending_bytes = 0
+        self.pending_rows = 0
+        # Serialized size of the writes in batches being written: if they fail they are requeued,
+        # so they count against max_pending_bytes until they settle
+        self.in_flight_bytes = 0
+        self.writes_turned_away = 0  # Session-level count of writes refused because the backlog was full
+        # backlog_full confirmations waiting to be sent; they go out together, one delivery at a time
+        self.backlog_rejections: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        self.delivering_backlog_rejections = False
+        # Adaptive flushing: arrivals counted between controller observations
+        self.flush_controller: Optional[AdaptiveFlushController] = None
+        self.arrivals_since_observation = 0
+        self.last_arrival_observation = None
         # Safety limits
         self.max_continue_as_new_cycles = 10  # Prevent runaway continue-as-new
         
     @workflow.run
-    async def run(self, initial_state: Optional[Dict[str, Any]] = None) -> None:
+    async def run(self, initial_state: Optional[Dict[str, Any]] = None,
+                  config: Optional[Dict[str, Any]] = None) -> None:
         """Main workflow run method with improved continue-as-new support"""
         
+        self.config = BatcherConfig.from_dict(config)
+        self.batch_size_limit = self.config.batch_size_limit
+        self.max_batch_wait_time = timedelta(seconds=self.config.max_batch_wait_seconds)
+        
         # Restore state if continuing from previous execution
         if initial_state:
             self.state = BatcherState.from_dict(initial_state)
+            self.pending_bytes = sum(self._payload_bytes(req) for req in self.state.pending_writes)
+            self.pending_rows = sum(row_count(req) for req in self.state.pending_writes)
+        self.active_request_ids = {req['request_id'] for req in self.state.pending_writes if 'request_id' in req}
+        self.completed_requests = DedupIndex(self.config.dedup_window_seconds, self.config.dedup_bucket_seconds,
+                                             self.config.dedup_max_bytes)
+        self.completed_requests.restore(self.state.completed_request_index, workflow.now().timestamp())
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=self.config.breaker_failure_threshold,
+            base_backoff_seconds=self.config.breaker_base_backoff_seconds,
+            max_backoff_seconds=self.config.breaker_max_backoff_seconds
+        )
+        self.circuit_breaker.restore(self.state.circuit_breaker)
+        self._init_flush_controller()
+        
+        if initial_state:
             workflow.logger.info(f"Resumed batcher with {len(self.state.pending_writes)} pending writes, "
                                f"{self.state.processed_batches_count} batches processed, "
-                               f"{len(self.state.processed_request_ids)} tracked request IDs, "
+                               f"{len(self.completed_requests)} completed request fingerprints, "
                                f"continue-as-new cycle {self.state.continue_as_new_count}")
             
             # Safety check: Prevent infinite continue-as-new loops
@@ -74,7 +252,7 @@ class BatcherWorkflow:
                                     "Forcing batch processing and resetting counter.")
                 # Force process all pending writes to break the cycle
                 if self.state.pending_writes:
-                    await self._process_batch()
+                    await self._drain_pending()
                 # Reset counter to allow normal operation
                 self.state.continue_as_new_count = 0
         else:
@@ -86,18 +264,182 @@ class BatcherWorkflow:
                 await self._safe_continue_as_new()
                 return  # This execution ends here
             
-            # Wait for batch conditions
-            try:
-                await workflow.wait_condition(
-                    lambda: len(self.state.pending_writes) >= self.batch_size_limit,
-                    timeout=self.max_batch_wait_time
-                )
-            except asyncio.TimeoutError:
-                workflow.logger.debug("Batch timeout reached")
+            # Backing off after failed batch writes: keep buffering arriving writes until the retry time
+            backoff = self.circuit_breaker.blocked_for(workflow.now().timestamp())
+            if backoff > 0 and self.state.pending_writes:
+                workflow.logger.info(f"Circuit breaker {self.circuit_breaker.state}: "
+                                     f"next batch attempt in {backoff:.1f}s")
+                await workflow.sleep(timedelta(seconds=backoff))
+                continue
+            
+            # Wait for batch conditions (a full batch only counts if there is a free pipeline slot).
+            # The timer is cut short when the earliest pending deadline gets close.
+            self.flush_deadline_changed = False
+            flush_timeout = self._next_flush_timeout()
+            self.flush_timer_ends_ts = workflow.now().timestamp() + flush_timeout.total_seconds()
+            if flush_timeout > timedelta(0):
+                try:
+                    await workflow.wait_condition(
+                        lambda: (self._batch_is_full() and self._has_free_slot()) or self.flush_deadline_changed,
+                        timeout=flush_timeout
+                    )
+                except asyncio.TimeoutError:
+                    workflow.logger.debug("Batch timeout reached")
+                if self.flush_deadline_changed:
+                    continue
+            
+            if flush_timeout < self.max_batch_wait_time and self.state.pending_writes and not self._batch_is_full():
+                self.state.deadline_flushes += 1
+                workflow.logger.info("Flushing early: earliest pending deadline is close")
             
-            # Process the batch if we have pending writes
+            # Start the next batch if we have pending writes; earlier batches may still be in flight
             if self.state.pending_writes:
-                await self._process_batch()
+                await workflow.wait_condition(lambda: self._has_free_slot() or self._breaker_backing_off())
+                if self._breaker_backing_off():
+                    continue
+                if not self._start_next_batch():
+                    # Every pending record shares a key with an in-flight batch - wait for one to finish
+                    in_flight = self.in_flight_batches
+                    await workflow.wait_condition(lambda: self.in_flight_batches < in_flight)
+    
+    def _init_flush_controller(self):
+        self.last_arrival_observation = workflow.now()
+        if not self.config.adaptive_flush:
+            return
+        
+        self.flush_controller = AdaptiveFlushController(
+            batch_size=self.config.batch_size_limit,
+            wait_seconds=self.config.max_batch_wait_seconds,
+            min_batch_size=self.config.min_batch_size,
+            max_batch_size=self.config.max_batch_size,
+            min_wait_seconds=self.config.min_batch_wait_seconds,
+            max_wait_seconds=self.config.max_batch_wait_seconds
+        )
+        self.flush_controller.restore(self.state.flush_controller)
+        self._apply_flush_controller()
+    
+    def _apply_flush_controller(self):
+        """Adopt the controller's current batch size and flush interval"""
+        if not self.flush_controller:
+            return
+        
+        self.batch_size_limit = self.flush_controller.batch_size
+        self.max_batch_wait_time = timedelta(seconds=self.flush_controller.wait_seconds)
+    
+    def _observe_arrivals(self):
+        now = workflow.now()
+        if self.flush_controller:
+            elapsed = (now - self.last_arrival_observation).total_seconds()
+            self.flush_controller.observe_arrivals(self.arrivals_since_observation, elapsed)
+            self._apply_flush_controller()
+        self.arrivals_since_observation = 0
+        self.last_arrival_observation = now
+    
+    @staticmethod
+    def _deadline_ts(write_request: Dict[str, Any]) -> Optional[float]:
+        return write_request.get("deadline_ts")
+    
+    def _expected_write_seconds(self) -> float:
+        if self.flush_controller and self.flush_controller.latency_ewma:
+            return self.flush_controller.latency_ewma
+        return 1.0
+    
+    def _flush_lead_seconds(self) -> float:
+        """How long before a deadline a batch must start: the margin plus the expected write time"""
+        return self.config.deadline_margin_seconds + self._expected_write_seconds()
+    
+    def _next_flush_timeout(self) -> timedelta:
+        """The regular flush interval, shortened so the earliest pending deadline is met (EDF)"""
+        deadlines = [ts for ts in map(self._deadline_ts, self.state.pending_writes) if ts is not None]
+        if not deadlines:
+            return self.max_batch_wait_time
+        
+        until_flush = min(deadlines) - self._flush_lead_seconds() - workflow.now().timestamp()
+        return max(timedelta(0), min(self.max_batch_wait_time, timedelta(seconds=until_flush)))
+    
+    def _batch_is_full(self) -> bool:
+        return (self.pending_rows >= self.batch_size_limit
+                or self.pending_bytes >= self.config.max_batch_bytes)
+    
+    def _has_free_slot(self) -> bool:
+        if not self.circuit_breaker.admits(workflow.now().timestamp(), self.in_flight_batches):
+            return False
+        return self.in_flight_batches < self.config.max_in_flight_batches
+    
+    def _breaker_backing_off(self) -> bool:
+        return self.circuit_breaker.blocked_for(workflow.now().timestamp()) > 0
+    
+    @staticmethod
+    def _ordering_key(write_request: Dict[str, Any]) -> str:
+        return write_request.get("ordering_key") or write_request["workflow_id"]
+    
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """
+        Remove up to batch_size_limit rows from the head of pending_writes, skipping
+        records whose ordering key is held by an in-flight batch so per-key order is kept.
+        A vector request is taken whole (even if it alone exceeds the limit), never split across batches.
+        While the circuit breaker isn't closed the batch is a single-write probe, so a failure is its own.
+        """
+        limit = self.batch_size_limit if self.circuit_breaker.state == CLOSED else 1
+        batch: List[Dict[str, Any]] = []
+        remaining: List[Dict[str, Any]] = []
+        batch_rows = 0
+        held_keys: Set[str] = set()  # keys of records left behind, so later ones with the same key wait too
+        for write_request in self.state.pending_writes:
+            key = self._ordering_key(write_request)
+            rows = row_count(write_request)
+            fits = not batch or batch_rows + rows <= limit
+            if fits and key not in self.in_flight_keys and key not in held_keys:
+                batch.append(write_request)
+                batch_rows += rows
+            else:
+                remaining.append(write_request)
+                held_keys.add(key)
+        self.state.pending_writes = remaining
+        self.pending_bytes -= sum(self._payload_bytes(req) for req in batch)
+        self.pending_rows -= batch_rows
+        return batch
+    
+    def _start_next_batch(self) -> bool:
+        """Take the next batch and write it in the background; returns False if nothing could be taken"""
+        
+        batch_to_process = self._take_batch()
+        if not batch_to_process:
+            return False
+        self._observe_arrivals()
+        
+        self.circuit_breaker.on_batch_started()
+        batch_keys = {self._ordering_key(req) for req in batch_to_process}
+        self.in_flight_keys |= batch_keys
+        self.in_flight_batches += 1
+        self.in_flight_bytes += sum(self._payload_bytes(req) for req in batch_to_process)
+        self.state.started_batches_count += 1
+        batch_id = f"batch-{self.state.started_batches_count}"
+        
+        asyncio.create_task(self._process_batch(batch_id, batch_to_process, batch_keys))
+        return True
+    
+    async def _drain_pending(self):
+        """Flush every pending record once and wait for all in-flight work to settle"""
+        
+        to_flush = len(self.state.pending_writes)
+        while to_flush > 0 and self.state.pending_writes:
+            await workflow.wait_condition(lambda: self._has_free_slot() or self._breaker_backing_off())
+            if self._breaker_backing_off():
+                # The sink is failing - carry the rest over instead of hammering it
+                workflow.logger.warn(f"Circuit breaker {self.circuit_breaker.state}: "
+                                     f"leaving {len(self.state.pending_writes)} writes pending")
+                break
+            pending_before = len(self.state.pending_writes)
+            if self._start_next_batch():
+                to_flush -= pending_before - len(self.state.pending_writes)
+            else:
+                in_flight = self.in_flight_batches
+                await workflow.wait_condition(lambda: self.in_flight_batches < in_flight)
+        
+        await workflow.wait_condition(
+            lambda: self.in_flight_batches == 0 and self.confirmations_in_progress == 0
+        )
     
     def _should_continue_as_new(self) -> bool:
         """Determine if workflow should continue-as-new using recommended patterns"""
@@ -107,105 +449,413 @@ class BatcherWorkflow:
             workflow.logger.info("Continue-as-new suggested by Temporal")
             return True
         
+        # While the breaker is open the backlog can't shrink, so only Temporal's suggestion applies
+        if self.circuit_breaker.state != CLOSED:
+            return False
+        
         # Safety: Large pending queue (prevent unbounded state growth)
-        if len(self.state.pending_writes) > self.batch_size_limit * 10:  # 1000 pending writes
-            workflow.logger.warn(f"Continue-as-new triggered by large pending queue: {len(self.state.pending_writes)}")
+        if self.pending_rows > self._pending_rows_limit():
+            workflow.logger.warn(f"Continue-as-new triggered by large pending queue: {len(self.state.pending_writes)} "
+                                 f"writes, {self.pending_rows} rows")
+            return True
+        
+        if self.pending_bytes > self.config.max_pending_bytes // 2:
+            workflow.logger.warn(f"Continue-as-new triggered by large pending payload: {self.pending_bytes} bytes")
             return True
             
         return False
     
+    def _pending_rows_limit(self) -> int:
+        """
+        Pending rows that trigger continue-as-new: several pipeline rounds' worth at the current batch size
+        (1500 rows at the defaults), so a full batch waiting for a busy slot is normal backlog, not a trigger
+        """
+        batch_size = max(self.config.batch_size_limit, self.batch_size_limit)
+        return batch_size * (self.config.max_in_flight_batches + 1) * 5
+    
     async def _safe_continue_as_new(self):
         """Safely continue-as-new with proper cleanup and state management"""
         
         workflow.logger.info("Preparing for continue-as-new...")
+        # New submit_write updates are rejected from here on (callers retry against the next run)
+        self.preparing_continue_as_new = True
+        
+        # Step 1: Process any pending batch to reduce state size (also waits for in-flight batches)
+        # This has to come first: submit_write handlers only finish once their batch is written
+        if self.state.pending_writes:
+            workflow.logger.info(f"Processing {len(self.state.pending_writes)} pending writes before continue-as-new")
+        await self._drain_pending()
         
-        # Step 1: Wait for any running signal handlers to complete
+        # Step 2: Wait for any running signal and update handlers to complete
         try:
             await workflow.wait_condition(
                 lambda: workflow.all_handlers_finished(),
                 timeout=timedelta(seconds=10)
             )
-            workflow.logger.debug("All signal handlers finished")
+            workflow.logger.debug("All signal and update handlers finished")
         except asyncio.TimeoutError:
-            workflow.logger.warn("Timeout waiting for signal handlers - continuing anyway")
-        
-        # Step 2: Process any pending batch to reduce state size
-        if self.state.pending_writes:
-            workflow.logger.info(f"Processing {len(self.state.pending_writes)} pending writes before continue-as-new")
-            await self._process_batch()
+            workflow.logger.warn("Timeout waiting for signal and update handlers - continuing anyway")
         
-        # Step 3: Clean up deduplication state
-        # Only keep request IDs for truly pending requests (should be empty after processing)
-        pending_request_ids = {req['request_id'] for req in self.state.pending_writes if 'request_id' in req}
-        old_count = len(self.state.processed_request_ids)
-        self.state.processed_request_ids = pending_request_ids
-        workflow.logger.info(f"Cleaned up deduplication state: {old_count} -> {len(self.state.processed_request_ids)} request IDs")
+        # Step 3: Carry the deduplication window over (expired buckets are dropped, so its size stays bounded)
+        self.completed_requests.expire(workflow.now().timestamp())
+        self.state.completed_request_index = self.completed_requests.to_dict()
+        workflow.logger.info(f"Carrying {len(self.completed_requests)} completed request fingerprints "
+                             f"and {len(self.active_request_ids)} pending request IDs over")
         
         # Step 4: Prepare state for next execution
         self.state.continue_as_new_count += 1
+        if self.flush_controller:
+            self.state.flush_controller = self.flush_controller.to_dict()
+        self.state.circuit_breaker = self.circuit_breaker.to_dict()
         continue_state = self.state.to_dict()
         
         workflow.logger.info(f"Continuing as new (cycle {self.state.continue_as_new_count})")
-        workflow.continue_as_new(continue_state)
+        workflow.continue_as_new(args=[continue_state, self.config.to_dict()])
     
-    async def _process_batch(self):
-        """Process the current batch with improved deduplication cleanup"""
-        
-        # Create a snapshot of the current batch
-        batch_to_process = self.state.pending_writes.copy()
-        batch_request_ids = {req['request_id'] for req in batch_to_process if 'request_id' in req}
-        self.state.pending_writes.clear()
+    async def _process_batch(self, batch_id: str, batch_to_process: List[Dict[str, Any]], batch_keys: Set[str]):
+        """Write one batch and confirm it, releasing its pipeline slot as soon as the write settles"""
         
-        batch_id = f"batch-{self.state.processed_batches_count + 1}"
-        workflow.logger.info(f"Processing {batch_id} with {len(batch_to_process)} writes")
+        chunks = self._split_by_payload_size(batch_to_process)
+        workflow.logger.info(f"Processing {batch_id} with {len(batch_to_process)} writes in {len(chunks)} chunk(s) "
+                             f"({self.in_flight_batches} batches in flight)")
         
-        try:
-            # Execute the batch write with retries
-            write_result = await workflow.execute_activity(
-                batch_write_to_database,
-                args=[batch_to_process],
-                start_to_close_timeout=timedelta(seconds=30),
-                retry_policy=RetryPolicy(
-                    maximum_attempts=3,
-                    initial_interval=timedelta(seconds=1),
-                    maximum_interval=timedelta(seconds=10),
-                    backoff_coefficient=2.0
+        # Chunks are written in order; the first failure requeues that chunk and everything after it.
+        # Within a written chunk each record settles on its own: written/duplicate records are
+        # confirmed, rejected ones are reported as failures and retryable ones go back to pending.
+        settled: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        retry_writes: List[Tuple[Dict[str, Any], str]] = []
+        write_duration = 0.0
+        failed_from: Optional[int] = None
+        failure = ""
+        for chunk_index, chunk in enumerate(chunks):
+            started_at = workflow.now()
+            try:
+                # Execute the batch write with retries
+                write_result = await workflow.execute_activity_method(
+                    BatchWriteActivities.batch_write_to_database,
+                    args=[chunk],
+                    # Large batches are written in heartbeated sub-chunks: a stalled write is caught by
+                    # the heartbeat timeout, and a retry resumes after the last committed sub-chunk
+                    start_to_close_timeout=timedelta(minutes=10),
+                    heartbeat_timeout=timedelta(seconds=30),
+                    retry_policy=RetryPolicy(
+                        maximum_attempts=3,
+                        initial_interval=timedelta(seconds=1),
+                        maximum_interval=timedelta(seconds=10),
+                        backoff_coefficient=2.0
+                    )
                 )
-            )
+            except Exception as e:
+                workflow.logger.error(f"Failed to process {batch_id} chunk {chunk_index + 1}/{len(chunks)}: {e}")
+                failed_from = chunk_index
+                failure = str(e)
+                break
             
-            # SUCCESS: Update state and clean up deduplication
-            self.state.processed_batches_count += 1
-            
-            # CRITICAL: Remove successfully processed request IDs from deduplication set
-            self.state.processed_request_ids -= batch_request_ids
-            workflow.logger.debug(f"Removed {len(batch_request_ids)} request IDs from deduplication set")
+            # Prefer the sink time measured by the activity over the end-to-end activity time
+            write_duration += write_result.get("duration_seconds", (workflow.now() - started_at).total_seconds())
             
-            # Enhanced result with batch metadata
-            enhanced_result = {
-                **write_result,
+            # Enhanced result with batch and per-chunk metadata (per-record results are split out below)
+            record_outcomes = write_result.get("results") or [{"outcome": "written"}] * len(chunk)
+            if write_result.get("pool"):
+                self.sink_pool = write_result["pool"]
+            if write_result.get("executor"):
+                self.writer_threads = write_result["executor"]
+            chunk_result = {
+                **{key: value for key, value in write_result.items() if key not in ("results", "pool", "executor")},
                 "batch_id": batch_id,
-                "batch_size": len(batch_to_process)
+                "batch_size": len(batch_to_process),
+                "chunk_index": chunk_index,
+                "chunk_count": len(chunks),
+                "chunk_size": len(chunk),
+                "chunk_rows": sum(row_count(req) for req in chunk),
+                "chunk_bytes": sum(self._payload_bytes(req) for req in chunk)
             }
             
-            # Send confirmations to all requesting workflows
-            confirmation_tasks = []
-            for write_request in batch_to_process:
-                task = self._send_confirmation_safe(write_request, enhanced_result)
-                confirmation_tasks.append(task)
+            self.duplicates_suppressed += write_result.get("duplicates", 0)
+            written_at = workflow.now().timestamp()
+            missed = 0
+            for write_request, record in zip(chunk, record_outcomes):
+                outcome = record.get("outcome", "written")
+                if outcome == "retryable":
+                    retry_writes.append((write_request, record.get("error") or "retryable"))
+                    continue
+                
+                record_result = {**chunk_result, "record_outcome": outcome}
+                if "rows" in record:
+                    # Vector request: one aggregated confirmation with a result per row
+                    record_result["rows"] = record["rows"]
+                    record_result["row_count"] = len(record["rows"])
+                if outcome == "rejected":
+                    record_result["status"] = "rejected"
+                    record_result["error"] = record.get("error")
+                    self.records_rejected += 1
+                else:
+                    record_result["status"] = "success"
+                    if (self._deadline_ts(write_request) or written_at) < written_at:
+                        missed += 1
+                settled.append((write_request, record_result))
             
-            # Wait for all confirmations (with individual error handling)
-            await asyncio.gather(*confirmation_tasks, return_exceptions=True)
+            if missed:
+                self.state.deadline_misses += missed
+                workflow.logger.warn(f"{missed} writes in {batch_id} became durable after their deadline")
+        
+        # Put retryable and failed writes back at the head of pending (keeping their request IDs
+        # in active_request_ids) so they stay ahead of later writes sharing their ordering keys.
+        # Writes that used up their attempts are dead-lettered instead of holding up every batch.
+        # Only writes that actually failed are charged an attempt (see _failed_chunk_writes).
+        failed_writes, untried = self._failed_chunk_writes(chunks, failed_from, failure)
+        requeue, exhausted = self._count_attempts(retry_writes + failed_writes)
+        requeue += untried
+        if requeue:
+            workflow.logger.warn(f"Re-queuing {len(requeue)} writes ({len(retry_writes)} retryable records, "
+                                 f"{len(failed_writes) + len(untried)} from failed chunks)")
+            self._requeue(requeue)
+        self.records_retried += len(retry_writes)
+        
+        if failed_from is not None:
+            # FAILURE: free the pipeline slot and back off
+            self._release_slot(batch_keys)
+            self.circuit_breaker.record_failure(workflow.now().timestamp())
+            if self.circuit_breaker.state != CLOSED:
+                workflow.logger.warn(f"Circuit breaker open after {self.circuit_breaker.consecutive_failures} "
+                                     f"consecutive failures")
+            if self.flush_controller:
+                self.flush_controller.observe_failure()
+                self._apply_flush_controller()
+        else:
+            # SUCCESS: Update state and free the pipeline slot
+            self.state.processed_batches_count += 1
+            self._release_slot(batch_keys)
+            if self.circuit_breaker.state != CLOSED:
+                workflow.logger.info("Circuit breaker closed: probe batch succeeded")
+            self.circuit_breaker.record_success()
             
+            if self.flush_controller:
+                self.flush_controller.observe_batch(sum(row_count(req) for req in batch_to_process), write_duration)
+                self._apply_flush_controller()
+                workflow.logger.debug(f"Flush controller: {self.flush_controller.last_decision}")
+        
+        if exhausted:
+            self.confirmations_in_progress += 1
+            try:
+                settled += await self._dead_letter(batch_id, exhausted)
+            finally:
+                self.confirmations_in_progress -= 1
+        # Requeued writes are counted in pending_bytes again
+        self.in_flight_bytes -= sum(self._payload_bytes(req) for req in batch_to_process)
+        
+        if not settled:
+            return
+        
+        # CRITICAL: Move successfully processed request IDs into the completed-request window.
+        # Rejected and dead-lettered requests are only released, so a resubmission (or a DLQ replay)
+        # is written rather than re-confirmed as a success.
+        settled_request_ids = {req['request_id'] for req, _ in settled if 'request_id' in req}
+        self.active_request_ids -= settled_request_ids
+        now_ts = workflow.now().timestamp()
+        for write_request, record_result in settled:
+            if record_result["status"] == "success" and 'request_id' in write_request:
+                self.completed_requests.add(write_request['request_id'], now_ts)
+        workflow.logger.debug(f"Released {len(settled_request_ids)} settled request IDs")
+        
+        # Send confirmations to all requesting workflows (the next batch can already be writing)
+        self.confirmations_in_progress += 1
+        try:
+            await self._confirm_writes(batch_id, settled)
+        finally:
+            self.confirmations_in_progress -= 1
+        
+        if failed_from is None and not retry_writes:
             workflow.logger.info(f"Successfully processed {batch_id}")
-            
+        else:
+            workflow.logger.info(f"Partially processed {batch_id}: {len(settled)}/{len(batch_to_process)} "
+                                 f"writes settled")
+    
+    @staticmethod
+    def _failed_chunk_writes(chunks: List[List[Dict[str, Any]]], failed_from: Optional[int], failure: str):
+        """
+        Writes of a batch whose chunk failed_from failed, as (writes charged an attempt with the error,
+        writes requeued uncharged). Only a failed chunk holding a single write is charged: the activity
+        isolates failing records itself, so a chunk with several writes only fails as a whole when the sink
+        does, and the chunks after it were never tried. If that keeps happening the breaker opens and
+        probes with a single write, which is charged.
+        """
+        if failed_from is None:
+            return [], []
+        failed_chunk = chunks[failed_from]
+        failed_writes = [(failed_chunk[0], failure)] if len(failed_chunk) == 1 else []
+        untried = [] if failed_writes else list(failed_chunk)
+        untried += [write_request for chunk in chunks[failed_from + 1:] for write_request in chunk]
+        return failed_writes, untried
+    
+    def _count_attempts(self, failed: List[Tuple[Dict[str, Any], str]]):
+        """
+        Record another failed attempt (and its error) on each write.
+        Returns (writes to requeue, writes that reached max_write_attempts).
+        """
+        requeue: List[Dict[str, Any]] = []
+        exhausted: List[Dict[str, Any]] = []
+        for write_request, error in failed:
+            attempted = {**write_request, "attempts": write_request.get("attempts", 0) + 1, "last_error": error}
+            if attempted["attempts"] >= self.config.max_write_attempts:
+                exhausted.append(attempted)
+            else:
+                requeue.append(attempted)
+        return requeue, exhausted
+    
+    def _requeue(self, write_requests: List[Dict[str, Any]]):
+        self.state.pending_writes[:0] = write_requests
+        self.pending_bytes += sum(self._payload_bytes(req) for req in write_requests)
+        self.pending_rows += sum(row_count(req) for req in write_requests)
+    
+    async def _dead_letter(self, batch_id: str,
+                           exhausted: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Move writes that used up their attempts to the dead-letter table.
+        Returns their (request, result) pairs to confirm; if the table can't be written they are requeued.
+        """
+        batcher_id = workflow.info().workflow_id
+        entries = [
+            {
+                "request": write_request,
+                "batcher_id": batcher_id,
+                "batch_id": batch_id,
+                "attempts": write_request["attempts"],
+                "last_error": write_request.get("last_error")
+            }
+            for write_request in exhausted
+        ]
+        
+        try:
+            # Entries carry the full records, so keep each activity call under the payload limit
+            for chunk in self._split_by_payload_size(entries, lambda entry: self._payload_bytes(entry["request"])):
+                await workflow.execute_activity(
+                    dead_letter_writes,
+                    args=[chunk],
+                    start_to_close_timeout=timedelta(seconds=30),
+                    retry_policy=RetryPolicy(
+                        maximum_attempts=5,
+                        initial_interval=timedelta(seconds=1),
+                        maximum_interval=timedelta(seconds=30),
+                        backoff_coefficient=2.0
+                    )
+                )
         except Exception as e:
-            workflow.logger.error(f"Failed to process {batch_id}: {e}")
-            
-            # FAILURE: Re-add failed writes to pending (keep request IDs in deduplication set)
-            workflow.logger.warn(f"Re-queuing {len(batch_to_process)} failed writes")
-            self.state.pending_writes.extend(batch_to_process)
-            # Note: We don't remove request_ids from processed_request_ids on failure
-            # This ensures we won't accept duplicates during retry
+            # Never drop a write: keep it pending and try to dead-letter it again after its next failure
+            workflow.logger.error(f"Failed to dead-letter {len(exhausted)} writes from {batch_id}, "
+                                  f"re-queuing them: {e}")
+            self._requeue(exhausted)
+            return []
+        
+        self.state.dead_lettered_count += len(exhausted)
+        workflow.logger.warn(f"Dead-lettered {len(exhausted)} writes from {batch_id} after "
+                             f"{self.config.max_write_attempts} attempts")
+        return [
+            (write_request, {
+                "status": "dead_lettered",
+                "error": write_request.get("last_error"),
+                "attempts": write_request["attempts"],
+                "batch_id": batch_id,
+                "count": 0
+            })
+            for write_request in exhausted
+        ]
+    
+    @staticmethod
+    def _payload_bytes(write_request: Dict[str, Any]) -> int:
+        return write_request.get("payload_bytes", 0)
+    
+    def _split_by_payload_size(self, batch: List[Dict[str, Any]],
+                               size_of: Optional[Callable[[Dict[str, Any]], int]] = None) -> List[List[Dict[str, Any]]]:
+        """Split a batch into consecutive chunks that each fit in one activity payload"""
+        
+        size_of = size_of or self._payload_bytes
+        chunks: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        current_bytes = 0
+        for write_request in batch:
+            size = size_of(write_request)
+            if current and current_bytes + size > self.config.max_activity_payload_bytes:
+                chunks.append(current)
+                current, current_bytes = [], 0
+            if size > self.config.max_activity_payload_bytes:
+                workflow.logger.warn(f"Write request {write_request.get('request_id')} is {size} bytes, "
+                                     f"above the {self.config.max_activity_payload_bytes} byte payload limit")
+            current.append(write_request)
+            current_bytes += size
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _release_slot(self, batch_keys: Set[str]):
+        self.in_flight_keys -= batch_keys
+        self.in_flight_batches -= 1
+    
+    async def _confirm_writes(self, batch_id: str, written: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """Hand results to waiting submit_write updates, then confirm everyone else by signal"""
+        
+        to_signal: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        for write_request, result in written:
+            request_id = write_request.get("request_id")
+            if request_id in self.update_waiters:
+                self.update_results[request_id] = result
+            if write_request.get("confirmation") != "update":
+                to_signal.append((write_request, result))
+        
+        if not to_signal:
+            return
+        
+        if self.config.confirmation_mode == "activity":
+            await self._deliver_confirmations_via_activity(batch_id, to_signal)
+            return
+        
+        confirmation_tasks = []
+        for write_request, result in to_signal:
+            task = self._send_confirmation_safe(write_request, result)
+            confirmation_tasks.append(task)
+        
+        # Wait for all confirmations (with individual error handling)
+        await asyncio.gather(*confirmation_tasks, return_exceptions=True)
+    
+    async def _deliver_confirmations_via_activity(self, batch_id: str,
+                                                  to_signal: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """Signal all requesters from one activity, keeping per-record signal events out of this history"""
+        
+        confirmations = []
+        for write_request, result in to_signal:
+            requesting_workflow_id = write_request.get("requesting_workflow")
+            if not requesting_workflow_id:
+                workflow.logger.warn("Write request missing requesting_workflow field")
+                continue
+            confirmations.append({
+                "workflow_id": requesting_workflow_id,
+                "request_id": write_request.get("request_id"),
+                "result": result
+            })
+        
+        try:
+            delivery = await workflow.execute_activity_method(
+                ConfirmationActivities.deliver_confirmations,
+                args=[confirmations],
+                start_to_close_timeout=timedelta(seconds=60),
+                retry_policy=RetryPolicy(
+                    maximum_attempts=3,
+                    initial_interval=timedelta(seconds=1),
+                    maximum_interval=timedelta(seconds=10),
+                    backoff_coefficient=2.0
+                )
+            )
+        except Exception as e:
+            workflow.logger.error(f"Failed to deliver {len(confirmations)} confirmations for {batch_id}: {e}")
+            self.failed_confirmations += len(confirmations)
+            return
+        
+        for failure in delivery.get("failed", []):
+            workflow.logger.error(f"Failed to confirm {failure.get('request_id')} to "
+                                  f"{failure.get('workflow_id')}: {failure.get('error')}")
+        self.failed_confirmations += len(delivery.get("failed", []))
+        workflow.logger.debug(f"Delivered {delivery.get('delivered', 0)}/{len(confirmations)} confirmations "
+                              f"for {batch_id}")
     
     async def _send_confirmation_safe(self, write_request: Dict[str, Any], result: Dict[str, Any]):
         """Safely send confirmation to requesting workflow with error handling"""
@@ -224,72 +874,278 @@ class BatcherWorkflow:
             
         except Exception as e:
             workflow.logger.error(f"Failed to signal {requesting_workflow_id}: {e}")
+            self.failed_confirmations += 1
             
-    @workflow.signal
-    def add_write_request(self, request: Dict[str, Any]):
-        """
-        Receive a write request with exactly-once processing guarantee
-        """
+    def _validate_write_request(self, request: Any) -> Optional[str]:
+        """Return why a write request is malformed, or None if it can be accepted"""
         
         # Basic validation
         if not isinstance(request, dict):
-            workflow.logger.error("Invalid write request: not a dictionary")
-            return
+            return "Invalid write request: not a dictionary"
             
-        required_fields = ["workflow_id", "data", "requesting_workflow"]
+        required_fields = ["workflow_id", "requesting_workflow"]
         missing_fields = [field for field in required_fields if field not in request]
+        # The payload comes inline ("data"), as a claim-check reference ("data_ref"),
+        # or as a vector of rows ("records") written atomically under one request ID
+        if "data" not in request and "data_ref" not in request and "records" not in request:
+            missing_fields.append("data")
         if missing_fields:
-            workflow.logger.error(f"Write request missing required fields: {missing_fields}")
-            return
+            return f"Write request missing required fields: {missing_fields}"
+        
+        if "records" in request:
+            records = request["records"]
+            if not isinstance(records, list) or not records:
+                return "Invalid write request: records must be a non-empty list"
+            if "data" in request or "data_ref" in request:
+                return "Invalid write request: records can't be combined with data or data_ref"
+            bad_rows = [k for k, record in enumerate(records)
+                        if not isinstance(record, dict) or ("data" not in record and "data_ref" not in record)]
+            if bad_rows:
+                return f"Invalid write request: records {bad_rows[:10]} have no data or data_ref"
+        
+        return None
+    
+    def _enqueue_write_request(self, request: Dict[str, Any]) -> Optional[str]:
+        """
+        Queue a write request with exactly-once processing guarantee.
+        Returns its request ID (also for duplicates), or None if the request is invalid.
+        """
+        
+        error = self._validate_write_request(request)
+        if error:
+            workflow.logger.error(error)
+            return None
         
         # EXACTLY-ONCE PROCESSING: Check for request ID
         request_id = request.get("request_id")
         if not request_id:
             # Generate a deterministic request ID if not provided (for backward compatibility)
-            request_data = f"{request['workflow_id']}-{request.get('data', '')}-{workflow.now().isoformat()}"
+            payload = request.get('data', request.get('data_ref', request.get('records', '')))
+            request_data = f"{request['workflow_id']}-{payload}-{workflow.now().isoformat()}"
             request_id = f"{request['workflow_id']}-{hashlib.md5(request_data.encode()).hexdigest()[:8]}"
             request["request_id"] = request_id
             workflow.logger.warn(f"Generated request_id for request from {request['workflow_id']}: {request_id}")
         
-        # DEDUPLICATION: Check if we've already processed this request
-        if request_id in self.state.processed_request_ids:
+        # DEDUPLICATION: Check if this request is already queued or was written recently
+        if request_id in self.active_request_ids:
             workflow.logger.info(f"Duplicate request {request_id} from {request['workflow_id']} - ignoring")
-            return
+            return request_id
+        if self.completed_requests.contains(request_id, workflow.now().timestamp()):
+            workflow.logger.info(f"Duplicate request {request_id} from {request['workflow_id']} "
+                                 "was already written - re-confirming")
+            self._confirm_duplicate(request)
+            return request_id
+        
+        # BACKPRESSURE: The backlog is carried through continue-as-new, so it can't grow without bound
+        # while the sink is down. Updates are refused by the validator; signal requesters are told to retry.
+        payload_bytes = self._request_bytes(request)
+        if self._backlog_full(payload_bytes):
+            self.writes_turned_away += 1
+            workflow.logger.warn(f"Backlog full ({self._backlog_bytes()} bytes) - turning away {request_id} "
+                                 f"from {request['workflow_id']}")
+            if request.get("confirmation") != "update":
+                self._reject_backlog_full(request, {
+                    "status": "backlog_full",
+                    "error": f"Batcher backlog is full ({self.config.max_pending_bytes} bytes), retry shortly",
+                    "retry_after_seconds": self._backlog_retry_after(workflow.now().timestamp()),
+                    "count": 0,
+                    "batch_id": None
+                })
+            return None
         
         # Mark request as being processed (add to deduplication set)
-        self.state.processed_request_ids.add(request_id)
+        self.active_request_ids.add(request_id)
         
-        # Add request with metadata
+        # Requesters give up at their deadline; keep it as a timestamp for cheap comparisons
+        deadline_ts = None
+        if request.get("deadline"):
+            try:
+                deadline_ts = datetime.fromisoformat(request["deadline"]).timestamp()
+            except (TypeError, ValueError):
+                workflow.logger.warn(f"Ignoring unparseable deadline on {request_id}: {request['deadline']}")
+        if deadline_ts is not None:
+            # Wake the run loop if this deadline needs an earlier flush than the timer it is waiting on
+            if self.flush_timer_ends_ts is not None and deadline_ts - self._flush_lead_seconds() < self.flush_timer_ends_ts:
+                self.flush_deadline_changed = True
+        
+        # Add request with metadata; the serialized size drives byte-based flushing and chunking
         enriched_request = {
             **request,
+            "payload_bytes": payload_bytes,
+            "deadline_ts": deadline_ts,
             "received_at": workflow.now(),
             "batch_sequence": self.session_signals_received,  # Session-level sequence
             "request_id": request_id
         }
         
+        rows = row_count(request)
         self.state.pending_writes.append(enriched_request)
+        self.pending_bytes += payload_bytes
+        self.pending_rows += rows
+        self.arrivals_since_observation += rows
         self.session_signals_received += 1  # Increment session counter (resets on continue-as-new)
         
         workflow.logger.info(
             f"Added write request {request_id} from {request['workflow_id']} "
-            f"(pending: {len(self.state.pending_writes)}, "
+            + (f"with {rows} rows " if "records" in request else "")
+            + f"(pending: {len(self.state.pending_writes)}, "
             f"session signals: {self.session_signals_received})"
         )
+        return request_id
+    
+    def _confirm_duplicate(self, request: Dict[str, Any]):
+        """Confirm a resubmitted request that was already written (its original confirmation may have been lost)"""
+        
+        self._confirm_now(request, {
+            "status": "success",
+            "duplicate": True,
+            "count": 0,
+            "batch_id": None
+        }, "duplicate")
+    
+    def _confirm_now(self, request: Dict[str, Any], result: Dict[str, Any], batch_id: str = "unbatched"):
+        """Send a request its result right away, without it going through a batch"""
+        
+        async def confirm():
+            self.confirmations_in_progress += 1
+            try:
+                await self._confirm_writes(batch_id, [(request, result)])
+            finally:
+                self.confirmations_in_progress -= 1
+        
+        asyncio.create_task(confirm())
+    
+    def _reject_backlog_full(self, request: Dict[str, Any], result: Dict[str, Any]):
+        """
+        Queue a backlog_full confirmation. While one delivery is running the rejections arriving meanwhile
+        are collected and sent together by the next, so a full backlog costs one confirmation round
+        (one deliver_confirmations activity in activity mode) per delivery rather than per turned-away write
+        """
+        self.backlog_rejections.append((request, result))
+        if self.delivering_backlog_rejections:
+            return
+        
+        async def deliver():
+            self.confirmations_in_progress += 1
+            try:
+                while self.backlog_rejections:
+                    rejections, self.backlog_rejections = self.backlog_rejections, []
+                    await self._confirm_writes("backlog_full", rejections)
+            finally:
+                self.delivering_backlog_rejections = False
+                self.confirmations_in_progress -= 1
+        
+        self.delivering_backlog_rejections = True
+        asyncio.create_task(deliver())
+    
+    def _backlog_retry_after(self, now_ts: float) -> float:
+        """
+        Seconds a turned-away requester should wait before resubmitting: the breaker's remaining backoff,
+        plus the time to write the pending rows at the current batch size, pipeline depth and write latency
+        """
+        rows_per_round = self.batch_size_limit * self.config.max_in_flight_batches
+        rounds = -(-self.pending_rows // rows_per_round)
+        return max(1.0, self.circuit_breaker.blocked_for(now_ts) + rounds * self._expected_write_seconds())
+    
+    @staticmethod
+    def _request_bytes(request: Dict[str, Any]) -> int:
+        return len(json.dumps(request, separators=(",", ":"), default=str).encode())
+    
+    def _backlog_bytes(self) -> int:
+        """Serialized size of the writes accepted but not yet settled"""
+        return self.pending_bytes + self.in_flight_bytes
+    
+    def _backlog_full(self, incoming_bytes: int) -> bool:
+        # An empty backlog always takes one write, however large, so an oversized one is rejected by the sink
+        return self._backlog_bytes() > 0 and self._backlog_bytes() + incoming_bytes > self.config.max_pending_bytes
+    
+    @workflow.signal
+    def add_write_request(self, request: Dict[str, Any]):
+        """
+        Receive a write request with exactly-once processing guarantee;
+        the result is delivered later through the requester's write_confirmation signal.
+        A request may carry a list of "records" instead of "data": its rows are written in one
+        transaction and confirmed once, with a result per row
+        """
+        self._enqueue_write_request(request)
+    
+    @workflow.update
+    async def submit_write(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Submit a write request and return its write result once the batch containing it is durable.
+        Replaces the signal + write_confirmation round trip; no confirmation signal is sent.
+        """
+        request_id = self._enqueue_write_request({**request, "confirmation": "update"})
+        if request_id is None:
+            # Only reachable on replay of histories from before validation or the backlog cap changed
+            raise ApplicationError("Write request not accepted", non_retryable=True, type="INVALID_WRITE_REQUEST")
+        
+        self.update_waiters[request_id] = self.update_waiters.get(request_id, 0) + 1
+        try:
+            await workflow.wait_condition(lambda: request_id in self.update_results)
+            return self.update_results[request_id]
+        finally:
+            self.update_waiters[request_id] -= 1
+            if not self.update_waiters[request_id]:
+                del self.update_waiters[request_id]
+                self.update_results.pop(request_id, None)
+    
+    @submit_write.validator
+    def validate_submit_write(self, request: Dict[str, Any]):
+        """Reject malformed requests, new submissions while draining for continue-as-new, and a full backlog"""
+        error = self._validate_write_request(request)
+        if error:
+            raise ApplicationError(error, non_retryable=True, type="INVALID_WRITE_REQUEST")
+        if self.preparing_continue_as_new:
+            raise ApplicationError("Batcher is continuing as new, retry shortly",
+                                   type="BATCHER_CONTINUING_AS_NEW")
+        request_id = request.get("request_id")
+        known = request_id in self.active_request_ids or (
+            request_id and self.completed_requests.contains(request_id, workflow.now().timestamp()))
+        if not known and self._backlog_full(self._request_bytes({**request, "confirmation": "update"})):
+            raise ApplicationError(f"Batcher backlog is full ({self.config.max_pending_bytes} bytes), retry shortly",
+                                   type="BATCHER_BACKLOG_FULL")
     
     @workflow.query
     def get_stats(self) -> Dict[str, Any]:
         """Query method to get current batcher statistics"""
         return {
             "pending_writes": len(self.state.pending_writes),
+            "pending_bytes": self.pending_bytes,
+            "pending_rows": self.pending_rows,
+            "backlog_bytes": self._backlog_bytes(),
+            "max_pending_bytes": self.config.max_pending_bytes,
+            "writes_turned_away": self.writes_turned_away,
             "processed_batches": self.state.processed_batches_count,
+            "in_flight_batches": self.in_flight_batches,
+            "max_in_flight_batches": self.config.max_in_flight_batches,
             "session_signals_received": self.session_signals_received,  # Session counter
-            "processed_request_ids_count": len(self.state.processed_request_ids),
+            "waiting_updates": sum(self.update_waiters.values()),
+            "confirmation_mode": self.config.confirmation_mode,
+            "failed_confirmations": self.failed_confirmations,
+            "records_rejected": self.records_rejected,
+            "records_retried": self.records_retried,
+            "duplicates_suppressed": self.duplicates_suppressed,
+            "dead_lettered": self.state.dead_lettered_count,
+            "max_write_attempts": self.config.max_write_attempts,
+            "deadline_misses": self.state.deadline_misses,
+            "deadline_flushes": self.state.deadline_flushes,
+            "next_flush_in_seconds": self._next_flush_timeout().total_seconds(),
+            "circuit_breaker": self.circuit_breaker.snapshot(workflow.now().timestamp()),
+            "sink_pool": self.sink_pool,
+            "writer_threads": self.writer_threads,
+            "active_request_ids_count": len(self.active_request_ids),
+            "completed_request_fingerprints": len(self.completed_requests),
+            "dedup_evicted": self.completed_requests.evicted,
             "continue_as_new_cycle": self.state.continue_as_new_count,
             "batch_size_limit": self.batch_size_limit,
+            "max_batch_wait_seconds": self.max_batch_wait_time.total_seconds(),
+            "flush_controller": self.flush_controller.snapshot() if self.flush_controller else None,
             "is_continue_suggested": workflow.info().is_continue_as_new_suggested()
         }
     
     @workflow.query  
     def is_request_processed(self, request_id: str) -> bool:
-        """Query to check if a specific request has been processed (useful for debugging)"""
-        return request_id in self.state.processed_request_ids
\ No newline at end of file
+        """Query to check if a specific request is pending or was recently written (useful for debugging)"""
+        return (request_id in self.active_request_ids
+                or self.completed_requests.contains(request_id, workflow.now().timestamp()))
\ No newline at end of file
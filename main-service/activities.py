@@ -1,5 +1,17 @@
 import asyncio
+from typing import Any, Dict
 from temporalio import activity
+from temporalio.client import Client, WorkflowUpdateFailedError
+from temporalio.exceptions import ApplicationError
+
+from blobstore import FilesystemBlobStore
+
+
+# Update submissions wait for a whole batch to be written while holding an activity slot, so they run on
+# their own task queue and worker with room for many more concurrent calls than the business activities
+WRITE_SUBMISSION_TASK_QUEUE = "main-write-submission-queue"
+WRITE_SUBMISSION_CONCURRENCY = 1000
+WRITE_SUBMISSION_HEARTBEAT_SECONDS = 10
 
 
 @activity.defn
@@ -10,4 +22,50 @@ async def simulate_work(workflow_id: str, step: str) -> str:
     
     result = f"Completed {step} for workflow {workflow_id}"
     activity.logger.info(result)
-    return result
\ No newline at end of file
+    return result
+
+
+@activity.defn
+async def store_payload(data: str) -> Dict[str, Any]:
+    """Claim-check: put the write payload in the blob store so only its reference travels through Temporal"""
+    payload = data.encode()
+    loop = asyncio.get_running_loop()
+    data_ref = await loop.run_in_executor(None, FilesystemBlobStore().put, payload)
+    return {"data_ref": data_ref, "data_bytes": len(payload)}
+
+
+class WriteSubmissionActivities:
+    """Activities that reach the batcher through the Temporal client (workflows can't send updates)"""
+    
+    def __init__(self, client: Client):
+        self.client = client
+    
+    @activity.defn
+    async def submit_write_via_update(self, batcher_id: str, write_request: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit a write with the batcher's submit_write update and return once it is durable"""
+        
+        batcher_handle = self.client.get_workflow_handle(batcher_id)
+        heartbeats = asyncio.create_task(self._heartbeat_while_waiting())
+        try:
+            # The request ID doubles as the update ID, so a retried attempt attaches to the same update
+            return await batcher_handle.execute_update(
+                "submit_write",
+                write_request,
+                id=write_request["request_id"],
+                result_type=dict
+            )
+        except WorkflowUpdateFailedError as e:
+            cause = e.cause
+            if isinstance(cause, ApplicationError) and cause.non_retryable:
+                # The batcher rejected the request itself - retrying the activity won't help
+                raise ApplicationError(str(cause), non_retryable=True, type=cause.type)
+            raise
+        finally:
+            heartbeats.cancel()
+    
+    @staticmethod
+    async def _heartbeat_while_waiting():
+        """Heartbeat while the update is outstanding, so a lost worker is caught by the heartbeat timeout"""
+        while True:
+            activity.heartbeat()
+            await asyncio.sleep(WRITE_SUBMISSION_HEARTBEAT_SECONDS)
@@ -0,0 +1,35 @@
+import hashlib
+import os
+import tempfile
+
+
+DEFAULT_BLOB_STORE_DIR = os.environ.get(
+    "BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "temporal-batching-blobs")
+)
+
+
+class FilesystemBlobStore:
+    """
+    Content-addressed local blob store used for claim-check writes (stand-in for S3/GCS).
+    Blobs live at <root>/<first 2 hex chars>/<sha256 hex>; references look like "sha256:<hex>".
+    The batcher service reads the same layout (batcher-service/blobstore.py).
+    """
+    
+    def __init__(self, root: str = DEFAULT_BLOB_STORE_DIR):
+        self.root = root
+    
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+    
+    def put(self, payload: bytes) -> str:
+        """Store a payload and return its reference; storing the same content twice is a no-op"""
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        return f"sha256:{digest}"
@@ -0,0 +1,249 @@
+import asyncio
+import csv
+import json
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from load_metrics import percentile
+
+
+ARRIVAL_PROCESSES = ("constant", "poisson", "step")
+
+
+def arrival_times(process: str, rate: float, duration: float, steps: int = 5,
+                  seed: Optional[int] = None) -> Iterator[float]:
+    """
+    Offsets (seconds from the start of the run) at which to start workflows.
+    constant: evenly spaced at `rate`; poisson: exponential inter-arrival times with mean 1/rate
+    (seeded, so a run can be repeated); step: `steps` equal-length stages at rate/steps, 2*rate/steps, ... rate.
+    """
+    if process == "constant":
+        count = int(rate * duration)
+        for i in range(count):
+            yield i / rate
+    elif process == "poisson":
+        rng = random.Random(seed)
+        t = rng.expovariate(rate)
+        while t < duration:
+            yield t
+            t += rng.expovariate(rate)
+    elif process == "step":
+        stage_seconds = duration / steps
+        for stage in range(steps):
+            stage_rate = rate * (stage + 1) / steps
+            stage_start = stage * stage_seconds
+            for i in range(int(stage_rate * stage_seconds)):
+                yield stage_start + i / stage_rate
+    else:
+        raise ValueError(f"Unknown arrival process: {process}")
+
+
+def _parse_timestamp(value: Any) -> float:
+    """Epoch seconds (number or numeric string) or an ISO 8601 timestamp"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _trace_rows(path: str) -> Iterator[Tuple[Any, Any]]:
+    """(timestamp, payload_size) per trace entry; JSON lines for .json/.jsonl files, CSV otherwise"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry["timestamp"], entry.get("payload_size")
+            return
+
+        rows = csv.reader(f)
+        for row in rows:
+            if not row or row[0].lstrip().startswith("#"):
+                continue
+            if row[0].strip() == "timestamp":
+                continue  # header
+            yield row[0], row[1] if len(row) > 1 and row[1].strip() else None
+
+
+def trace_arrivals(path: str, speedup: float = 1.0) -> Iterator[Tuple[float, Optional[int]]]:
+    """
+    Replay a recorded arrival trace: (offset, payload size) per entry, offsets relative to the first
+    timestamp and divided by `speedup`. Read lazily, so traces don't have to fit in memory; entries
+    must be in time order (one earlier than its predecessor is replayed right after it).
+    """
+    first: Optional[float] = None
+    previous = 0.0
+    for timestamp, payload_size in _trace_rows(path):
+        timestamp = _parse_timestamp(timestamp)
+        if first is None:
+            first = timestamp
+        previous = max(previous, (timestamp - first) / speedup)
+        yield previous, int(payload_size) if payload_size is not None else None
+
+
+def make_payload(i: int, size: Optional[int] = None) -> str:
+    """Work data for the i-th arrival, padded to `size` characters when the trace recorded one"""
+    data = f"business-data-{i}"
+    if size is None or size <= len(data):
+        return data
+    return data + "-" + "x" * (size - len(data) - 1)
+
+
+def target_rate_at(process: str, rate: float, duration: float, steps: int, offset: float) -> float:
+    """Arrival rate the process aims for at `offset` seconds into the run"""
+    if offset >= duration:
+        return 0.0
+    if process == "step":
+        stage = min(steps - 1, int(offset / (duration / steps)))
+        return rate * (stage + 1) / steps
+    return rate
+
+
+@dataclass
+class LoadSample:
+    """Load over one reporting window"""
+    elapsed_seconds: float
+    target_rate: float
+    start_rate: float
+    completion_rate: float
+    backlog: int
+    start_lag_ms: float
+    latency_p50: Optional[float]
+    latency_p95: Optional[float]
+    latency_p99: Optional[float]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "elapsed_seconds": self.elapsed_seconds,
+            "target_rate": self.target_rate,
+            "start_rate": self.start_rate,
+            "completion_rate": self.completion_rate,
+            "backlog": self.backlog,
+            "start_lag_ms": self.start_lag_ms,
+            "latency_p50": self.latency_p50,
+            "latency_p95": self.latency_p95,
+            "latency_p99": self.latency_p99
+        }
+
+
+class LoadGenerator:
+    """
+    Open-loop load: workflows are started on the arrival schedule whether or not earlier ones have
+    completed, so when the batcher saturates the backlog (started, not yet completed) grows instead
+    of the offered load dropping. Start calls still go through the starter's concurrency limit;
+    if they can't keep up, that shows as start lag.
+    """
+
+    def __init__(self, starter, collector, id_prefix: Optional[str] = None):
+        self.starter = starter
+        self.collector = collector
+        self.id_prefix = id_prefix or f"load-{int(time.time())}"
+        self.samples: List[LoadSample] = []
+        self.lag_total = 0.0
+        self.lag_count = 0
+        self.max_lag = 0.0
+        self.dispatched = 0
+        # Counters at the start of the current reporting window:
+        # (time, dispatched, started, completed, latencies seen, start lag total, start lag count)
+        self._window: Tuple[float, int, int, int, int, float, int] = (0.0, 0, 0, 0, 0, 0.0, 0)
+
+    async def run(self, arrivals: Iterable[Tuple[float, Optional[int]]],
+                  target_rate_fn: Optional[Callable[[float], float]] = None, report_interval: float = 5.0):
+        """
+        Start a workflow for every (offset, payload size) arrival, reporting a LoadSample every
+        report_interval seconds. Without target_rate_fn the target is the rate arrivals were dispatched at.
+        """
+        loop_start = time.monotonic()
+        self._window = (loop_start, self.dispatched, self.starter.started, self.collector.completed,
+                        len(self.collector.latencies), 0.0, 0)
+        reporter = asyncio.create_task(self._report(loop_start, target_rate_fn, report_interval))
+        tasks = set()
+
+        try:
+            for i, (offset, payload_size) in enumerate(arrivals):
+                delay = loop_start + offset - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.dispatched += 1
+                task = asyncio.create_task(self._start(i, loop_start + offset, payload_size))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+
+            # Arrivals are over; keep sampling while the backlog drains
+            await self.collector.wait()
+        finally:
+            reporter.cancel()
+        self._sample(loop_start, target_rate_fn, report_interval, final=True)
+
+    async def _start(self, i: int, scheduled_at: float, payload_size: Optional[int] = None):
+        handle = await self.starter.start(f"{self.id_prefix}-{i:06d}", make_payload(i, payload_size))
+        if handle:
+            lag = time.monotonic() - scheduled_at
+            self.lag_total += lag
+            self.lag_count += 1
+            self.max_lag = max(self.max_lag, lag)
+
+    async def _report(self, loop_start: float, target_rate_fn, interval: float):
+        print(f"{'t(s)':>6} {'target/s':>9} {'starts/s':>9} {'done/s':>8} {'backlog':>8} "
+              f"{'lag ms':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7}")
+        while True:
+            await asyncio.sleep(interval)
+            self._sample(loop_start, target_rate_fn, interval)
+
+    def _sample(self, loop_start: float, target_rate_fn, interval: float, final: bool = False):
+        window_start, dispatched, started, completed, latency_index, lag_total, lag_count = self._window
+        now = time.monotonic()
+        seconds = now - window_start
+        if seconds <= 0 or (final and seconds < interval / 10):
+            return
+
+        window_latencies = sorted(self.collector.latencies[latency_index:])
+        window_lags = self.lag_count - lag_count
+        sample = LoadSample(
+            elapsed_seconds=now - loop_start,
+            target_rate=(target_rate_fn(window_start - loop_start) if target_rate_fn
+                         else (self.dispatched - dispatched) / seconds),
+            start_rate=(self.starter.started - started) / seconds,
+            completion_rate=(self.collector.completed - completed) / seconds,
+            backlog=self.collector.in_flight,
+            start_lag_ms=(self.lag_total - lag_total) / window_lags * 1000 if window_lags else 0.0,
+            latency_p50=percentile(window_latencies, 50),
+            latency_p95=percentile(window_latencies, 95),
+            latency_p99=percentile(window_latencies, 99)
+        )
+        self.samples.append(sample)
+        self._window = (now, self.dispatched, self.starter.started, self.collector.completed,
+                        len(self.collector.latencies), self.lag_total, self.lag_count)
+        print(_format_sample(sample))
+
+    def summary(self) -> Dict[str, Any]:
+        peak = max(self.samples, key=lambda sample: sample.completion_rate, default=None)
+        return {
+            "started": self.starter.started,
+            "failed_starts": self.starter.failed,
+            "completed": self.collector.completed,
+            "peak_completion_rate": peak.completion_rate if peak else 0.0,
+            "peak_backlog": max((sample.backlog for sample in self.samples), default=0),
+            "avg_start_lag_ms": self.lag_total / self.lag_count * 1000 if self.lag_count else 0.0,
+            "max_start_lag_ms": self.max_lag * 1000,
+            "samples": [sample.to_dict() for sample in self.samples]
+        }
+
+
+def _format_latency(value: Optional[float]) -> str:
+    return f"{value:7.2f}" if value is not None else f"{'-':>7}"
+
+
+def _format_sample(sample: LoadSample) -> str:
+    return (f"{sample.elapsed_seconds:6.1f} {sample.target_rate:9.1f} {sample.start_rate:9.1f} "
+            f"{sample.completion_rate:8.1f} {sample.backlog:8d} {sample.start_lag_ms:8.1f} "
+            f"{_format_latency(sample.latency_p50)} {_format_latency(sample.latency_p95)} "
+            f"{_format_latency(sample.latency_p99)}")
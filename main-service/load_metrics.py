@@ -0,0 +1,111 @@
+import asyncio
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from temporalio.client import WorkflowFailureError, WorkflowHandle
+from temporalio.exceptions import ApplicationError, TimeoutError as TemporalTimeoutError
+
+
+# MainWorkflow failure types that mean the database did not take the write
+DB_FAILURE_TYPES = {"WRITE_REJECTED", "WRITE_DEAD_LETTERED", "DATABASE_WRITE_FAILED"}
+
+OUTCOMES = ("success", "timeout", "db_failure", "other_failure")
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def classify(error: BaseException) -> str:
+    """Map a workflow result exception to one of OUTCOMES"""
+    cause = error.cause if isinstance(error, WorkflowFailureError) else error
+    if isinstance(cause, TemporalTimeoutError):
+        return "timeout"
+    if isinstance(cause, ApplicationError):
+        if cause.type == "WRITE_CONFIRMATION_TIMEOUT":
+            return "timeout"
+        if cause.type in DB_FAILURE_TYPES:
+            return "db_failure"
+    return "other_failure"
+
+
+class ResultCollector:
+    """
+    Waits for each started workflow's result as soon as it is tracked and folds it into running
+    counters and end-to-end latencies (start accepted -> result received), instead of holding every
+    handle until a final gather. Only the latencies are kept, one float per workflow.
+    """
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self.counts: Dict[str, int] = {outcome: 0 for outcome in OUTCOMES}
+        self.latencies: List[float] = []
+        self._tasks = set()
+
+    @property
+    def completed(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def track(self, handle: WorkflowHandle, started_at: float):
+        task = asyncio.create_task(self._collect(handle, started_at))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _collect(self, handle: WorkflowHandle, started_at: float):
+        try:
+            result = await handle.result()
+            outcome = "success"
+        except Exception as e:
+            result = e
+            outcome = classify(e)
+        self.latencies.append(time.monotonic() - started_at)
+        self.counts[outcome] += 1
+
+        if self.verbose:
+            if outcome == "success":
+                print(f"✅ {handle.id}: {result}")
+            else:
+                print(f"❌ {handle.id}: {outcome.upper()} - {result}")
+
+    async def wait(self):
+        """Wait until every tracked workflow has a result (including ones tracked while waiting)"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def latency_percentiles(self) -> Dict[str, Optional[float]]:
+        ordered = sorted(self.latencies)
+        return {
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else None
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {**self.counts, "completed": self.completed, "latency_seconds": self.latency_percentiles()}
+
+    def status_line(self, expected: Optional[int] = None) -> str:
+        latency = self.latency_percentiles()
+        done = f"{self.completed}/{expected}" if expected is not None else str(self.completed)
+        line = (f"{done} done: {self.counts['success']} ok, {self.counts['timeout']} timeout, "
+                f"{self.counts['db_failure']} DB failures, {self.counts['other_failure']} other")
+        if latency["p50"] is not None:
+            line += (f" | latency p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, "
+                     f"p99 {latency['p99']:.2f}s, max {latency['max']:.2f}s")
+        return line
+
+    async def report_progress(self, expected_fn=None, interval_seconds: float = 5.0):
+        """Print the running counters every interval; cancel when done"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            expected = expected_fn() if expected_fn else None
+            print(f"📊 {self.status_line(expected)} ({self.in_flight} waiting)")
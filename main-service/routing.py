@@ -0,0 +1,69 @@
+import bisect
+import hashlib
+from typing import Dict, List, Tuple
+
+
+LEGACY_BATCHER_ID = "batcher-main"
+BATCHER_ID_PREFIX = "batcher"
+DEFAULT_VIRTUAL_NODES = 64
+
+
+def batcher_ids(num_shards: int) -> List[str]:
+    """Workflow IDs of the batcher pool ("batcher-main" when sharding is disabled)"""
+    if num_shards <= 1:
+        return [LEGACY_BATCHER_ID]
+    return [f"{BATCHER_ID_PREFIX}-{i}" for i in range(num_shards)]
+
+
+def _hash64(key: str) -> int:
+    # Python's built-in hash() is salted per process, so it can't be used for routing
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    """
+    Consistent-hash ring with virtual nodes for routing write requests to batcher shards.
+    Pure and deterministic, so it is safe to use inside workflow code.
+    """
+
+    def __init__(self, nodes: List[str], virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        if not nodes:
+            raise ValueError("ConsistentHashRing needs at least one node")
+        self.nodes = list(nodes)
+        self.virtual_nodes = virtual_nodes
+
+        points: List[Tuple[int, str]] = []
+        for node in self.nodes:
+            for replica in range(virtual_nodes):
+                points.append((_hash64(f"{node}#{replica}"), node))
+        points.sort()
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def get_node(self, key: str) -> str:
+        """Return the node owning the first ring point clockwise from the key's hash"""
+        index = bisect.bisect(self._hashes, _hash64(key)) % len(self._hashes)
+        return self._owners[index]
+
+    def distribution(self, keys: List[str]) -> Dict[str, int]:
+        """Count how many of the given keys land on each node (handy for checking balance)"""
+        counts = {node: 0 for node in self.nodes}
+        for key in keys:
+            counts[self.get_node(key)] += 1
+        return counts
+
+
+_rings: Dict[Tuple[int, int], ConsistentHashRing] = {}
+
+
+def route_to_batcher(routing_key: str, num_shards: int,
+                     virtual_nodes: int = DEFAULT_VIRTUAL_NODES) -> str:
+    """Pick the batcher workflow ID responsible for a routing key"""
+    if num_shards <= 1:
+        return LEGACY_BATCHER_ID
+
+    ring = _rings.get((num_shards, virtual_nodes))
+    if ring is None:
+        ring = ConsistentHashRing(batcher_ids(num_shards), virtual_nodes)
+        _rings[(num_shards, virtual_nodes)] = ring
+    return ring.get_node(routing_key)
@@ -1,66 +1,337 @@
 import asyncio
 import argparse
-from temporalio.client import Client
+import time
+from typing import Any, Callable, Dict, Optional
+from temporalio.client import Client, WorkflowHandle
+from temporalio.service import RPCError, RPCStatusCode
 from workflow import MainWorkflow
+from load_metrics import ResultCollector
+from load_generator import ARRIVAL_PROCESSES, LoadGenerator, arrival_times, target_rate_at, trace_arrivals
 
 
-async def start_main_workflows(num_workflows: int):
+# Worth retrying: the frontend is overloaded or briefly unreachable
+TRANSIENT_RPC_STATUSES = {
+    RPCStatusCode.UNAVAILABLE,
+    RPCStatusCode.DEADLINE_EXCEEDED,
+    RPCStatusCode.RESOURCE_EXHAUSTED,
+    RPCStatusCode.ABORTED,
+}
+
+
+class RateLimiter:
+    """Spaces calls evenly at a target rate (no bursts: each caller gets the next free slot)"""
+    
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second
+        self.next_slot: Optional[float] = None
+    
+    async def acquire(self):
+        now = time.monotonic()
+        if self.next_slot is None or self.next_slot < now:
+            self.next_slot = now
+        delay = self.next_slot - now
+        self.next_slot += self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class WorkflowStarter:
+    """Starts MainWorkflows concurrently, bounded by a semaphore and optionally paced to a target rate"""
+    
+    def __init__(self, client: Client, batcher_shards: int = 1, write_mode: str = "signal",
+                 claim_check: bool = False, concurrency: int = 50, rate_per_second: Optional[float] = None,
+                 max_attempts: int = 5, verbose: bool = False,
+                 on_started: Optional[Callable[[WorkflowHandle, float], None]] = None, rows_per_write: int = 1):
+        self.client = client
+        self.workflow_args = [batcher_shards, write_mode, claim_check, rows_per_write]
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = RateLimiter(rate_per_second) if rate_per_second else None
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.verbose = verbose
+        # Called with (handle, monotonic time the accepted start was sent) for each started workflow
+        self.on_started = on_started
+        self.started = 0
+        self.failed = 0
+        self.retries = 0
+        self.first_start: Optional[float] = None
+        self.last_start: Optional[float] = None
+    
+    async def start(self, workflow_id: str, work_data: str) -> Optional[WorkflowHandle]:
+        """Start one workflow, retrying transient RPC errors; returns None if it could not be started"""
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+        
+        async with self.semaphore:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    requested_at = time.monotonic()
+                    handle = await self.client.start_workflow(
+                        MainWorkflow.run,
+                        args=[work_data, *self.workflow_args],
+                        id=workflow_id,
+                        task_queue="main-workflow-queue"
+                    )
+                    break
+                except RPCError as e:
+                    if e.status not in TRANSIENT_RPC_STATUSES or attempt == self.max_attempts:
+                        self.failed += 1
+                        print(f"   ❌ Failed to start {workflow_id}: {e}")
+                        return None
+                    self.retries += 1
+                    await asyncio.sleep(min(5.0, 0.2 * 2 ** (attempt - 1)))
+                except Exception as e:
+                    self.failed += 1
+                    print(f"   ❌ Failed to start {workflow_id}: {e}")
+                    return None
+        
+        now = time.monotonic()
+        self.first_start = self.first_start or now
+        self.last_start = now
+        self.started += 1
+        if self.verbose:
+            print(f"   ✅ Started: {workflow_id}")
+        if self.on_started:
+            self.on_started(handle, requested_at)
+        return handle
+    
+    async def start_all(self, num_workflows: int):
+        """Start workflows 0..N-1, keeping at most `concurrency` start calls (and tasks) in flight"""
+        
+        in_flight = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        
+        async def start_one(i: int):
+            try:
+                await self.start(f"main-workflow-{i:03d}", f"business-data-{i}")
+            finally:
+                in_flight.release()
+        
+        for i in range(num_workflows):
+            await in_flight.acquire()
+            task = asyncio.create_task(start_one(i))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    
+    def summary(self) -> Dict[str, Any]:
+        elapsed = (self.last_start - self.first_start) if self.started > 1 else 0.0
+        return {
+            "started": self.started,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed_seconds": elapsed,
+            "starts_per_second": (self.started - 1) / elapsed if elapsed > 0 else None
+        }
+    
+    def print_summary(self):
+        summary = self.summary()
+        rate = f"{summary['starts_per_second']:.1f} starts/s" if summary["starts_per_second"] else "n/a"
+        target = f" (target {self.rate_per_second:g}/s)" if self.rate_per_second else ""
+        print(f"📈 Start rate: {summary['started']} started, {summary['failed']} failed, "
+              f"{summary['retries']} retries in {summary['elapsed_seconds']:.1f}s → {rate}{target}")
+
+
+async def start_main_workflows(num_workflows: int, batcher_shards: int = 1, write_mode: str = "signal",
+                               claim_check: bool = False, start_concurrency: int = 50,
+                               start_rate: Optional[float] = None, verbose: bool = False, rows_per_write: int = 1):
     """Start N main workflows"""
     client = await Client.connect("localhost:7233")
     
     print(f"🎯 Starting {num_workflows} main workflows")
+    if batcher_shards > 1:
+        print(f"🔀 Routing writes across {batcher_shards} batcher shards")
+    print(f"✉️  Write submission mode: {write_mode}{' (claim-check payloads)' if claim_check else ''}")
+    if rows_per_write > 1:
+        print(f"🧾 {rows_per_write} ledger rows per workflow, sent as one vector write request")
+    print(f"🚦 Start concurrency: {start_concurrency}" + (f", paced to {start_rate:g} starts/s" if start_rate else ""))
     print("=" * 50)
     
-    main_workflow_handles = []
-    
-    for i in range(num_workflows):
-        workflow_id = f"main-workflow-{i:03d}"
-        work_data = f"business-data-{i}"
+    # Results are consumed as workflows complete, while later ones are still being started
+    collector = ResultCollector(verbose)
+    starter = WorkflowStarter(client, batcher_shards, write_mode, claim_check, start_concurrency, start_rate,
+                              verbose=verbose, on_started=collector.track, rows_per_write=rows_per_write)
+    progress = asyncio.create_task(collector.report_progress(lambda: starter.started))
+    try:
+        await starter.start_all(num_workflows)
         
-        handle = await client.start_workflow(
-            MainWorkflow.run,
-            work_data,
-            id=workflow_id,
-            task_queue="main-workflow-queue"
-        )
+        print("=" * 50)
+        starter.print_summary()
+        print("🔄 Main workflows started!")
+        print(f"🌐 View in Temporal Web UI: http://localhost:8233")
+        print("=" * 50)
         
-        main_workflow_handles.append(handle)
-        print(f"   ✅ Started: {workflow_id}")
+        print("⏳ Waiting for all workflows to complete...")
+        await collector.wait()
+    finally:
+        progress.cancel()
     
+    print("\n" + "=" * 50)
+    print("🎉 WORKFLOW RESULTS")
     print("=" * 50)
-    print("🔄 Main workflows started!")
-    print(f"🌐 View in Temporal Web UI: http://localhost:8233")
+    print(f"📊 {collector.status_line(starter.started)}")
     print("=" * 50)
+    print("🏁 Main workflows completed!")
+
+
+async def run_load_test(rate: float, duration: float, arrival: str = "constant", ramp_steps: int = 5,
+                        seed: Optional[int] = None, batcher_shards: int = 1, write_mode: str = "signal",
+                        claim_check: bool = False, start_concurrency: int = 50, report_interval: float = 5.0,
+                        verbose: bool = False, trace: Optional[str] = None, speedup: float = 1.0,
+                        rows_per_write: int = 1):
+    """
+    Open-loop load: start main workflows on an arrival schedule and report throughput over time.
+    With `trace`, the schedule (and payload sizes) come from a recorded trace file, compressed by `speedup`.
+    """
+    client = await Client.connect("localhost:7233")
     
-    # Wait for all workflows to complete
-    print("⏳ Waiting for all workflows to complete...")
-    results = await asyncio.gather(
-        *[handle.result() for handle in main_workflow_handles],
-        return_exceptions=True
-    )
-    
-    print("\n" + "=" * 50)
-    print("🎉 WORKFLOW RESULTS")
+    if trace:
+        print(f"🎯 Trace replay: {trace}" + (f", {speedup:g}x faster than recorded" if speedup != 1 else ""))
+        arrivals = trace_arrivals(trace, speedup)
+        target_rate_fn = None
+    else:
+        shape = f"{ramp_steps} steps up to " if arrival == "step" else ""
+        print(f"🎯 Load test: {arrival} arrivals, {shape}{rate:g} workflows/s for {duration:g}s"
+              + (f" (seed {seed})" if seed is not None and arrival == "poisson" else ""))
+        arrivals = ((offset, None) for offset in arrival_times(arrival, rate, duration, ramp_steps, seed))
+        target_rate_fn = lambda offset: target_rate_at(arrival, rate, duration, ramp_steps, offset)
+    if batcher_shards > 1:
+        print(f"🔀 Routing writes across {batcher_shards} batcher shards")
+    print(f"✉️  Write submission mode: {write_mode}{' (claim-check payloads)' if claim_check else ''}")
+    if rows_per_write > 1:
+        print(f"🧾 {rows_per_write} ledger rows per workflow, sent as one vector write request")
+    print(f"🚦 Start concurrency: {start_concurrency}")
     print("=" * 50)
     
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            print(f"❌ Workflow {i:03d}: ERROR - {result}")
-        else:
-            print(f"✅ Workflow {i:03d}: {result}")
+    collector = ResultCollector(verbose)
+    starter = WorkflowStarter(client, batcher_shards, write_mode, claim_check, start_concurrency,
+                              verbose=verbose, on_started=collector.track, rows_per_write=rows_per_write)
+    generator = LoadGenerator(starter, collector)
+    await generator.run(arrivals, target_rate_fn, report_interval)
     
+    summary = generator.summary()
+    print("\n" + "=" * 50)
+    print("🎉 LOAD TEST RESULTS")
     print("=" * 50)
-    print("🏁 Main workflows completed!")
+    starter.print_summary()
+    print(f"📊 {collector.status_line(starter.started)}")
+    print(f"🚀 Peak completion rate: {summary['peak_completion_rate']:.1f} workflows/s, "
+          f"peak backlog: {summary['peak_backlog']}")
+    print(f"⏱️  Start lag: avg {summary['avg_start_lag_ms']:.1f}ms, max {summary['max_start_lag_ms']:.1f}ms")
+    print("=" * 50)
+    print("🏁 Load test completed!")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Start Main Workflows")
+    parser.add_argument(
+        "--mode",
+        choices=["burst", "load", "trace"],
+        default="burst",
+        help="burst: start --workflows workflows as fast as allowed; load: open-loop load at --rate "
+             "for --duration seconds; trace: replay the arrivals recorded in --trace (default: burst)"
+    )
     parser.add_argument(
         "--workflows", 
         type=int, 
         default=5,
         help="Number of main workflows to start (default: 5)"
     )
+    parser.add_argument(
+        "--batcher-shards",
+        type=int,
+        default=1,
+        help="Number of batcher shards to route writes to; must match the batcher starter (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--write-mode",
+        choices=["signal", "update"],
+        default="signal",
+        help="Submit writes with a signal + confirmation signal, or with the batcher's "
+             "submit_write update that returns once the write is durable (default: signal)"
+    )
+    parser.add_argument(
+        "--claim-check",
+        action="store_true",
+        help="Store write payloads in the local blob store and send only references to the batcher"
+    )
+    
+    parser.add_argument(
+        "--rows-per-workflow",
+        type=int,
+        default=1,
+        help="Ledger rows each workflow writes; more than one is sent as a single vector write request "
+             "(default: 1)"
+    )
+    parser.add_argument(
+        "--start-concurrency",
+        type=int,
+        default=50,
+        help="Maximum workflow start calls in flight at once (default: 50)"
+    )
+    parser.add_argument(
+        "--start-rate",
+        type=float,
+        help="Target workflow starts per second (default: as fast as the concurrency allows)"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print a line for every started and completed workflow"
+    )
+    
+    load = parser.add_argument_group("load mode")
+    load.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="Target workflow starts per second; the final rate for step arrivals (default: 10)"
+    )
+    load.add_argument(
+        "--duration",
+        type=float,
+        default=60.0,
+        help="Seconds to generate arrivals for (default: 60)"
+    )
+    load.add_argument(
+        "--arrival",
+        choices=ARRIVAL_PROCESSES,
+        default="constant",
+        help="Arrival process: evenly spaced, Poisson, or a step ramp up to --rate (default: constant)"
+    )
+    load.add_argument(
+        "--ramp-steps",
+        type=int,
+        default=5,
+        help="Number of equal-length stages for step arrivals (default: 5)"
+    )
+    load.add_argument(
+        "--seed",
+        type=int,
+        help="Random seed for Poisson arrivals, to repeat a run exactly"
+    )
+    load.add_argument(
+        "--report-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between throughput/backlog/latency reports (default: 5)"
+    )
+    
+    replay = parser.add_argument_group("trace mode")
+    replay.add_argument(
+        "--trace",
+        help="Arrival trace to replay: CSV (timestamp,payload_size) or JSON lines "
+             "({\"timestamp\": ..., \"payload_size\": ...}); timestamps in epoch seconds or ISO 8601"
+    )
+    replay.add_argument(
+        "--speedup",
+        type=float,
+        default=1.0,
+        help="Time compression: replay the trace N times faster than recorded (default: 1)"
+    )
     
     args = parser.parse_args()
     
@@ -68,8 +339,49 @@ def main():
         print("❌ Number of workflows must be at least 1")
         return
     
+    if args.batcher_shards < 1:
+        print("❌ Number of batcher shards must be at least 1")
+        return
+    
+    if args.rows_per_workflow < 1:
+        print("❌ Rows per workflow must be at least 1")
+        return
+    
+    if args.start_concurrency < 1:
+        print("❌ Start concurrency must be at least 1")
+        return
+    
+    if args.start_rate is not None and args.start_rate <= 0:
+        print("❌ Start rate must be positive")
+        return
+    
+    if args.mode == "load" and (args.rate <= 0 or args.duration <= 0 or args.report_interval <= 0):
+        print("❌ Rate, duration and report interval must be positive")
+        return
+    
+    if args.ramp_steps < 1:
+        print("❌ Ramp steps must be at least 1")
+        return
+    
+    if args.mode == "trace" and not args.trace:
+        print("❌ Trace mode needs --trace")
+        return
+    
+    if args.speedup <= 0 or args.report_interval <= 0:
+        print("❌ Speedup and report interval must be positive")
+        return
+    
     try:
-        asyncio.run(start_main_workflows(args.workflows))
+        if args.mode in ("load", "trace"):
+            asyncio.run(run_load_test(args.rate, args.duration, args.arrival, args.ramp_steps, args.seed,
+                                      args.batcher_shards, args.write_mode, args.claim_check,
+                                      args.start_concurrency, args.report_interval, args.verbose,
+                                      args.trace if args.mode == "trace" else None, args.speedup,
+                                      args.rows_per_workflow))
+        else:
+            asyncio.run(start_main_workflows(args.workflows, args.batcher_shards, args.write_mode,
+                                             args.claim_check, args.start_concurrency, args.start_rate,
+                                             args.verbose, args.rows_per_workflow))
     except KeyboardInterrupt:
         print("\n👋 Interrupted by user")
     except Exception as e:
@@ -0,0 +1,93 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, plus every `extra` field"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        elif record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps `extra` fields and the traceback separate for the JSON formatter"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only render what can't safely cross threads (args, exc_info); formatting happens on the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(service: str, level: Optional[str] = None,
+                      log_file: Optional[str] = None) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a QueueHandler: callers (the event loop, activity threads) only enqueue,
+    and a listener thread formats and writes JSON lines to stderr and, optionally, a buffered file.
+    Returns the listener; stop() it on shutdown to flush what is still queued.
+    """
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    log_file = log_file or os.environ.get("LOG_FILE")
+
+    formatter = JsonFormatter(service)
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(formatter)
+    handlers = [console]
+    if log_file:
+        # Buffered: written every 200 lines, on WARNING and above, and when logging stops
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        handlers.append(logging.handlers.MemoryHandler(capacity=200, flushLevel=logging.WARNING,
+                                                       target=file_handler))
+
+    log_queue: "queue.Queue" = queue.Queue(-1)
+    root = logging.getLogger()
+    root.handlers = [_StructuredQueueHandler(log_queue)]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: logging.handlers.QueueListener):
+    """Drain the queue and flush the file buffer"""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
+        if isinstance(handler, logging.handlers.MemoryHandler) and handler.target:
+            handler.target.close()
+        handler.close()
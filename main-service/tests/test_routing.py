@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routing import LEGACY_BATCHER_ID, ConsistentHashRing, batcher_ids, route_to_batcher
+
+KEYS = [f"main-workflow-{i}" for i in range(10000)]
+
+
+class ConsistentHashRingTest(unittest.TestCase):
+
+    def test_keys_spread_evenly(self):
+        for shards in (2, 4, 8):
+            counts = ConsistentHashRing(batcher_ids(shards)).distribution(KEYS)
+            mean = len(KEYS) / shards
+            self.assertEqual(set(counts), set(batcher_ids(shards)))
+            for node, count in counts.items():
+                self.assertLess(abs(count - mean), 0.25 * mean, f"{node} owns {count} of {len(KEYS)} keys")
+
+    def test_adding_a_shard_only_moves_keys_to_it(self):
+        before = ConsistentHashRing(batcher_ids(4))
+        after = ConsistentHashRing(batcher_ids(5))
+        moved = [key for key in KEYS if before.get_node(key) != after.get_node(key)]
+        self.assertEqual({after.get_node(key) for key in moved}, {"batcher-4"})
+        self.assertLess(len(moved), 0.3 * len(KEYS))
+
+    def test_removing_a_shard_only_moves_its_keys(self):
+        before = ConsistentHashRing(batcher_ids(5))
+        after = ConsistentHashRing(batcher_ids(4))
+        moved = [key for key in KEYS if before.get_node(key) != after.get_node(key)]
+        self.assertEqual({before.get_node(key) for key in moved}, {"batcher-4"})
+
+    def test_routing_is_deterministic(self):
+        # Workflows re-run this on replay, possibly in another worker process
+        first = [route_to_batcher(key, 4) for key in KEYS[:100]]
+        ring = ConsistentHashRing(batcher_ids(4))
+        self.assertEqual(first, [ring.get_node(key) for key in KEYS[:100]])
+        self.assertEqual(first, [route_to_batcher(key, 4) for key in KEYS[:100]])
+
+    def test_single_shard_uses_legacy_batcher(self):
+        self.assertEqual(batcher_ids(1), [LEGACY_BATCHER_ID])
+        self.assertEqual(route_to_batcher("main-workflow-1", 1), LEGACY_BATCHER_ID)
+
+    def test_empty_ring_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ConsistentHashRing([])
+
+
+if __name__ == "__main__":
+    unittest.main()
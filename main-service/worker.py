@@ -1,30 +1,64 @@
 import asyncio
+import argparse
+import os
 from temporalio.client import Client
 from temporalio.worker import Worker
 
 from workflow import MainWorkflow
-from activities import simulate_work
+from activities import (simulate_work, store_payload, WriteSubmissionActivities, WRITE_SUBMISSION_CONCURRENCY,
+                        WRITE_SUBMISSION_TASK_QUEUE)
+from structured_logging import configure_logging, stop_logging
 
 
 async def run_main_worker():
     """Start the worker for Main workflows"""
     client = await Client.connect("localhost:7233")
+    write_submission = WriteSubmissionActivities(client)
     
     worker = Worker(
         client,
         task_queue="main-workflow-queue",
         workflows=[MainWorkflow],
-        activities=[simulate_work],
+        activities=[simulate_work, store_payload],
+    )
+    # Every outstanding update-mode write holds one of these slots until its batch is durable,
+    # so this (times the number of main workers) caps how many writes can wait on the batcher
+    submission_worker = Worker(
+        client,
+        task_queue=WRITE_SUBMISSION_TASK_QUEUE,
+        activities=[write_submission.submit_write_via_update],
+        max_concurrent_activities=WRITE_SUBMISSION_CONCURRENCY,
     )
     
     print("🚀 Main Workflow Worker starting...")
     print("Task Queue: main-workflow-queue")
     print("Workflows: MainWorkflow")
-    print("Activities: simulate_work")
+    print("Activities: simulate_work, store_payload")
+    print(f"Task Queue: {WRITE_SUBMISSION_TASK_QUEUE} (up to {WRITE_SUBMISSION_CONCURRENCY} concurrent)")
+    print("Activities: submit_write_via_update")
     print("-" * 50)
     
-    await worker.run()
+    await asyncio.gather(worker.run(), submission_worker.run())
 
 
 if __name__ == "__main__":
-    asyncio.run(run_main_worker())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the main workflow worker")
+    parser.add_argument(
+        "--log-level",
+        default=os.environ.get("LOG_LEVEL", "INFO"),
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        type=str.upper,
+        help="Level of the JSON logs written to stderr (default: $LOG_LEVEL or INFO)"
+    )
+    parser.add_argument(
+        "--log-file",
+        default=os.environ.get("LOG_FILE"),
+        help="Also write JSON logs to this file, buffered (default: $LOG_FILE)"
+    )
+    args = parser.parse_args()
+    
+    listener = configure_logging("main-service", args.log_level, args.log_file)
+    try:
+        asyncio.run(run_main_worker())
+    finally:
+        stop_logging(listener)
\ No newline at end of file
@@ -1,11 +1,15 @@
 import asyncio
 from datetime import timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from temporalio import workflow
 from temporalio.common import RetryPolicy
-from temporalio.exceptions import ApplicationError
+from temporalio.exceptions import ActivityError, ApplicationError, TimeoutError as TemporalTimeoutError
 
-from activities import simulate_work
+# Activity modules touch the filesystem and the client at import time; the sandbox must not re-import them
+with workflow.unsafe.imports_passed_through():
+    from activities import (simulate_work, store_payload, WriteSubmissionActivities,
+                            WRITE_SUBMISSION_HEARTBEAT_SECONDS, WRITE_SUBMISSION_TASK_QUEUE)
+from routing import route_to_batcher
 
 
 @workflow.defn
@@ -19,12 +23,22 @@ class MainWorkflow:
         self.write_result: Optional[Dict[str, Any]] = None
         self.write_timeout = timedelta(minutes=2)
         self.request_id: Optional[str] = None  # Track our request ID
+        self.batcher_id: Optional[str] = None  # Batcher shard this workflow routes to
+        # Claim-check references (one per row) when the payload is stored externally
+        self.data_refs: Optional[List[Dict[str, Any]]] = None
+        self.rows_per_write = 1  # Ledger rows this transaction writes; more than one is sent as a vector request
+        self.write_deadline = None  # When we give up on the write; also sent to the batcher as the deadline
         
     @workflow.run
-    async def run(self, work_data: str) -> str:
+    async def run(self, work_data: str, num_batcher_shards: int = 1, write_mode: str = "signal",
+                  claim_check: bool = False, rows_per_write: int = 1) -> str:
         workflow_id = workflow.info().workflow_id
+        self.rows_per_write = max(1, rows_per_write)
         workflow.logger.info(f"Starting transaction workflow {workflow_id} with data: {work_data}")
         
+        # Route deterministically by workflow ID so every run of this workflow hits the same shard
+        self.batcher_id = route_to_batcher(workflow_id, num_batcher_shards)
+        
         # Step 1: Initial business processing
         step1_result = await workflow.execute_activity(
             simulate_work,
@@ -33,17 +47,26 @@ class MainWorkflow:
             retry_policy=RetryPolicy(maximum_attempts=3)
         )
         
-        # Step 2: Submit write request to batcher with error handling
-        write_submitted = await self._submit_write_request(work_data)
-        if not write_submitted:
-            raise ApplicationError(
-                "Could not submit write request to batcher after retries",
-                non_retryable=True,
-                type="SIGNAL_DELIVERY_FAILED"
-            )
+        if claim_check:
+            # Keep the payload out of the batcher's history: store it (each row) and send only the references
+            self.data_refs = list(await asyncio.gather(*[
+                workflow.execute_activity(
+                    store_payload,
+                    args=[data],
+                    start_to_close_timeout=timedelta(seconds=10),
+                    retry_policy=RetryPolicy(maximum_attempts=3)
+                )
+                for data in self._row_data(work_data)
+            ]))
+        
+        if write_mode == "update":
+            # Steps 2-3 in one round trip: the batcher's submit_write update returns once the write is durable
+            write_confirmed = await self._submit_write_via_update(work_data)
+        else:
+            # Steps 2-3: Submit write request to batcher and wait for its confirmation,
+            # resubmitting while the batcher turns it away because its backlog is full
+            write_confirmed = await self._submit_write_and_wait(work_data)
         
-        # Step 3: Wait for write confirmation with timeout
-        write_confirmed = await self._wait_for_write_confirmation()
         if not write_confirmed:
             raise ApplicationError(
                 "Database write was not confirmed within timeout",
@@ -52,6 +75,19 @@ class MainWorkflow:
             )
         
         # Step 4: Check write result
+        if self.write_result.get("status") == "rejected":
+            raise ApplicationError(
+                f"Database rejected write request {self.request_id}: {self.write_result.get('error')}",
+                non_retryable=True,
+                type="WRITE_REJECTED"
+            )
+        if self.write_result.get("status") == "dead_lettered":
+            raise ApplicationError(
+                f"Write request {self.request_id} was dead-lettered after {self.write_result.get('attempts')} "
+                f"attempts: {self.write_result.get('error')}",
+                non_retryable=True,
+                type="WRITE_DEAD_LETTERED"
+            )
         if self.write_result.get("status") != "success":
             raise ApplicationError(
                 f"Database write failed: {self.write_result}",
@@ -67,44 +103,134 @@ class MainWorkflow:
             retry_policy=RetryPolicy(maximum_attempts=3)
         )
         
+        rows = f", rows: {self.write_result.get('row_count')}" if self.write_result.get("rows") else ""
         success_msg = (f"TRANSACTION_SUCCESS: Workflow {workflow_id} completed: "
                         f"{step1_result} -> DB Write (batch: {self.write_result.get('batch_id', 'unknown')}, "
-                        f"request: {self.request_id}) -> {final_result}")
+                        f"request: {self.request_id}{rows}) -> {final_result}")
         
         workflow.logger.info(success_msg)
         return success_msg
     
-    async def _submit_write_request(self, work_data: str) -> bool:
-        """Submit write request to batcher with retry logic and exactly-once guarantees"""
-        
+    def _build_write_request(self, work_data: str, attempt: int) -> Dict[str, Any]:
         workflow_id = workflow.info().workflow_id
-        max_attempts = 3
         
         # Generate a unique request ID for exactly-once processing
         # Use deterministic generation based on workflow ID and run ID to handle retries
         run_id = workflow.info().run_id
         self.request_id = f"{workflow_id}-{run_id}-write-request"
         
+        write_request = {
+            "workflow_id": workflow_id,
+            "requesting_workflow": workflow_id,
+            "request_id": self.request_id,  # CRITICAL: Include request_id for deduplication
+            "submitted_at": workflow.now().isoformat(),
+            # We give up after write_timeout, so the batcher should flush before this
+            "deadline": (self.write_deadline or workflow.now() + self.write_timeout).isoformat(),
+            "attempt": attempt
+        }
+        if self.rows_per_write > 1:
+            # Vector request: all rows are written in one transaction and confirmed together
+            write_request["records"] = self.data_refs or [{"data": data} for data in self._row_data(work_data)]
+        elif self.data_refs:
+            write_request.update(self.data_refs[0])
+        else:
+            write_request["data"] = work_data
+        return write_request
+    
+    def _row_data(self, work_data: str) -> List[str]:
+        if self.rows_per_write == 1:
+            return [work_data]
+        return [f"{work_data}-row-{k}" for k in range(self.rows_per_write)]
+    
+    async def _submit_write_via_update(self, work_data: str) -> bool:
+        """Submit the write through the batcher's submit_write update and wait for the durable result"""
+        
+        write_request = self._build_write_request(work_data, attempt=1)
+        try:
+            self.write_result = await workflow.execute_activity_method(
+                WriteSubmissionActivities.submit_write_via_update,
+                args=[self.batcher_id, write_request],
+                task_queue=WRITE_SUBMISSION_TASK_QUEUE,
+                # Bounds all attempts together: the deadline sent to the batcher is also ours. A plain
+                # start-to-close timeout is retried, and with unlimited attempts it would never fire
+                schedule_to_close_timeout=self.write_timeout,
+                # A call lost with its worker is retried after this instead of when the deadline passes
+                heartbeat_timeout=timedelta(seconds=3 * WRITE_SUBMISSION_HEARTBEAT_SECONDS),
+                retry_policy=RetryPolicy(
+                    initial_interval=timedelta(seconds=1),
+                    maximum_interval=timedelta(seconds=10),
+                    backoff_coefficient=2.0
+                )
+            )
+        except ActivityError as e:
+            if isinstance(e.cause, TemporalTimeoutError):
+                workflow.logger.error(f"TIMEOUT: Write update for request {self.request_id} "
+                                      f"not completed after {self.write_timeout}")
+                return False
+            raise ApplicationError(
+                f"Could not submit write request {self.request_id} to batcher: {e.cause}",
+                non_retryable=True,
+                type="WRITE_SUBMISSION_FAILED"
+            )
+        
+        self.write_completed = True
+        workflow.logger.info(f"Write confirmed for request {self.request_id}! Result: {self.write_result}")
+        return True
+    
+    async def _submit_write_and_wait(self, work_data: str) -> bool:
+        """Signal the write request and wait for its confirmation, all within write_timeout"""
+        
+        self.write_deadline = workflow.now() + self.write_timeout
+        backlog_full_count = 0
+        while True:
+            # Step 2: Submit write request to batcher with error handling
+            write_submitted = await self._submit_write_request(work_data)
+            if not write_submitted:
+                raise ApplicationError(
+                    "Could not submit write request to batcher after retries",
+                    non_retryable=True,
+                    type="SIGNAL_DELIVERY_FAILED"
+                )
+            
+            # Step 3: Wait for write confirmation with timeout
+            write_confirmed = await self._wait_for_write_confirmation(self.write_deadline - workflow.now())
+            if not write_confirmed or self.write_result.get("status") != "backlog_full":
+                return write_confirmed
+            
+            # The batcher didn't queue the request (its backlog is carried through continue-as-new, so it
+            # is capped): back off and resubmit the same request ID while there is time left. The delay
+            # doubles per rejection (at least the batcher's estimate) and is jittered so turned-away
+            # requesters don't all come back in the same second
+            backlog_full_count += 1
+            backoff = max(self.write_result.get("retry_after_seconds", 1.0), 2.0 ** backlog_full_count)
+            retry_in = timedelta(seconds=min(60.0, backoff) * workflow.random().uniform(1.0, 1.5))
+            if workflow.now() + retry_in >= self.write_deadline:
+                workflow.logger.error(f"Batcher backlog still full, giving up on request {self.request_id}")
+                return False
+            workflow.logger.warn(f"Batcher backlog full, resubmitting request {self.request_id} in {retry_in}")
+            self.write_completed = False
+            self.write_result = None
+            await workflow.sleep(retry_in)
+    
+    async def _submit_write_request(self, work_data: str) -> bool:
+        """Submit write request to batcher with retry logic and exactly-once guarantees"""
+        
+        max_attempts = 3
+        
         for attempt in range(max_attempts):
             try:
-                batcher_handle = workflow.get_external_workflow_handle("batcher-main")
+                batcher_handle = workflow.get_external_workflow_handle(self.batcher_id)
                 
-                write_request = {
-                    "workflow_id": workflow_id,
-                    "data": work_data,
-                    "requesting_workflow": workflow_id,
-                    "request_id": self.request_id,  # CRITICAL: Include request_id for deduplication
-                    "submitted_at": workflow.now().isoformat(),
-                    "attempt": attempt + 1
-                }
+                write_request = self._build_write_request(work_data, attempt + 1)
                 
                 await batcher_handle.signal("add_write_request", write_request)
-                workflow.logger.info(f"Successfully submitted write request {self.request_id} (attempt {attempt + 1})")
+                workflow.logger.info(f"Successfully submitted write request {self.request_id} to {self.batcher_id} "
+                                     f"(attempt {attempt + 1})")
                 return True
                 
             except ApplicationError as e:
                 if "not found" in str(e).lower():
-                    workflow.logger.error(f"Batcher workflow not found (attempt {attempt + 1})")
+                    workflow.logger.error(f"Batcher workflow {self.batcher_id} not found (attempt {attempt + 1})")
                     if attempt < max_attempts - 1:
                         await workflow.sleep(timedelta(seconds=2 ** attempt))
                         continue
@@ -123,13 +249,13 @@ class MainWorkflow:
         workflow.logger.error(f"Failed to submit write request {self.request_id} after {max_attempts} attempts")
         return False
     
-    async def _wait_for_write_confirmation(self) -> bool:
+    async def _wait_for_write_confirmation(self, timeout: Optional[timedelta] = None) -> bool:
         """Wait for write confirmation with proper timeout handling"""
         
         try:
             await workflow.wait_condition(
                 lambda: self.write_completed,
-                timeout=self.write_timeout
+                timeout=max(timedelta(0), timeout) if timeout is not None else self.write_timeout
             )
             workflow.logger.info(f"Write confirmed for request {self.request_id}! Result: {self.write_result}")
             return True
@@ -168,6 +294,7 @@ class MainWorkflow:
         return {
             "workflow_id": workflow.info().workflow_id,
             "request_id": self.request_id,
+            "batcher_id": self.batcher_id,
             "write_completed": self.write_completed,
             "write_result": self.write_result,
             "current_time": workflow.now().isoformat()